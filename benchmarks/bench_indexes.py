@@ -0,0 +1,139 @@
+# benchmarks/bench_indexes.py
+"""
+Замер загрузки каталога и расчета цены на синтетической БД
+(10k изделий / 500k строк спецификаций) без вторичных индексов и с ними.
+
+Запуск: python benchmarks/bench_indexes.py [--products 10000] [--bom-per-product 50]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from modules.database import DatabaseManager
+from modules.migrations import INDEXES, ensure_indexes
+
+CATALOG_QUERY = """
+    SELECT p.id, p.product_id, p.article, p.name, p.created_date,
+           p.approved_price, p.calculated_price,
+           (SELECT SUM(o.cost) FROM operations o WHERE o.product_id = p.id) as operations_cost,
+           (SELECT SUM(pm.cost) FROM product_materials pm WHERE pm.product_id = p.id) as materials_cost
+    FROM products p
+    ORDER BY p.created_date DESC
+"""
+
+MATERIAL_CATEGORIES = ["Лист", "Труба", "Круг", "Уголок", "Метизы"]
+
+
+def populate(db_manager, products, bom_per_product, ops_per_product, materials=2000, seed=42):
+    """Заполнение БД синтетическими данными"""
+    rnd = random.Random(seed)
+    with db_manager.transaction():
+        db_manager.execute_many(
+            "INSERT INTO materials (category, name, thickness, weight_per_meter, our_price_per_kg) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(rnd.choice(MATERIAL_CATEGORIES), f"Материал {i}", rnd.uniform(1, 10),
+              rnd.uniform(0.5, 20), rnd.uniform(20, 80)) for i in range(materials)]
+        )
+        db_manager.execute_many(
+            "INSERT INTO products (product_id, article, name, approved_price) VALUES (?, ?, ?, ?)",
+            [(f"P{i:06d}", f"A-{i}", f"Изделие {i}", 0.0) for i in range(products)]
+        )
+        product_ids = [row[0] for row in db_manager.fetch_all("SELECT id FROM products")]
+        db_manager.execute_many(
+            "INSERT INTO product_materials (product_id, material_id, length, width, thickness, quantity, cost) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((pid, rnd.randint(1, materials), rnd.uniform(100, 3000), rnd.uniform(0, 500),
+              rnd.uniform(0, 5), rnd.randint(1, 10), rnd.uniform(10, 500))
+             for pid in product_ids for _ in range(bom_per_product))
+        )
+        db_manager.execute_many(
+            "INSERT INTO operations (product_id, operation_name, quantity_measured, time_measured, "
+            "time_per_unit, rate_per_minute, cost, employee_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((pid, "Сварка", 1, 10.0, 10.0, 2.0, rnd.uniform(5, 200), 1)
+             for pid in product_ids for _ in range(ops_per_product))
+        )
+    db_manager.execute_query("ANALYZE")
+    return product_ids
+
+
+def drop_indexes(db_manager):
+    """Удаление управляемых индексов (состояние «до»)"""
+    with db_manager.transaction():
+        for name in INDEXES:
+            db_manager.execute_query(f"DROP INDEX IF EXISTS {name}")
+    db_manager.execute_query("ANALYZE")
+
+
+def create_indexes(db_manager):
+    """Создание управляемых индексов (состояние «после»)"""
+    with db_manager.transaction():
+        ensure_indexes(db_manager.connection)
+    db_manager.execute_query("ANALYZE")
+
+
+def measure(label, db_manager, pricing_manager, sample_ids):
+    """Замер каталога, расчета цены и типовых выборок"""
+    results = {}
+
+    start = time.perf_counter()
+    rows = db_manager.fetch_all(CATALOG_QUERY)
+    results["catalog"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for product_id in sample_ids:
+        pricing_manager.calculate_pricing(product_id)
+    results["pricing"] = (time.perf_counter() - start) / len(sample_ids)
+
+    start = time.perf_counter()
+    for material_id in range(1, 101):
+        db_manager.fetch_one("SELECT COUNT(*) FROM product_materials WHERE material_id = ?", (material_id,))
+    results["material_usage"] = (time.perf_counter() - start) / 100
+
+    print(f"{label:>6}: каталог {results['catalog'] * 1000:9.1f} мс ({len(rows)} строк) | "
+          f"расчет цены {results['pricing'] * 1000:8.2f} мс/изд. | "
+          f"использование материала {results['material_usage'] * 1000:8.2f} мс")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--bom-per-product", type=int, default=50)
+    parser.add_argument("--ops-per-product", type=int, default=10)
+    parser.add_argument("--pricing-samples", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("modules.pricing").setLevel(logging.ERROR)
+
+    from modules.pricing import PricingManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # DatabaseManager создает data/ относительно текущего каталога
+        os.chdir(tmp)
+        with DatabaseManager(os.path.join(tmp, "bench.db")) as db_manager:
+            print(f"Заполнение: {args.products} изделий, "
+                  f"{args.products * args.bom_per_product} строк материалов, "
+                  f"{args.products * args.ops_per_product} операций...")
+            product_ids = populate(db_manager, args.products, args.bom_per_product, args.ops_per_product)
+            sample_ids = random.Random(1).sample(product_ids, min(args.pricing_samples, len(product_ids)))
+            pricing_manager = PricingManager(db_manager)
+
+            drop_indexes(db_manager)
+            before = measure("до", db_manager, pricing_manager, sample_ids)
+            create_indexes(db_manager)
+            after = measure("после", db_manager, pricing_manager, sample_ids)
+
+            for key in before:
+                print(f"  {key}: ускорение x{before[key] / max(after[key], 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# benchmarks/bench_pricing_kernel.py
+"""
+Сравнение векторизованного ядра расчета цены (modules/pricing_kernel.py) с прежним
+построчным расчетом на синтетической спецификации: совпадение результатов и время.
+
+Запуск: python benchmarks/bench_pricing_kernel.py [--lines 10000] [--repeat 20]
+"""
+import argparse
+import copy
+import logging
+import math
+import os
+import random
+import sys
+import timeit
+from collections import defaultdict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from modules import pricing_kernel
+from modules.pricing import PricingManager
+from modules.queries import PRODUCT_MATERIALS_FOR_PRICING
+
+CATEGORIES = ["Труба", "Лист", "ДСП", "Профиль", "Метизы", "Краска", None, ""]
+
+
+# -----------------------
+# Прежний построчный расчет (эталон для сравнения)
+# -----------------------
+def legacy_paint_area(material_row, length_mm, quantity=1):
+    diameter = float(material_row.get('diameter_mm') or 0.0)
+    a_mm = float(material_row.get('section_length_mm') or 0.0)
+    b_mm = float(material_row.get('section_width_mm') or 0.0)
+    category = (material_row.get('category') or '').lower()
+    L_m = (length_mm or 0.0) / 1000.0
+    if L_m <= 0:
+        return 0.0
+    area_per_piece = 0.0
+    if diameter > 0:
+        area_per_piece = math.pi * (diameter / 1000.0) * L_m
+    elif a_mm > 0 and b_mm > 0:
+        area_per_piece = 2.0 * (a_mm / 1000.0 + b_mm / 1000.0) * L_m
+    elif any(k in category for k in ['лист', 'дсп', 'мдф', 'панель']):
+        w_mm = a_mm or b_mm
+        if w_mm > 0:
+            area_per_piece = L_m * (w_mm / 1000.0) * 2.0
+    return area_per_piece * (quantity or 1)
+
+
+def legacy_summarize(product_materials):
+    summary = defaultdict(lambda: {'total_weight': 0.0, 'total_cost': 0.0, 'total_paint_area': 0.0})
+    for m in product_materials:
+        cat = (m.get('category') or 'Без категории')
+        length_mm = float(m.get('length_mm') or 0.0)
+        width_mm = float(m.get('width_mm') or 0.0)
+        qty = int(m.get('quantity') or 0)
+        length_m = length_mm / 1000
+        summary[cat]['total_weight'] += length_m * float(m.get('weight_per_meter') or 0.0) * qty
+        summary[cat]['total_cost'] += float(m.get('cost') or 0.0)
+        if width_mm and width_mm > 0:
+            paint_area = (length_mm / 1000.0) * (width_mm / 1000.0) * 2.0 * qty
+        else:
+            paint_area = legacy_paint_area(m, length_mm, qty)
+        summary[cat]['total_paint_area'] += paint_area
+    return {
+        cat: {'total_weight': round(v['total_weight'], 3), 'total_cost': round(v['total_cost'], 2),
+              'total_paint_area': round(v['total_paint_area'], 3)}
+        for cat, v in summary.items()
+    }
+
+
+def legacy_apply_paint(pricing_data, consumption=0.10, layers=2, loss_coeff=1.10):
+    mats = pricing_data.get('product_materials', [])
+    total_area = 0.0
+    for m in mats:
+        area = legacy_paint_area(m, float(m.get('length_mm') or 0.0), int(m.get('quantity') or 1))
+        m['paint_area'] = round(area, 6)
+        total_area += area
+    pricing_data['product_info']['total_paint_area_m2'] = round(total_area, 3)
+    paint_mat = None
+    for m in mats:
+        name = (m.get('name') or '').lower()
+        cat = (m.get('category') or '').lower()
+        if 'краска' in name or 'краска' in cat or 'лак' in name or 'лак' in cat:
+            paint_mat = m
+            break
+    if paint_mat:
+        required_kg = total_area * consumption * layers * loss_coeff
+        price_kg = float(paint_mat.get('price_per_kg') or 0.0)
+        paint_cost = required_kg * price_kg
+        pricing_data['paint'] = {'required_kg': round(required_kg, 3), 'cost': round(paint_cost, 2),
+                                 'material_id': paint_mat.get('material_id')}
+        indicators = pricing_data['cost_indicators']
+        indicators['total_material_cost'] = round(indicators['total_material_cost'] + paint_cost, 2)
+        indicators['prime_cost'] = round(indicators['prime_cost'] + paint_cost, 2)
+    return pricing_data
+
+
+# -----------------------
+# Синтетическая спецификация
+# -----------------------
+def make_rows(lines, seed=7):
+    """Строки в формате запроса PRODUCT_MATERIALS_FOR_PRICING"""
+    rnd = random.Random(seed)
+
+    def dim(low, high):
+        return rnd.choice([0.0, round(rnd.uniform(low, high), 2)])
+
+    rows = []
+    for i in range(lines):
+        category = rnd.choice(CATEGORIES)
+        name = rnd.choice(["Труба 20х20", "Лак ПФ", "Лист 2 мм", f"Материал {i}", "Краска белая"])
+        rows.append(PRODUCT_MATERIALS_FOR_PRICING.row(
+            category, dim(10, 3000), dim(10, 1500), dim(0.5, 10), rnd.randint(0, 12), round(rnd.uniform(0, 900), 2),
+            name, dim(0.1, 30), i + 1, dim(5, 60), dim(10, 100), dim(10, 100), rnd.choice([0.0, rnd.uniform(20, 90)])
+        ))
+    return rows
+
+
+def legacy_dicts(rows):
+    return [{
+        'category': row.category, 'length_mm': float(row.length_mm), 'width_mm': float(row.width_mm),
+        'thickness_mm': float(row.thickness_mm), 'quantity': int(row.quantity), 'cost': float(row.cost),
+        'name': row.material_name, 'weight_per_meter': float(row.weight_per_meter), 'material_id': row.material_id,
+        'diameter_mm': float(row.diameter_mm), 'section_length_mm': float(row.section_length_mm),
+        'section_width_mm': float(row.section_width_mm), 'price_per_kg': float(row.price_per_kg)
+    } for row in rows]
+
+
+def base_pricing_data():
+    return {'product_info': {'total_paint_area_m2': 0.0},
+            'cost_indicators': {'total_material_cost': 1000.0, 'prime_cost': 2000.0}}
+
+
+def run_legacy(rows):
+    """Прежний путь: словарь на строку, площадь покраски дважды на строку"""
+    product_materials = legacy_dicts(rows)
+    summary = legacy_summarize(product_materials)
+    pricing_data = base_pricing_data()
+    pricing_data['product_materials'] = product_materials
+    return summary, legacy_apply_paint(pricing_data)
+
+
+def run_kernel(manager, rows):
+    """Тот же путь, что в PricingManager.calculate_pricing"""
+    bom = pricing_kernel.bom_from_rows(rows)
+    paint_area = pricing_kernel.profile_paint_area(bom)
+    summary = pricing_kernel.summarize_materials(bom, paint_area)
+    return summary, manager._apply_paint_costs(base_pricing_data(), bom, paint_area=paint_area)
+
+
+def compute_legacy(product_materials):
+    """Только расчет: сводка и площадь покраски по готовым словарям"""
+    legacy_summarize(product_materials)
+    legacy_apply_paint(dict(base_pricing_data(), product_materials=product_materials))
+
+
+def compute_kernel(bom):
+    """Только расчет: сводка, площадь покраски и поиск краски по готовым массивам"""
+    paint_area = pricing_kernel.profile_paint_area(bom)
+    pricing_kernel.summarize_materials(bom, paint_area)
+    pricing_kernel.sequential_sum(paint_area)
+    pricing_kernel.paint_material_index(bom)
+
+
+def timed(function, repeat):
+    """Лучшее время одного вызова, мс"""
+    return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    manager = PricingManager(db_manager=None)
+    rows = make_rows(args.lines)
+
+    legacy_result = run_legacy(rows)
+    kernel_result = run_kernel(manager, rows)
+
+    # Обертки со списком словарей (прежний интерфейс PricingManager)
+    dict_summary = pricing_kernel.summarize_materials(pricing_kernel.bom_from_dicts(legacy_dicts(rows)))
+    dict_paint = manager.apply_paint_costs_to_pricing(
+        dict(base_pricing_data(), product_materials=legacy_dicts(rows)))
+
+    identical = (legacy_result == kernel_result
+                 and dict_summary == legacy_result[0]
+                 and dict_paint == copy.deepcopy(legacy_result[1]))
+    print(f"Строк спецификации: {args.lines}, категорий: {len(kernel_result[0])}")
+    product_materials, bom = legacy_dicts(rows), pricing_kernel.bom_from_rows(rows)
+    timings = (
+        ("весь путь calculate_pricing (строки БД -> словари строк)",
+         timed(lambda: run_legacy(rows), args.repeat), timed(lambda: run_kernel(manager, rows), args.repeat)),
+        ("только расчет (сводка, площадь, краска)",
+         timed(lambda: compute_legacy(product_materials), args.repeat), timed(lambda: compute_kernel(bom), args.repeat)),
+    )
+    for title, legacy_time, kernel_time in timings:
+        print(f"  {title}:")
+        print(f"    построчный расчет: {legacy_time:8.2f} мс")
+        print(f"    ядро NumPy:        {kernel_time:8.2f} мс (ускорение x{legacy_time / kernel_time:.1f})")
+    print(f"  результаты совпадают: {'да' if identical else 'НЕТ'}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# benchmarks/bench_pricing_many.py
+"""
+Пакетный расчет цены (PricingManager.calculate_pricing_many) против расчета
+по одному изделию на синтетической БД: совпадение результатов, число запросов чтения и время.
+
+Запуск: python benchmarks/bench_pricing_many.py [--products 5000] [--bom-per-product 50]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_indexes import populate
+from modules.database import DatabaseManager
+from modules.pricing import PricingManager
+
+
+def count_selects(db_manager):
+    """Счетчик выполненных запросов SELECT соединения (trace callback)"""
+    counter = [0]
+
+    def trace(statement):
+        if statement.lstrip().upper().startswith("SELECT"):
+            counter[0] += 1
+
+    db_manager.connection.set_trace_callback(trace)
+    return counter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--bom-per-product", type=int, default=50)
+    parser.add_argument("--ops-per-product", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("modules.pricing").setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # DatabaseManager создает data/ относительно текущего каталога
+        os.chdir(tmp)
+        with DatabaseManager(os.path.join(tmp, "bench.db")) as db_manager:
+            print(f"Заполнение: {args.products} изделий, "
+                  f"{args.products * args.bom_per_product} строк материалов, "
+                  f"{args.products * args.ops_per_product} операций...")
+            product_ids = populate(db_manager, args.products, args.bom_per_product, args.ops_per_product)
+            pricing_manager = PricingManager(db_manager)
+            selects = count_selects(db_manager)
+
+            start = time.perf_counter()
+            single = {product_id: pricing_manager.calculate_pricing(product_id) for product_id in product_ids}
+            single_time = time.perf_counter() - start
+            single_selects, selects[0] = selects[0], 0
+
+            start = time.perf_counter()
+            batch = pricing_manager.calculate_pricing_many(product_ids)
+            batch_time = time.perf_counter() - start
+            batch_selects = selects[0]
+
+    print(f"  по одному изделию: {single_time:7.2f} с, запросов SELECT: {single_selects}")
+    print(f"  пакетно:           {batch_time:7.2f} с, запросов SELECT: {batch_selects} "
+          f"(ускорение x{single_time / batch_time:.1f})")
+    identical = batch == single
+    print(f"  результаты совпадают: {'да' if identical else 'НЕТ'}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
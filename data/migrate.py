@@ -1,20 +1,24 @@
+# data/migrate.py
+"""Ручной запуск миграций схемы для data/database.db"""
+import os
 import sqlite3
+import sys
 
-db_path = "database.db"
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
 
-queries = [
-    "ALTER TABLE products ADD COLUMN total_paint_area REAL DEFAULT 0.0;",
-    "ALTER TABLE product_materials ADD COLUMN paint_area REAL DEFAULT 0.0;",
-]
+from modules.migrations import SCHEMA_VERSION, apply_migrations, get_schema_version
+
+db_path = os.path.join(BASE_DIR, "data", "database.db")
 
 conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-for q in queries:
-    try:
-        cursor.execute(q)
-        print(f"✅ Выполнено: {q}")
-    except sqlite3.OperationalError as e:
-        print(f"⚠️ Пропущено: {e}")
-conn.commit()
-conn.close()
+try:
+    print(f"Версия схемы до миграции: {get_schema_version(conn)}")
+    applied = apply_migrations(conn)
+    if applied:
+        print(f"✅ Применены миграции: {', '.join(map(str, applied))}")
+    else:
+        print(f"⚠️ Схема уже актуальна (версия {SCHEMA_VERSION})")
+finally:
+    conn.close()
 print("Миграция завершена.")
@@ -12,8 +12,9 @@ if plugins_path.exists():
     os.environ["QT_QPA_PLATFORM_PLUGIN_PATH"] = str(plugins_path)
 
 import logging
+import multiprocessing
 from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget, QVBoxLayout, QWidget, QStatusBar, QMenuBar, \
-    QMessageBox, QFileDialog
+    QMessageBox, QFileDialog, QProgressDialog, QProgressBar, QPushButton
 from PyQt5.QtCore import Qt
 
 
@@ -37,6 +38,11 @@ logger.info("=" * 50)
 try:
     from modules.database import DatabaseManager
     from modules.main_interface import MainInterface
+    from modules.products import ProductManager
+    from modules.cost_summary import CostSummaryManager
+    from modules.pricing import PricingManager
+    from modules.dependencies import DependencyIndex
+    from modules.bulk_export import BulkExportManager
 
     logger.debug("Модули базы данных и интерфейса импортированы успешно")
 except ImportError as e:
@@ -44,21 +50,6 @@ except ImportError as e:
     QMessageBox.critical(None, "Ошибка импорта", f"Не удалось импортировать необходимые модули: {e}")
     sys.exit(1)
 
-    # Проверка и добавление колонки calculated_price, если её нет
-def ensure_calculated_price_column(db_manager: DatabaseManager):
-    try:
-        # Проверим, существует ли колонка
-        db_manager.execute_query("SELECT calculated_price FROM products LIMIT 1")
-        logger.info("Колонка 'calculated_price' уже существует в таблице products")
-    except Exception as e:
-        if "no such column: calculated_price" in str(e):
-            logger.info("Колонка 'calculated_price' отсутствует. Добавляем...")
-            db_manager.execute_query("ALTER TABLE products ADD COLUMN calculated_price REAL")
-            logger.info("Колонка 'calculated_price' успешно добавлена")
-        else:
-            logger.error(f"Неожиданная ошибка при проверке колонки: {e}")
-            raise
-
 class MainApplication(QMainWindow):
     """Главная форма приложения"""
 
@@ -81,7 +72,18 @@ class MainApplication(QMainWindow):
         self.setup_ui()
         logger.info("Главное окно приложения создано")
 
-
+    def closeEvent(self, event):
+        """Закрытие соединений с БД при выходе из приложения"""
+        logger.info("Закрытие главного окна")
+        # Фоновые расчеты цены используют соединения БД — дожидаемся их до закрытия
+        if hasattr(self, 'interface'):
+            for scheduler in (self.interface.recalc_scheduler, self.interface.pricing_tab.recalc_scheduler):
+                scheduler.cancel()
+                scheduler.wait_for_done()
+            # Карточки сохраненных изделий должны быть записаны — дожидаемся всех заданий экспорта
+            self.interface.export_queue.wait_for_all()
+        self.db_manager.close()
+        super().closeEvent(event)
 
     def setup_ui(self):
         """Настройка пользовательского интерфейса"""
@@ -120,8 +122,7 @@ class MainApplication(QMainWindow):
             QMessageBox.critical(self, "Ошибка интерфейса", f"Не удалось создать интерфейс: {e}")
             raise
 
-        # Исправление данных цены
-        self.fix_pricing_data()
+        # Исправление данных цены (типы параметров цены исправляются миграцией схемы)
         self.fix_incorrect_approved_prices()
 
         main_layout.addWidget(self.tab_widget)
@@ -133,6 +134,7 @@ class MainApplication(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Готов к работе")
+        self._setup_export_status()
         logger.debug("Статусная строка настроена")
 
         # Создание меню
@@ -140,6 +142,46 @@ class MainApplication(QMainWindow):
         logger.debug("Меню создано")
         logger.info("UI настроен успешно")
 
+    def _setup_export_status(self):
+        """Ход фоновых заданий экспорта в строке состояния: сообщения, индикатор и кнопка отмены"""
+        queue = self.interface.export_queue
+        self.export_progress = QProgressBar()
+        self.export_progress.setMaximumWidth(160)
+        self.export_progress.setTextVisible(False)
+        self.export_cancel_btn = QPushButton("Отменить экспорт")
+        self.export_cancel_btn.clicked.connect(queue.cancel_all)
+        for widget in (self.export_progress, self.export_cancel_btn):
+            widget.hide()
+            self.status_bar.addPermanentWidget(widget)
+
+        def on_started(job_id, title):
+            self.export_progress.setRange(0, 0)  # до первого шага — «бегущий» индикатор
+            self.export_progress.show()
+            self.export_cancel_btn.show()
+            self.status_bar.showMessage(f"Экспорт: {title}...")
+
+        def on_progress(job_id, title, done, total):
+            self.export_progress.setRange(0, total)
+            self.export_progress.setValue(done)
+            self.status_bar.showMessage(f"Экспорт: {title} ({done} из {total})")
+
+        def on_finished(job_id, title, success, error):
+            if success:
+                self.status_bar.showMessage(f"Готово: {title}", 5000)
+            else:
+                # Ошибка остается в строке состояния до следующего сообщения
+                self.status_bar.showMessage(f"Ошибка экспорта: {title}" + (f" — {error}" if error else ""))
+
+        def on_idle():
+            self.export_progress.hide()
+            self.export_cancel_btn.hide()
+
+        queue.job_started.connect(on_started)
+        queue.job_progress.connect(on_progress)
+        queue.job_finished.connect(on_finished)
+        queue.job_cancelled.connect(lambda job_id, title: self.status_bar.showMessage(f"Экспорт отменен: {title}", 5000))
+        queue.idle.connect(on_idle)
+
     def switch_to_pricing_tab(self, product_id):
         """Переключение на вкладку 'Цена изделия'"""
         logger.debug(f"Переключение на вкладку 'Цена изделия' для изделия ID {product_id}")
@@ -203,6 +245,9 @@ class MainApplication(QMainWindow):
         export_pdf_action = report_menu.addAction('Экспорт в PDF')
         export_pdf_action.triggered.connect(self.export_to_pdf)
 
+        export_all_cards_action = report_menu.addAction('Выгрузить карточки всех изделий')
+        export_all_cards_action.triggered.connect(self.export_all_product_cards)
+
         # Меню Цена
         price_menu = menubar.addMenu('Цена')
 
@@ -210,21 +255,107 @@ class MainApplication(QMainWindow):
         calculate_price_action.setShortcut('Ctrl+Shift+C')
         calculate_price_action.triggered.connect(self.calculate_selected_product_price)
 
-    def show_materials_dialog(self):
-        """Открытие диалога со справочником материалов"""
+        rebuild_summary_action = price_menu.addAction('Проверить сводку стоимости')
+        rebuild_summary_action.triggered.connect(self.verify_cost_summary)
+
+        reprice_all_action = price_menu.addAction('Пересчитать стоимость всех изделий')
+        reprice_all_action.triggered.connect(self.reprice_all_products)
+
+    def reprice_all_products(self):
+        """Пересчет стоимости материалов и операций всех изделий по текущим ценам и ставкам"""
+        logger.info("Пакетный пересчет стоимости изделий")
+        reply = QMessageBox.question(
+            self, "Пересчет стоимости",
+            "Пересчитать стоимость материалов и операций всех изделий\n"
+            "по текущим ценам материалов и ставкам операций?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        self._reprice_products_with_progress(None)
+
+    def _reprice_products_with_progress(self, product_ids):
+        """Пакетный пересчет стоимости изделий (None — всех) с окном прогресса и обновлением каталога"""
+        progress = QProgressDialog("Пересчет стоимости изделий...", "Отмена", 0, 100, self)
+        progress.setWindowTitle("Пересчет стоимости")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+
+        def on_progress(done, total):
+            progress.setMaximum(total)
+            progress.setValue(done)
+            QApplication.processEvents()
+            return not progress.wasCanceled()
+
         try:
-            from modules.materials_dialog import MaterialsDialog
-            dialog = MaterialsDialog(self.db_manager, self)
-            dialog.exec_()
+            report = PricingManager(self.db_manager).reprice_products(product_ids, progress_callback=on_progress)
+        finally:
+            progress.close()
+
+        if report is None:
+            if progress.wasCanceled():
+                QMessageBox.information(self, "Пересчет стоимости", "Пересчет отменен, изменения не сохранены")
+            else:
+                QMessageBox.critical(self, "Ошибка", "Ошибка при пересчете стоимости изделий")
+            return
+
+        self._on_products_repriced(product_ids)
+        QMessageBox.information(
+            self, "Пересчет стоимости",
+            f"Изделий обработано: {report.products}\n"
+            f"Изменено строк материалов: {report.material_lines}\n"
+            f"Изменено операций: {report.operation_lines}\n"
+            f"Изменено расчетных цен: {report.prices}"
+        )
+
+    def _on_products_repriced(self, product_ids):
+        """
+        Стоимость изделий пересчитана (None — всех): строки каталога с расчетной ценой
+        перечитываются, цена открытого изделия на вкладке 'Цена изделия' пересчитывается
+        """
+        if product_ids is None:
+            self.interface.catalog_tab.refresh_catalog()
+        else:
+            self.interface.product_events.notify_updated(product_ids)
+        current_product_id = self.interface.current_product_id
+        if current_product_id and (product_ids is None or current_product_id in product_ids):
+            self.interface.recalc_scheduler.schedule(current_product_id, immediate=True)
+
+    def verify_cost_summary(self):
+        """Сверка сводки стоимости изделий и пересборка при расхождениях"""
+        logger.info("Проверка сводки стоимости изделий")
+        try:
+            manager = CostSummaryManager(self.db_manager)
+            mismatched = manager.verify()
+            if not mismatched:
+                QMessageBox.information(self, "Сводка стоимости", "Сводка стоимости актуальна")
+                return
+
+            reply = QMessageBox.question(
+                self, "Сводка стоимости",
+                f"Расхождения у {len(mismatched)} изделий. Пересобрать сводку?",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return
+
+            count = manager.rebuild()
+            if count is None:
+                QMessageBox.critical(self, "Ошибка", "Ошибка при пересборке сводки стоимости")
+                return
+            self.interface.catalog_tab.refresh_catalog()
+            QMessageBox.information(self, "Сводка стоимости", f"Сводка пересобрана: {count} изделий")
         except Exception as e:
-            logger.error(f"Ошибка при открытии справочника материалов: {e}", exc_info=True)
-            QMessageBox.critical(self, "Ошибка", f"Не удалось открыть справочник материалов:\n{e}")
+            logger.error(f"Ошибка при проверке сводки стоимости: {e}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка", f"Ошибка при проверке сводки стоимости: {e}")
 
     def show_materials_dialog(self):
         """Открытие диалога со справочником материалов"""
         try:
             from modules.materials_dialog import MaterialsDialog
             dialog = MaterialsDialog(self.db_manager, self)
+            # Пересчитанные после правки цены изделия обновляются в каталоге точечно
+            dialog.products_repriced.connect(self._on_products_repriced)
             dialog.exec_()
         except Exception as e:
             logger.error(f"Ошибка при открытии справочника материалов: {e}", exc_info=True)
@@ -259,39 +390,44 @@ class MainApplication(QMainWindow):
             }
             logger.debug(f"Данные изделия для сохранения: {product_data}")
 
-            # Определяем, новое это изделие или редактирование существующего
-            if self.interface.current_product_id:
-                # Обновление существующего изделия
-                product_id = self.interface.current_product_id
-                self._update_product_in_db(product_id, product_data)
-                logger.debug(f"Изделие обновлено в БД с ID: {product_id}")
-            else:
-                # Создание нового изделия с автоматическим ID
-                product_id = self._create_new_product_with_auto_id(product_data)
-                logger.debug(f"Новое изделие создано в БД с ID: {product_id}")
+            # Шапка, операции, материалы и пересчитанная цена сохраняются одной транзакцией
+            is_new = not self.interface.current_product_id
+            with self.db_manager.transaction():
+                # Определяем, новое это изделие или редактирование существующего
+                if not is_new:
+                    # Обновление существующего изделия
+                    product_id = self.interface.current_product_id
+                    self._update_product_in_db(product_id, product_data)
+                    logger.debug(f"Изделие обновлено в БД с ID: {product_id}")
+                else:
+                    # Создание нового изделия с автоматическим ID
+                    product_id = self._create_new_product_with_auto_id(product_data)
+                    logger.debug(f"Новое изделие создано в БД с ID: {product_id}")
 
-            # Сохранение операций и материалов
-            self._save_operations_to_db(product_id)
-            self._save_materials_to_db(product_id)
+                # Сохранение операций и материалов
+                self._save_operations_to_db(product_id)
+                self._save_materials_to_db(product_id)
 
-            # Сохранение в Excel файл
+                # Пересчет расчетной цены по сохраненному составу
+                self._save_calculated_price_to_db(product_id)
+
+            # Карточка изделия в Excel пишется в фоне, о результате сообщит строка состояния
             file_path = f"data/products/{product_data['article']}_{product_data['name']}.xlsx"
-            logger.debug(f"Попытка сохранения в файл: {file_path}")
-            success = self.interface.product_manager.save_product_to_excel(product_id, file_path)
+            self._submit_product_card(product_id, file_path)
 
-            if success:
-                logger.info("Изделие успешно сохранено")
-                QMessageBox.information(self, "Успех", "Изделие успешно сохранено")
-                self.interface.catalog_tab.refresh_catalog()
-
-                # Если это было новое изделие, устанавливаем его как текущее
-                if not self.interface.current_product_id:
-                    self.interface.current_product_id = product_id
-                    # Обновляем отображаемый ID
-                    self.interface.product_id_input.setText(str(product_id))
+            logger.info("Изделие успешно сохранено")
+            # В каталоге перечитывается только строка сохраненного изделия
+            if is_new:
+                self.interface.product_events.notify_inserted([product_id])
             else:
-                logger.error("Ошибка при сохранении изделия")
-                QMessageBox.critical(self, "Ошибка", "Ошибка при сохранении изделия")
+                self.interface.product_events.notify_updated([product_id])
+            QMessageBox.information(self, "Успех", "Изделие успешно сохранено")
+
+            # Если это было новое изделие, устанавливаем его как текущее
+            if is_new:
+                self.interface.current_product_id = product_id
+                # Обновляем отображаемый ID
+                self.interface.product_id_input.setText(str(product_id))
         except Exception as e:
             logger.error(f"Необработанная ошибка при сохранении изделия: {e}", exc_info=True)
             QMessageBox.critical(self, "Ошибка", f"Необработанная ошибка: {e}")
@@ -351,14 +487,14 @@ class MainApplication(QMainWindow):
             delete_query = "DELETE FROM operations WHERE product_id = ?"
             self.db_manager.execute_query(delete_query, (product_id,))
 
-            for op_data in operations_data:
-                query = """
-                    INSERT INTO operations 
-                    (product_id, operation_name, quantity_measured, time_measured, 
-                     time_per_unit, rate_per_minute, cost, employee_id, approved_rate)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """
-                params = (
+            query = """
+                INSERT INTO operations 
+                (product_id, operation_name, quantity_measured, time_measured, 
+                 time_per_unit, rate_per_minute, cost, employee_id, approved_rate)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """
+            params = [
+                (
                     product_id,
                     op_data.get('operation_name', ''),
                     op_data.get('quantity_measured', 0),
@@ -369,8 +505,9 @@ class MainApplication(QMainWindow):
                     op_data.get('employee_id'),
                     op_data.get('approved_rate')
                 )
-                self.db_manager.execute_query(query, params)
-                logger.debug(f"Сохранена операция: {op_data.get('operation_name')}")
+                for op_data in operations_data
+            ]
+            self.db_manager.execute_many(query, params)
 
             logger.info(f"Сохранено {len(operations_data)} операций для изделия ID {product_id}")
         except Exception as e:
@@ -388,13 +525,13 @@ class MainApplication(QMainWindow):
             delete_query = "DELETE FROM product_materials WHERE product_id = ?"
             self.db_manager.execute_query(delete_query, (product_id,))
 
-            for mat_data in materials_data:
-                query = """
-                    INSERT INTO product_materials 
-                    (product_id, material_id, length, width, thickness, quantity, cost)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """
-                params = (
+            query = """
+                INSERT INTO product_materials 
+                (product_id, material_id, length, width, thickness, quantity, cost)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """
+            params = [
+                (
                     product_id,
                     mat_data.get('material_id'),
                     mat_data.get('length', 0.0),
@@ -403,20 +540,40 @@ class MainApplication(QMainWindow):
                     mat_data.get('quantity', 0),
                     mat_data.get('cost', 0.0)
                 )
-                self.db_manager.execute_query(query, params)
-                logger.debug(f"Сохранен материал: {mat_data.get('material_name')}")
+                for mat_data in materials_data
+            ]
+            self.db_manager.execute_many(query, params)
 
             logger.info(f"Сохранено {len(materials_data)} материалов для изделия ID {product_id}")
         except Exception as e:
             logger.error(f"Ошибка при сохранении материалов: {e}", exc_info=True)
             raise
 
+    def _save_calculated_price_to_db(self, product_id):
+        """Пересчет и сохранение расчетной цены и производных полей изделия (внутри транзакции сохранения)"""
+        pricing_manager = PricingManager(self.db_manager)
+        pricing_data = pricing_manager.calculate_pricing(product_id)
+        if not pricing_data:
+            raise RuntimeError(f"Не удалось рассчитать цену изделия ID {product_id}")
+        if pricing_manager.persist_derived_fields({product_id: pricing_data}) is None:
+            raise RuntimeError(f"Не удалось сохранить площадь покраски изделия ID {product_id}")
+
+        calculated_price = pricing_data['cost_indicators']['calculated_price']
+        self.db_manager.execute_query(
+            "UPDATE products SET calculated_price = ? WHERE id = ?",
+            (calculated_price, product_id)
+        )
+        logger.debug(f"Расчетная цена изделия ID {product_id} обновлена: {calculated_price}")
+
     def save_pricing_changes(self, product_id, pricing_data):
         """Сохранение изменений цены в БД и Excel"""
         logger.info(f"Сохранение изменений цены для изделия ID {product_id}")
         try:
-            # Сохраняем данные цены в БД
+            # Сохраняем данные цены в БД и обновляем строку изделия в каталоге
             self._save_pricing_to_db(product_id, pricing_data)
+            self.interface.update_catalog_prices(
+                product_id, pricing_data.get('approved_price'), pricing_data.get('calculated_price')
+            )
 
             # Обновляем Excel файл
             self._update_excel_file(product_id, pricing_data)
@@ -472,13 +629,17 @@ class MainApplication(QMainWindow):
             article, name = product_info
             file_path = f"data/products/{article}_{name}.xlsx"
 
-            # Обновляем файл через product_manager
-            success = self.interface.product_manager.save_product_to_excel(product_id, file_path)
+            # Обновляем файл через product_manager (в фоне)
+            self._submit_product_card(product_id, file_path)
 
-            if success:
-                logger.debug(f"Excel файл обновлен: {file_path}")
-            else:
-                logger.warning(f"Не удалось обновить Excel файл: {file_path}")
+    def _submit_product_card(self, product_id, file_path):
+        """Фоновая запись карточки изделия в Excel; повторные сохранения того же файла объединяются"""
+        logger.debug(f"Карточка изделия ID {product_id} поставлена в очередь записи: {file_path}")
+        return self.interface.export_queue.submit(
+            f"Карточка изделия: {os.path.basename(file_path)}",
+            self.interface.product_manager.save_product_to_excel, product_id, file_path,
+            key=os.path.abspath(file_path)
+        )
 
     def load_product(self):
         """Загрузка изделия из файла"""
@@ -502,11 +663,21 @@ class MainApplication(QMainWindow):
             )
 
             if file_path:
-                success = self.interface.material_manager.load_materials_from_excel(file_path)
-                if success:
-                    QMessageBox.information(self, "Успех", "Материалы успешно импортированы")
+                report = self.interface.material_manager.load_materials_from_excel(file_path)
+                if report:
+                    text = (f"Материалы импортированы.\nПринято строк: {report.accepted}\n"
+                            f"Отклонено строк: {report.rejected}\n\n"
+                            f"Добавлено: {report.inserted}\nОбновлено: {report.updated}\n"
+                            f"Без изменений: {report.unchanged}\nСнято с прайса: {report.retired}")
+                    if report.messages:
+                        text += "\n\n" + "\n".join(report.messages[:10])
+                        if len(report.messages) > 10:
+                            text += f"\n... и еще {len(report.messages) - 10} (см. журнал)"
+                    QMessageBox.information(self, "Успех", text)
                     self.interface.load_categories_to_combo()
                     logger.info("Материалы успешно импортированы")
+                    affected = DependencyIndex(self.db_manager).products_for_materials(report.updated_ids)
+                    self._offer_targeted_repricing(affected, "Изменились цены или параметры материалов")
                 else:
                     QMessageBox.critical(self, "Ошибка", "Ошибка при импорте материалов")
                     logger.error("Ошибка при импорте материалов")
@@ -514,6 +685,18 @@ class MainApplication(QMainWindow):
             logger.error(f"Ошибка при импорте материалов: {e}", exc_info=True)
             QMessageBox.critical(self, "Ошибка", f"Ошибка при импорте материалов: {e}")
 
+    def _offer_targeted_repricing(self, product_ids, reason):
+        """Предложение пересчитать стоимость только затронутых изменением справочника изделий"""
+        if not product_ids:
+            return
+        reply = QMessageBox.question(
+            self, "Пересчет стоимости",
+            f"{reason}: затронуто изделий — {len(product_ids)}.\nПересчитать их стоимость?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self._reprice_products_with_progress(product_ids)
+
     def import_rates(self):
         """Импорт ставок из Excel файла"""
         logger.info("Начало импорта ставок")
@@ -526,11 +709,25 @@ class MainApplication(QMainWindow):
             )
 
             if file_path:
-                success = self.interface.rate_manager.load_rates_from_excel(file_path)
-                if success:
-                    QMessageBox.information(self, "Успех", "Ставки успешно импортированы")
+                report = self.interface.rate_manager.load_rates_from_excel(file_path)
+                if report:
+                    text = (f"Ставки импортированы: {report.accepted} операций.\n"
+                            f"Добавлено: {len(report.added)}, изменено: {len(report.changed)}, "
+                            f"удалено: {len(report.removed)}")
+                    changes = [f"~ {name}: {old_rate} -> {new_rate}" for name, old_rate, new_rate in report.changed]
+                    changes += [f"+ {name}" for name in report.added] + [f"- {name}" for name in report.removed]
+                    changes += report.messages
+                    if changes:
+                        text += "\n\n" + "\n".join(changes[:15])
+                        if len(changes) > 15:
+                            text += f"\n... и еще {len(changes) - 15} (см. журнал)"
+                    QMessageBox.information(self, "Успех", text)
                     self.interface.load_operations_to_combo()
                     logger.info("Ставки успешно импортированы")
+                    # Новые названия тоже влияют: операции с ранее неизвестным названием получают ставку
+                    changed_names = report.added + [name for name, _, _ in report.changed]
+                    affected = DependencyIndex(self.db_manager).products_for_operations(changed_names)
+                    self._offer_targeted_repricing(affected, "Изменились ставки операций")
                 else:
                     QMessageBox.critical(self, "Ошибка", "Ошибка при импорте ставок")
                     logger.error("Ошибка при импорте ставок")
@@ -543,46 +740,84 @@ class MainApplication(QMainWindow):
         logger.info("Начало экспорта в Excel")
         try:
             # Используем каталог для выбора изделия
-            if hasattr(self.interface.catalog_tab, 'table_view'):
-                current_index = self.interface.catalog_tab.table_view.currentIndex()
-                if not current_index.isValid():
-                    QMessageBox.warning(self, "Ошибка", "Выберите изделие для экспорта")
-                    return
-
-                # Получаем ID изделия из каталога
-                row = current_index.row()
-                article = self.interface.catalog_tab.model._data[row][1]
-                name = self.interface.catalog_tab.model._data[row][2]
-
-                product_info = self.db_manager.fetch_one(
-                    "SELECT id FROM products WHERE article = ? AND name = ?",
-                    (article, name)
-                )
-
-                if product_info:
-                    product_id = product_info[0]
-                    file_path, _ = QFileDialog.getSaveFileName(
-                        self,
-                        "Экспорт в Excel",
-                        f"data/products/{article}_{name}.xlsx",
-                        "Excel Files (*.xlsx)"
-                    )
-
-                    if file_path:
-                        success = self.interface.report_manager.export_product_to_excel(product_id, file_path)
-                        if success:
-                            QMessageBox.information(self, "Успех", "Файл успешно экспортирован")
-                            logger.info("Файл успешно экспортирован в Excel")
-                        else:
-                            QMessageBox.critical(self, "Ошибка", "Ошибка при экспорте")
-                            logger.error("Ошибка при экспорте в Excel")
-            else:
+            product_id = self.interface.catalog_tab.selected_product_id()
+            if product_id is None:
                 QMessageBox.warning(self, "Ошибка", "Выберите изделие для экспорта")
+                return
+
+            product_info = self.db_manager.fetch_one(
+                "SELECT article, name FROM products WHERE id = ?", (product_id,)
+            )
+            if not product_info:
+                QMessageBox.warning(self, "Ошибка", "Не удалось найти изделие в БД")
+                return
+
+            article, name = product_info
+            file_path, _ = QFileDialog.getSaveFileName(
+                self,
+                "Экспорт в Excel",
+                f"data/products/{article}_{name}.xlsx",
+                "Excel Files (*.xlsx)"
+            )
+
+            if file_path:
+                # Запись файла — в фоне, о завершении сообщит строка состояния
+                self.interface.export_queue.submit(
+                    f"Экспорт изделия: {os.path.basename(file_path)}",
+                    self.interface.report_manager.export_product_to_excel, product_id, file_path,
+                    key=os.path.abspath(file_path)
+                )
 
         except Exception as e:
             logger.error(f"Ошибка при экспорте в Excel: {e}", exc_info=True)
             QMessageBox.critical(self, "Ошибка", f"Ошибка при экспорте в Excel: {e}")
 
+    def export_all_product_cards(self):
+        """Перезапись карточек всех изделий (Excel, по желанию PDF) в data/products в несколько процессов"""
+        logger.info("Пакетная выгрузка карточек изделий")
+        reply = QMessageBox.question(
+            self, "Выгрузка карточек",
+            "Перезаписать карточки всех изделий в data/products?\n\n"
+            "Да — только Excel, Нет — Excel и PDF.",
+            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel
+        )
+        if reply == QMessageBox.Cancel:
+            return
+
+        # Одиночные записи карточек из очереди экспорта не должны писать те же файлы одновременно
+        self.interface.export_queue.wait_for_all()
+
+        progress = QProgressDialog("Выгрузка карточек изделий...", "Отмена", 0, 100, self)
+        progress.setWindowTitle("Выгрузка карточек")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+
+        def on_progress(done, total):
+            progress.setMaximum(total)
+            progress.setValue(done)
+            QApplication.processEvents()
+            return not progress.wasCanceled()
+
+        try:
+            report = BulkExportManager(self.db_manager).export_cards(
+                with_pdf=reply == QMessageBox.No, progress_callback=on_progress)
+        finally:
+            progress.close()
+
+        if report is None:
+            if progress.wasCanceled():
+                QMessageBox.information(self, "Выгрузка карточек", "Выгрузка отменена, уже записанные карточки сохранены")
+            else:
+                QMessageBox.critical(self, "Ошибка", "Ошибка при выгрузке карточек изделий")
+            return
+
+        text = f"Записано карточек: {report.written} из {report.total}\nОшибок: {len(report.failed)}"
+        if report.failed:
+            text += "\n\n" + "\n".join(f"ID {product_id}: {reason}" for product_id, reason in report.failed[:15])
+            if len(report.failed) > 15:
+                text += f"\n... и еще {len(report.failed) - 15} (см. журнал)"
+        QMessageBox.information(self, "Выгрузка карточек", text)
+
     def export_to_pdf(self):
         """Экспорт в PDF"""
         logger.info("Начало экспорта в PDF")
@@ -597,99 +832,33 @@ class MainApplication(QMainWindow):
         """Рассчитать цену для выбранного в каталоге изделия"""
         logger.info("Начало расчета цены для выбранного изделия")
         try:
-            if hasattr(self.interface.catalog_tab, 'table_view'):
-                current_index = self.interface.catalog_tab.table_view.currentIndex()
-                if not current_index.isValid():
-                    QMessageBox.warning(self, "Ошибка", "Выберите изделие из каталога для расчета цены.")
-                    return
-
-                # Получаем ID изделия из каталога
-                row = current_index.row()
-                article = self.interface.catalog_tab.model._data[row][1]
-                name = self.interface.catalog_tab.model._data[row][2]
-
-                product_info = self.db_manager.fetch_one(
-                    "SELECT id FROM products WHERE article = ? AND name = ?",
-                    (article, name)
-                )
-
-                if product_info:
-                    product_id = product_info[0]
-                    self.switch_to_pricing_tab(product_id)
-                else:
-                    QMessageBox.warning(self, "Ошибка", "Не удалось найти изделие в БД")
-            else:
+            product_id = self.interface.catalog_tab.selected_product_id()
+            if product_id is None:
                 QMessageBox.warning(self, "Ошибка", "Выберите изделие из каталога для расчета цены.")
+                return
+            self.switch_to_pricing_tab(product_id)
 
         except Exception as e:
             logger.error(f"Ошибка при расчете цены выбранного изделия: {e}", exc_info=True)
             QMessageBox.critical(self, "Ошибка", f"Ошибка при расчете цены: {e}")
 
-    def fix_pricing_data(self):
-        """Исправление некорректных данных цены в БД"""
-        logger.info("Исправление некорректных данных цены в БД")
-        try:
-            products = self.db_manager.fetch_all("""
-                SELECT id, overhead_percent, profit_percent, approved_price 
-                FROM products 
-                WHERE overhead_percent IS NOT NULL AND typeof(overhead_percent) != 'real'
-                   OR profit_percent IS NOT NULL AND typeof(profit_percent) != 'real'
-                   OR approved_price IS NOT NULL AND typeof(approved_price) != 'real'
-            """)
-
-            for product in products:
-                product_id, overhead, profit, approved = product
-                logger.warning(f"Исправление данных для изделия ID {product_id}")
-
-                # Сбрасываем некорректные значения к значениям по умолчанию
-                query = """
-                    UPDATE products 
-                    SET overhead_percent = 0.55, profit_percent = 0.30, approved_price = 0.0
-                    WHERE id = ?
-                """
-                self.db_manager.execute_query(query, (product_id,))
-
-            logger.info(f"Исправлено {len(products)} изделий с некорректными данными цены")
-
-        except Exception as e:
-            logger.error(f"Ошибка при исправлении данных цены: {e}", exc_info=True)
-
     def fix_incorrect_approved_prices(self):
         """Исправление некорректных утвержденных цен в БД"""
         logger.info("Исправление некорректных утвержденных цен в БД")
         try:
-            # Находим изделия с некорректными утвержденными ценами
-            products = self.db_manager.fetch_all("""
-                SELECT p.id, p.approved_price, 
-                       (SELECT SUM(pm.cost) FROM product_materials pm WHERE pm.product_id = p.id) as materials_cost,
-                       (SELECT SUM(o.cost) FROM operations o WHERE o.product_id = p.id) as operations_cost
-                FROM products p
-                WHERE p.approved_price IS NOT NULL 
-                  AND (p.approved_price <= 1.0 OR p.approved_price IS NULL)
-            """)
-
-            fixed_count = 0
-            for product in products:
-                product_id, approved_price, materials_cost, operations_cost = product
-                materials_cost = materials_cost or 0
-                operations_cost = operations_cost or 0
-
-                # Расчет правильной цены
-                prime_cost = materials_cost + operations_cost
-                overhead_cost = prime_cost * 0.55
-                profit_base = prime_cost + overhead_cost
-                profit_cost = profit_base * 0.30
-                calculated_price = prime_cost + overhead_cost + profit_cost
-
-                if calculated_price > 0:
-                    # Обновляем некорректную цену
-                    query = "UPDATE products SET approved_price = ? WHERE id = ?"
-                    self.db_manager.execute_query(query, (calculated_price, product_id))
-                    fixed_count += 1
-                    logger.info(
-                        f"Исправлена утвержденная цена для изделия ID {product_id}: {approved_price} -> {calculated_price}")
-
-            logger.info(f"Исправлено {fixed_count} изделий с некорректными утвержденными ценами")
+            # Отбор в SQL по сводке стоимости: читаются только изделия, которые нужно исправить
+            updates = []
+            for row in ProductManager(self.db_manager).get_incorrect_approved_prices():
+                product_id, approved_price, calculated_price = row.id, row.approved_price, row.formula_price
+                updates.append((calculated_price, product_id))
+                logger.info(
+                    f"Исправлена утвержденная цена для изделия ID {product_id}: {approved_price} -> {calculated_price}")
+
+            if updates:
+                with self.db_manager.transaction():
+                    self.db_manager.execute_many("UPDATE products SET approved_price = ? WHERE id = ?", updates)
+
+            logger.info(f"Исправлено {len(updates)} изделий с некорректными утвержденными ценами")
 
         except Exception as e:
             logger.error(f"Ошибка при исправлении утвержденных цен: {e}", exc_info=True)
@@ -736,16 +905,8 @@ def main():
         app.setStyle('Fusion')
         logger.debug("QApplication инициализировано")
 
-        # Создаём менеджер базы данных
-        db_manager = DatabaseManager()
-
-        # ✅ Добавляем колонку, если её нет
-        ensure_calculated_price_column(db_manager)
-
-        # Теперь создаём главное окно
+        # Схема БД приводится к актуальной версии внутри DatabaseManager
         window = MainApplication()
-        # Передаём db_manager вручную, если он создаётся внутри MainApplication — пропустите эту строку
-        # ИЛИ: убедитесь, что внутри MainApplication.__init__ тоже вызывается ensure_calculated_price_column
 
         window.show()
         logger.info("Главное окно показано")
@@ -761,4 +922,7 @@ def main():
 
 
 if __name__ == '__main__':
+    # В собранном exe (PyInstaller) процесс пула выгрузки запускает тот же exe:
+    # freeze_support выполняет задание пула вместо запуска второго окна
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,202 @@
+# modules/bulk_export.py
+"""
+Пакетная выгрузка карточек изделий (data/products/<артикул>_<название>.xlsx, по желанию и PDF)
+в несколько процессов.
+
+Изделия делятся на группы по BULK_EXPORT_CHUNK_SIZE; процесс пула читает данные группы
+тремя запросами с IN (изделия, операции, строки материалов) через свое соединение
+с БД и пишет карточки тем же кодом, что и ProductManager.save_product_to_excel.
+
+Запуск из командной строки (из каталога программы):
+    python -m modules.bulk_export [--db data/database.db] [--ids 1 2 3] [--search текст] [--pdf] [--workers N]
+"""
+import argparse
+import logging
+import os
+import sys
+from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterable, Optional
+
+from modules.database import DatabaseManager
+from modules.products import ProductManager
+from modules.queries import PRODUCTS_BY_IDS, PRODUCTS_MATERIAL_LINES, PRODUCTS_OPERATIONS, expand_in
+from modules.reports import ReportManager
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_DIR = os.path.join("data", "products")
+
+# Изделий на одно задание процесса: три запроса с IN и отчет о прогрессе на группу
+BULK_EXPORT_CHUNK_SIZE = 100
+
+# failed — [(id изделия, причина)]
+BulkExportReport = namedtuple("BulkExportReport", "total written failed")
+
+
+def card_path(product_info, output_dir=PRODUCTS_DIR, extension="xlsx"):
+    """Путь карточки изделия (как при сохранении изделия в MainApplication.save_product)"""
+    return os.path.join(output_dir, f"{product_info.article}_{product_info.name}.{extension}")
+
+
+def _write_chunk(db_manager, product_ids, output_dir, with_pdf):
+    """Карточки группы изделий: данные группы — тремя запросами, затем запись файлов"""
+    product_manager, report_manager = ProductManager(db_manager), ReportManager(db_manager)
+    products = {row.id: row for row in
+                db_manager.fetch_all(expand_in(PRODUCTS_BY_IDS, len(product_ids)), product_ids)}
+    operations, materials = defaultdict(list), defaultdict(list)
+    for row in db_manager.fetch_all(expand_in(PRODUCTS_OPERATIONS, len(product_ids)), product_ids):
+        operations[row.product_id].append(row)
+    for row in db_manager.fetch_all(expand_in(PRODUCTS_MATERIAL_LINES, len(product_ids)), product_ids):
+        materials[row.product_id].append(row)
+
+    written, failed = 0, []
+    for product_id in product_ids:
+        product_info = products.get(product_id)
+        if product_info is None:
+            failed.append((product_id, "изделие не найдено"))
+            continue
+        file_path = card_path(product_info, output_dir)
+        ok = product_manager.write_product_card(product_info, operations[product_id], materials[product_id], file_path)
+        if ok and with_pdf:
+            file_path = card_path(product_info, output_dir, "pdf")
+            ok = report_manager.write_product_pdf(product_info, operations[product_id], materials[product_id], file_path)
+        if ok:
+            written += 1
+        else:
+            failed.append((product_id, f"не удалось записать {os.path.basename(file_path)}"))
+    return written, failed
+
+
+# Соединение с БД процесса пула (создается инициализатором один раз на процесс)
+_worker_db = None
+
+
+def _init_worker(db_path, storage_profile):
+    global _worker_db
+    _worker_db = DatabaseManager(db_path, storage_profile)
+
+
+def _export_chunk(product_ids, output_dir, with_pdf):
+    return _write_chunk(_worker_db, product_ids, output_dir, with_pdf)
+
+
+class BulkExportManager:
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def export_cards(self, product_ids: Optional[Iterable[int]] = None,
+                     output_dir: str = PRODUCTS_DIR,
+                     with_pdf: bool = False,
+                     workers: Optional[int] = None,
+                     progress_callback: Optional[Callable[[int, int], bool]] = None) -> Optional[BulkExportReport]:
+        """
+        Перезапись карточек изделий (product_ids=None — всех) в output_dir, with_pdf — также PDF.
+        Группы изделий выгружаются в workers процессах (по умолчанию — по числу ядер);
+        одна группа выгружается в текущем процессе.
+        progress_callback(выгружено изделий, всего) вызывается после каждой группы; если он
+        вернул False, невыполненные группы отменяются (уже записанные файлы остаются).
+        Возвращает BulkExportReport или None при ошибке/отмене.
+        """
+        if product_ids is None:
+            product_ids = [row[0] for row in self.db_manager.fetch_all("SELECT id FROM products ORDER BY id")]
+        else:
+            product_ids = list(dict.fromkeys(product_ids))
+        total = len(product_ids)
+        chunks = [product_ids[start:start + BULK_EXPORT_CHUNK_SIZE]
+                  for start in range(0, total, BULK_EXPORT_CHUNK_SIZE)]
+        workers = min(workers or os.cpu_count() or 1, len(chunks)) or 1
+        if workers > 1 and getattr(sys, "frozen", False):
+            # Пул процессов в собранном exe не проверен — группы пишутся в этом процессе
+            logger.info("[ВЫГРУЗКА] Собранное приложение: выгрузка без пула процессов")
+            workers = 1
+        logger.info(f"[ВЫГРУЗКА] Выгрузка карточек: {total} изделий, групп {len(chunks)}, процессов {workers}"
+                    f"{', с PDF' if with_pdf else ''}")
+
+        written, failed = 0, []
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            if workers == 1:
+                for chunk in chunks:
+                    chunk_written, chunk_failed = _write_chunk(self.db_manager, chunk, output_dir, with_pdf)
+                    written, failed = written + chunk_written, failed + chunk_failed
+                    if progress_callback and progress_callback(written + len(failed), total) is False:
+                        raise InterruptedError("выгрузка отменена пользователем")
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(self.db_manager.db_path, self.db_manager.storage_profile)) as pool:
+                    pending = {pool.submit(_export_chunk, chunk, output_dir, with_pdf) for chunk in chunks}
+                    try:
+                        while pending:
+                            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                chunk_written, chunk_failed = future.result()
+                                written, failed = written + chunk_written, failed + chunk_failed
+                            # Вызывается и без завершенных групп: окно прогресса обрабатывает события
+                            if progress_callback and progress_callback(written + len(failed), total) is False:
+                                raise InterruptedError("выгрузка отменена пользователем")
+                    except BaseException:
+                        for future in pending:
+                            future.cancel()
+                        raise
+        except InterruptedError as e:
+            logger.warning(f"[ВЫГРУЗКА] Выгрузка карточек прервана: {e} (записано {written} из {total})")
+            return None
+        except Exception as e:
+            logger.error(f"[ВЫГРУЗКА] Ошибка выгрузки карточек: {e}", exc_info=True)
+            return None
+
+        for product_id, reason in failed:
+            logger.warning(f"[ВЫГРУЗКА] Изделие ID {product_id}: {reason}")
+        logger.info(f"[ВЫГРУЗКА] Выгрузка карточек завершена: записано {written} из {total}, ошибок {len(failed)}")
+        return BulkExportReport(total, written, failed)
+
+
+def _search_product_ids(db_manager, text):
+    """ID изделий, в артикуле или названии которых есть text"""
+    pattern = f"%{text}%"
+    return [row[0] for row in db_manager.fetch_all(
+        "SELECT id FROM products WHERE article LIKE ? OR name LIKE ? ORDER BY id", (pattern, pattern))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная выгрузка карточек изделий в Excel/PDF")
+    parser.add_argument("--db", default=os.path.join("data", "database.db"), help="путь к БД")
+    parser.add_argument("--ids", type=int, nargs="+", help="ID изделий (по умолчанию — все)")
+    parser.add_argument("--search", help="только изделия с текстом в артикуле или названии")
+    parser.add_argument("--output", default=PRODUCTS_DIR, help="каталог карточек")
+    parser.add_argument("--pdf", action="store_true", help="также PDF")
+    parser.add_argument("--workers", type=int, help="число процессов (по умолчанию — по числу ядер)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    db_manager = DatabaseManager(args.db)
+    try:
+        product_ids = args.ids
+        if args.search:
+            found = _search_product_ids(db_manager, args.search)
+            if product_ids:
+                found = set(found)
+                product_ids = [product_id for product_id in product_ids if product_id in found]
+            else:
+                product_ids = found
+
+        def on_progress(done, total):
+            print(f"\rВыгружено {done} из {total}", end="", file=sys.stderr, flush=True)
+
+        report = BulkExportManager(db_manager).export_cards(
+            product_ids, args.output, args.pdf, args.workers, progress_callback=on_progress)
+        print(file=sys.stderr)
+    finally:
+        db_manager.close()
+
+    if report is None:
+        return 1
+    print(f"Записано карточек: {report.written} из {report.total}, ошибок: {len(report.failed)}")
+    for product_id, reason in report.failed:
+        print(f"  ID {product_id}: {reason}")
+    return 0 if not report.failed else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# modules/catalog_search.py
+"""
+Полнотекстовый поиск по каталогу изделий (SQLite FTS5).
+
+products_fts — строка на изделие (rowid = products.id): артикул, название, код изделия,
+названия материалов и операций изделия. Таблицу поддерживают триггеры на изделиях,
+строках материалов и операций и справочнике материалов (таблицу и триггеры создает
+миграция 13, modules/migrations.py); пересчет стоимости (UPDATE cost) их не затрагивает.
+
+Токенизатор unicode61 приводит регистр (в т.ч. кириллицы) и убирает диакритику;
+каждое слово запроса ищется как префикс, слова объединяются по И. По запросу
+результат упорядочивается по bm25 с большим весом артикула и названия.
+
+Если SQLite собран без FTS5, таблица не создается: CatalogSearchManager.search_condition
+ищет подстроку (LIKE) в артикуле, названии и коде изделия без учета регистра —
+через py_lower (database.SQL_FUNCTIONS): LIKE SQLite не приводит регистр кириллицы.
+"""
+import logging
+import re
+
+from modules.queries import CATALOG_SEARCH_RANKED
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "products_fts"
+
+
+def is_installed(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).fetchone() is not None
+
+
+def build_match_query(text):
+    """
+    Текст поиска -> выражение MATCH; слова (через пробел) объединяются по И.
+    Слово ищется как префикс, точное совпадение дает больший вклад в релевантность;
+    слово с разделителями (A-46, 12.5) — фраза из его частей подряд.
+    None, если в тексте нет слов.
+    """
+    terms = []
+    for word in text.lower().split():
+        parts = re.findall(r"\w+", word)
+        if parts:
+            phrase = " ".join(parts)
+            terms.append(f'("{phrase}" OR "{phrase}"*)')
+    return " AND ".join(terms) or None
+
+
+class CatalogSearchManager:
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._available = None
+
+    def available(self):
+        """Есть ли в БД поисковый индекс (проверяется один раз)"""
+        if self._available is None:
+            with self.db_manager.get_connection() as conn:
+                self._available = is_installed(conn)
+        return self._available
+
+    def search_condition(self, text):
+        """
+        Условие WHERE окна каталога (изделие p) для текста поиска: (SQL, параметры);
+        None — текст пуст
+        """
+        if not text.strip():
+            return None
+        match = build_match_query(text) if self.available() else None
+        if match is not None:
+            # +p.id: проверка по списку найденных, а не выборка по нему — строки идут по индексу
+            # сортировки, и первая страница не ждет сортировки всех найденных
+            return f"+p.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?)", (match,)
+        # Без поискового индекса (или без слов в тексте) — подстрока без учета регистра;
+        # % и _ ищутся как есть
+        pattern = "%" + re.sub(r"([\\%_])", r"\\\1", text.strip().casefold()) + "%"
+        return ("(py_lower(p.article) LIKE ? ESCAPE '\\' OR py_lower(p.name) LIKE ? ESCAPE '\\' "
+                "OR py_lower(p.product_id) LIKE ? ESCAPE '\\')"), (pattern, pattern, pattern)
+
+    def ranked_ids(self, text):
+        """ID изделий, найденных по тексту, в порядке релевантности; None — поискового индекса нет"""
+        if not self.available():
+            return None
+        match = build_match_query(text)
+        if match is None:
+            return None
+        return [row.id for row in self.db_manager.fetch_all(CATALOG_SEARCH_RANKED, (match,))]
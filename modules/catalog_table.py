@@ -13,17 +13,259 @@ if plugins_path.exists():
     os.environ["QT_QPA_PLATFORM_PLUGIN_PATH"] = str(plugins_path)
 # modules/catalog_table.py
 import logging
+
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+    QWidget, QVBoxLayout, QHBoxLayout, QTableView, QAbstractItemView,
     QPushButton, QHeaderView, QMessageBox, QLineEdit, QLabel,
     QComboBox, QDialog, QFormLayout, QDialogButtonBox
 )
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, pyqtSignal, QAbstractTableModel, QModelIndex, QTimer
 from PyQt5.QtGui import QFont, QColor
 import pandas as pd
 
+from modules.catalog_search import CatalogSearchManager
+from modules.catalog_window import CatalogWindow
+from modules.events import ProductEventBus
+from modules.export_jobs import ExportQueue
+from modules.products import ProductManager
+
 logger = logging.getLogger(__name__)
 
+# Больше затронутых изделий — дешевле перечитать окно каталога, чем сверять строки
+CATALOG_ROW_REFRESH_LIMIT = 200
+
+# Пауза после ввода в поле поиска перед запросом к поисковому индексу, мс
+SEARCH_DEBOUNCE_MS = 250
+
+CATALOG_COLUMNS = (
+    "ID", "Артикул", "Название", "Материал", "Работа",
+    "Себестоимость", "Накладные", "Прибыль",
+    "Расчётная цена", "Утверждённая цена", "Дата создания"
+)
+_COL_ID, _COL_ARTICLE, _COL_NAME, _COL_CALCULATED, _COL_APPROVED, _COL_DATE = 0, 1, 2, 8, 9, 10
+_MONEY_COLUMNS = range(3, 10)
+
+# Столбцы, сортируемые щелчком по заголовку -> ключ сортировки окна (catalog_window.SORT_KEYS)
+_COLUMN_SORT_KEYS = {
+    _COL_ID: "id",
+    _COL_ARTICLE: "article",
+    _COL_NAME: "name",
+    5: "prime_cost",
+    _COL_CALCULATED: "calculated_price",
+    _COL_APPROVED: "approved_price",
+    _COL_DATE: "created_date",
+}
+
+# Ключ комбобокса сортировки -> (ключ сортировки окна, по убыванию); "relevance" без поиска — по дате
+_SORT_KEYS = {
+    "article": ("article", False),
+    "name": ("name", False),
+    "created_date": ("created_date", True),
+    "approved_price": ("approved_price", True),
+    "calculated_price": ("calculated_price", True),
+    "prime_cost": ("prime_cost", True),
+    "relevance": ("created_date", True),
+}
+
+# Сравнение утвержденной и расчетной цены
+_COLOR_ABOVE = QColor(255, 255, 200)  # светло-жёлтый
+_COLOR_BELOW = QColor(255, 200, 200)  # светло-красный
+_COLOR_EQUAL = QColor(200, 255, 200)  # светло-зелёный
+
+
+def _display_row(product):
+    """Строка сводки каталога -> значения столбцов каталога (без форматирования)"""
+    # Расчётная цена — по сводке стоимости, как и остальные суммы строки и сортировка
+    # по этому столбцу (catalog_window.SORT_KEYS); сохраненная products.calculated_price
+    # обновляется только при сохранении или пересчете изделия
+    return (
+        product.id, product.article or "", product.name or "",
+        product.materials_cost or 0.0, product.labor_cost or 0.0, product.prime_cost or 0.0,
+        product.overhead_cost or 0.0, product.profit_cost or 0.0,
+        product.formula_price or 0.0, product.approved_price or 0.0, product.created_date or ""
+    )
+
+
+def _cell_text(column, value):
+    """Текст ячейки каталога (как в таблице и в экспорте)"""
+    if column == _COL_APPROVED:
+        return f"{value:.2f} грн" if value else "Не утверждена"
+    if column in _MONEY_COLUMNS:
+        return f"{value:.2f} грн"
+    if column == _COL_DATE:
+        return value[:10]
+    return str(value)
+
+
+def _same_place(old, new):
+    """Прежний ли ключ сортировки у строки окна (место строки не изменилось)"""
+    return (old.sort_key, old.sort_id) == (new.sort_key, new.sort_id)
+
+
+def write_catalog_excel(window, columns, file_path):
+    """Запись строк окна каталога в Excel (выполняется в потоке экспорта, строки читаются здесь же)"""
+    export_data = [
+        [_cell_text(column, value) for column, value in enumerate(_display_row(product))]
+        for product in window.iter_rows()
+    ]
+    pd.DataFrame(export_data, columns=columns).to_excel(file_path, index=False)
+    logger.info(f"Каталог экспортирован в {file_path}")
+    return True
+
+
+class CatalogModel(QAbstractTableModel):
+    """
+    Модель каталога над окном строк (modules/catalog_window.py): сортировка и фильтр
+    выполняются в SQL, в памяти — только недавно показанные страницы. Текст и цвет
+    ячейки формируются только при запросе представлением (видимые строки).
+    """
+
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self._window = CatalogWindow(db_manager)
+        # Ошибка чтения страницы пишется в журнал один раз до смены окна
+        self._read_failed = False
+
+    def window(self):
+        return self._window
+
+    def set_window(self, window):
+        """Новые сортировка или фильтр"""
+        self.beginResetModel()
+        self._window = window
+        self._read_failed = False
+        self.endResetModel()
+
+    def reload(self):
+        """Перечитать окно (состав каталога изменился)"""
+        self.beginResetModel()
+        self._window.reset()
+        self._read_failed = False
+        self.endResetModel()
+
+    def apply_changes(self, product_ids, inserted=False):
+        """
+        Точечное обновление строк изделий, измененных в БД (inserted — добавленных).
+        Строка с прежним ключом сортировки обновляется на месте; сменившая место удаляется
+        и вставляется на новое, вышедшая из фильтра или удаленная — удаляется.
+        False — положение изделия в окне неизвестно (строка не прочитана), окно нужно перечитать.
+        """
+        window = self._window
+        product_ids = set(product_ids)
+        known = window.known_positions(product_ids)
+        cached = window.cached_rows(product_ids)
+        fresh = {row.id: row for row in window.fresh_rows(product_ids)}
+
+        patched, removed, added = [], [], []
+        for product_id in product_ids:
+            position, row = known.get(product_id), fresh.get(product_id)
+            if position is None:
+                if inserted or window.ranked_ids is not None:
+                    # Добавленного изделия в окне не было; в окне релевантности — только найденные
+                    if row is not None:
+                        added.append(row)
+                    continue
+                if row is None or not window.keys_stable():
+                    return False
+                # Непрочитанная строка осталась на месте — будет прочитана свежей
+                continue
+            if row is None:
+                removed.append(position)
+            elif window.ranked_ids is not None or _same_place(cached[product_id][1], row):
+                patched.append((position, row))
+            else:
+                removed.append(position)
+                added.append(row)
+
+        # Новые позиции — по состоянию БД после изменения: вставка по возрастанию после всех удалений
+        targets = sorted((window.position_of(row), row.id) for row in added)
+        if targets and targets[-1][0] >= window.count() - len(removed) + len(targets):
+            return False
+
+        window.patch_rows([row for _position, row in patched])
+        last_column = len(CATALOG_COLUMNS) - 1
+        for position, _row in patched:
+            self.dataChanged.emit(self.index(position, 0), self.index(position, last_column))
+        for position in sorted(removed, reverse=True):
+            self.beginRemoveRows(QModelIndex(), position, position)
+            window.remove_row(position)
+            self.endRemoveRows()
+        for position, _product_id in targets:
+            self.beginInsertRows(QModelIndex(), position, position)
+            window.insert_row(position)
+            self.endInsertRows()
+        return True
+
+    def filtered_count(self):
+        return self._row_count()
+
+    def product_at(self, position):
+        """Строка сводки изделия на позиции или None"""
+        try:
+            return self._window.row(position)
+        except Exception as e:
+            if not self._read_failed:
+                self._read_failed = True
+                logger.error(f"[КАТАЛОГ] Ошибка чтения строк каталога: {e}", exc_info=True)
+            return None
+
+    def product_id_at(self, position):
+        product = self.product_at(position)
+        return product.id if product else None
+
+    def product_name_at(self, position):
+        product = self.product_at(position)
+        return product.name if product else None
+
+    def _row_count(self):
+        try:
+            return self._window.count()
+        except Exception as e:
+            if not self._read_failed:
+                self._read_failed = True
+                logger.error(f"[КАТАЛОГ] Ошибка подсчета строк каталога: {e}", exc_info=True)
+            return 0
+
+    # --- QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count()
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(CATALOG_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and 0 <= section < len(CATALOG_COLUMNS):
+            return CATALOG_COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role == Qt.TextAlignmentRole:
+            if column in _MONEY_COLUMNS:
+                return Qt.AlignRight | Qt.AlignVCenter
+            if column == _COL_DATE:
+                return Qt.AlignCenter
+            return None
+        if role not in (Qt.DisplayRole, Qt.BackgroundRole):
+            return None
+        if role == Qt.BackgroundRole and column not in (_COL_CALCULATED, _COL_APPROVED):
+            return None
+        product = self.product_at(index.row())
+        if product is None:
+            return None
+        values = _display_row(product)
+        if role == Qt.DisplayRole:
+            return _cell_text(column, values[column])
+        approved, calculated = values[_COL_APPROVED], values[_COL_CALCULATED]
+        if approved and calculated:
+            if abs(approved - calculated) <= 0.01:
+                return _COLOR_EQUAL
+            return _COLOR_ABOVE if approved > calculated else _COLOR_BELOW
+        return None
+
 
 class CatalogTable(QWidget):
     """Виджет каталога изделий с расширенным функционалом"""
@@ -34,10 +276,19 @@ class CatalogTable(QWidget):
     catalog_updated = pyqtSignal()  # каталог обновлен
     product_edit_requested = pyqtSignal(int)  # запрос на редактирование
 
-    def __init__(self, db_manager, parent=None):
+    def __init__(self, db_manager, parent=None, export_queue=None, product_events=None):
         super().__init__(parent)
         self.db_manager = db_manager
-        self.current_products = []
+        self.product_manager = ProductManager(db_manager)
+        # Экспорт в Excel — в фоне; очередь обычно общая для всего окна
+        self.export_queue = export_queue or ExportQueue(parent=self, db_manager=db_manager)
+        self.search_manager = CatalogSearchManager(db_manager)
+
+        # Изменения изделий (сохранение, удаление, цена, пересчет) обновляют только их строки
+        self.product_events = product_events or ProductEventBus(self)
+        self.product_events.products_inserted.connect(self.on_products_inserted)
+        self.product_events.products_updated.connect(self.refresh_products)
+        self.product_events.products_deleted.connect(self.refresh_products)
 
         self.init_ui()
         self.load_products()
@@ -52,10 +303,16 @@ class CatalogTable(QWidget):
         # Поиск
         filter_layout.addWidget(QLabel("Поиск:"))
         self.search_edit = QLineEdit()
-        self.search_edit.setPlaceholderText("Поиск по артикулу или названию...")
-        self.search_edit.textChanged.connect(self.apply_filters)
+        self.search_edit.setPlaceholderText("Поиск по артикулу, названию, материалам, операциям...")
         filter_layout.addWidget(self.search_edit)
 
+        # Запрос к поисковому индексу — после паузы во вводе, а не на каждый символ
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.apply_filters)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+
         # Сортировка
         filter_layout.addWidget(QLabel("Сортировка:"))
         self.sort_combo = QComboBox()
@@ -63,36 +320,41 @@ class CatalogTable(QWidget):
         self.sort_combo.addItem("По названию", "name")
         self.sort_combo.addItem("По дате создания", "created_date")
         self.sort_combo.addItem("По утвержденной цене", "approved_price")
-        self.sort_combo.currentIndexChanged.connect(self.apply_filters)
+        self.sort_combo.addItem("По расчётной цене", "calculated_price")
+        self.sort_combo.addItem("По себестоимости", "prime_cost")
+        self.sort_combo.addItem("По релевантности поиска", "relevance")
+        self.sort_combo.currentIndexChanged.connect(self.on_sort_changed)
         filter_layout.addWidget(self.sort_combo)
 
         filter_layout.addStretch()
         layout.addLayout(filter_layout)
 
-        # Таблица каталога - УВЕЛИЧИВАЕМ количество столбцов
-        self.products_table = QTableWidget()
-        self.products_table.setColumnCount(11)
-        self.products_table.setHorizontalHeaderLabels([
-            "ID", "Артикул", "Название", "Материал", "Работа",
-            "Себестоимость", "Накладные", "Прибыль",
-            "Расчётная цена", "Утверждённая цена", "Дата создания"
-        ])
-
-        # Настройка таблицы
+        # Таблица каталога: представление над моделью, ячейки форматируются только для видимых строк
+        self.model = CatalogModel(self.db_manager, self)
+        self.products_table = QTableView()
+        self.products_table.setModel(self.model)
+        self.products_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.products_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.products_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        # Высота строк постоянна: заголовок строк не измеряет каждую из сотен тысяч строк
+        vertical_header = self.products_table.verticalHeader()
+        vertical_header.setSectionResizeMode(QHeaderView.Fixed)
+        vertical_header.setDefaultSectionSize(vertical_header.minimumSectionSize() + 6)
+
+        # Настройка таблицы: ResizeToContents измерял бы все строки, ширина — по заголовку
         header = self.products_table.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)  # ID
-        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)  # Артикул
-        header.setSectionResizeMode(2, QHeaderView.Stretch)  # Название
-        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)  # Материал
-        header.setSectionResizeMode(4, QHeaderView.ResizeToContents)  # Работа
-        header.setSectionResizeMode(5, QHeaderView.ResizeToContents)  # Себестоимость
-        header.setSectionResizeMode(6, QHeaderView.ResizeToContents)  # Накладные
-        header.setSectionResizeMode(7, QHeaderView.ResizeToContents)  # Прибыль
-        header.setSectionResizeMode(8, QHeaderView.ResizeToContents)  # Расчётная
-        header.setSectionResizeMode(9, QHeaderView.ResizeToContents)  # Утверждённая
-        header.setSectionResizeMode(10, QHeaderView.ResizeToContents)  # Дата
-
-        self.products_table.setSortingEnabled(True)
+        header.setSectionResizeMode(QHeaderView.Interactive)
+        header.setSectionResizeMode(_COL_NAME, QHeaderView.Stretch)  # Название
+        for column in range(len(CATALOG_COLUMNS)):
+            if column != _COL_NAME:
+                self.products_table.resizeColumnToContents(column)
+
+        # Сортировка по заголовку — в SQL, по индексу столбца (несортируемые столбцы не реагируют)
+        header.setSectionsClickable(True)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.sortIndicatorChanged.connect(self.on_header_sort_changed)
+
         self.products_table.doubleClicked.connect(self.on_product_double_click)
         layout.addWidget(self.products_table)
 
@@ -124,191 +386,136 @@ class CatalogTable(QWidget):
         self.stats_label = QLabel("Всего изделий: 0")
         layout.addWidget(self.stats_label)
 
+        # Текущая сортировка: (ключ сортировки окна, по убыванию, по релевантности поиска)
+        # и столбец заголовка, по которому она задана (-1 — из комбобокса)
+        self._sort = self._combo_sort()
+        self._header_section = -1
+
     def load_products(self):
         """Загрузка изделий из базы данных с ценами и расчетами"""
         try:
-            # Получаем изделия с ценами и расчетами
-            query = """
-                SELECT p.id, p.product_id, p.article, p.name, p.created_date,
-                       p.approved_price, p.calculated_price,
-                       (SELECT SUM(o.cost) FROM operations o WHERE o.product_id = p.id) as operations_cost,
-                       (SELECT SUM(pm.cost) FROM product_materials pm WHERE pm.product_id = p.id) as materials_cost
-                FROM products p
-                ORDER BY p.created_date DESC
-            """
-
-            self.current_products = self.db_manager.fetch_all(query)
-            self.apply_filters()
-
-            logger.info(f"Загружено {len(self.current_products)} изделий в каталог")
+            self._rebuild_window()
+            logger.info(f"Загружено {self.model.filtered_count()} изделий в каталог")
 
         except Exception as e:
             logger.error(f"Ошибка при загрузке изделий в каталог: {e}", exc_info=True)
             QMessageBox.critical(self, "Ошибка", f"Ошибка при загрузке каталога: {e}")
 
     def apply_filters(self):
-        """Применение фильтров и сортировки"""
-        search_text = self.search_edit.text().strip().lower()
-        sort_by = self.sort_combo.currentData()
-
-        # Фильтрация
-        filtered_products = []
-        for product in self.current_products:
-            product_id, prod_id, article, name, created_date, approved_price, calculated_price_db, ops_cost, mat_cost = product
-
-            # Расчет стоимости
-            operations_cost = ops_cost if ops_cost else 0
-            materials_cost = mat_cost if mat_cost else 0
-            prime_cost = operations_cost + materials_cost  # Себестоимость
-
-            # Расчёт накладных и прибыли (как в UI)
-            overhead = prime_cost * 0.55
-            profit_base = prime_cost + overhead
-            profit = profit_base * 0.30
-            calculated_price = prime_cost + overhead + profit
-
-            # Используем расчётную цену из БД, если она есть (для согласованности)
-            if calculated_price_db is not None:
-                calculated_price = calculated_price_db
-
-            # Поиск
-            if (search_text in (article or "").lower() or
-                    search_text in (name or "").lower() or
-                    search_text in (prod_id or "").lower()):
-                filtered_products.append((
-                    product_id, prod_id, article, name, created_date,
-                    approved_price, calculated_price,
-                    materials_cost, operations_cost, prime_cost, overhead, profit
-                ))
+        """Применение фильтра поиска (порядок строк — выбранная сортировка или релевантность)"""
+        try:
+            self._rebuild_window()
+        except Exception as e:
+            logger.error(f"[ПОИСК] Ошибка поиска по каталогу '{self.search_edit.text()}': {e}", exc_info=True)
+
+    def _rebuild_window(self):
+        """Новое окно строк каталога по тексту поиска и сортировке; страницы читаются по мере показа"""
+        self.search_timer.stop()
+        sort_key, descending, ranked = self._sort
+        text = self.search_edit.text()
+        condition, params, ranked_ids = None, (), None
+        if text.strip():
+            if ranked:
+                ranked_ids = self.search_manager.ranked_ids(text)
+            if ranked_ids is None:
+                condition, params = self.search_manager.search_condition(text)
+        self.model.set_window(CatalogWindow(self.db_manager, sort_key, descending, condition, params, ranked_ids))
+        self._update_stats()
+
+    def _combo_sort(self):
+        sort_key = self.sort_combo.currentData()
+        window_key, descending = _SORT_KEYS.get(sort_key, _SORT_KEYS["created_date"])
+        return window_key, descending, sort_key == "relevance"
+
+    def on_sort_changed(self):
+        """Сортировка из комбобокса; индикатор сортировки по заголовку сбрасывается"""
+        self._header_section = -1
+        self._set_sort_indicator(-1, Qt.AscendingOrder)
+        self._set_sort(self._combo_sort())
+
+    def on_header_sort_changed(self, section, order):
+        """Сортировка щелчком по заголовку столбца"""
+        window_key = _COLUMN_SORT_KEYS.get(section)
+        if window_key is None:
+            # По столбцу нет индекса сортировки — индикатор возвращается к текущей сортировке
+            self._set_sort_indicator(self._header_section, Qt.DescendingOrder if self._sort[1] else Qt.AscendingOrder)
+            return
+        self._header_section = section
+        self._set_sort((window_key, order == Qt.DescendingOrder, False))
 
-        # Сортировка
-        if sort_by == "article":
-            filtered_products.sort(key=lambda x: x[2] or "")
-        elif sort_by == "name":
-            filtered_products.sort(key=lambda x: x[3] or "")
-        elif sort_by == "approved_price":
-            filtered_products.sort(key=lambda x: x[5] or 0, reverse=True)
-        else:  # created_date
-            filtered_products.sort(key=lambda x: x[4] or "", reverse=True)
-
-        # Обновление таблицы
-        self.update_products_table(filtered_products)
+    def _set_sort_indicator(self, section, order):
+        header = self.products_table.horizontalHeader()
+        header.blockSignals(True)
+        header.setSortIndicator(section, order)
+        header.blockSignals(False)
 
-        # Статистика
-        self.stats_label.setText(f"Всего изделий: {len(filtered_products)}")
-
-    def update_products_table(self, products):
-        """Обновление таблицы изделий с дополнительными полями"""
-        self.products_table.setRowCount(len(products))
-
-        for row, (product_id, prod_id, article, name, created_date,
-                  approved_price, calculated_price,
-                  materials_cost, operations_cost, prime_cost, overhead, profit) in enumerate(products):
-
-            # ID
-            self.products_table.setItem(row, 0, QTableWidgetItem(str(product_id)))
-            # Артикул
-            self.products_table.setItem(row, 1, QTableWidgetItem(article or ""))
-            # Название
-            self.products_table.setItem(row, 2, QTableWidgetItem(name or ""))
-            # Материал
-            mat_item = QTableWidgetItem(f"{materials_cost:.2f} грн")
-            mat_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            self.products_table.setItem(row, 3, mat_item)
-            # Работа
-            op_item = QTableWidgetItem(f"{operations_cost:.2f} грн")
-            op_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            self.products_table.setItem(row, 4, op_item)
-            # Себестоимость
-            prime_item = QTableWidgetItem(f"{prime_cost:.2f} грн")
-            prime_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            self.products_table.setItem(row, 5, prime_item)
-            # Накладные
-            overhead_item = QTableWidgetItem(f"{overhead:.2f} грн")
-            overhead_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            self.products_table.setItem(row, 6, overhead_item)
-            # Прибыль
-            profit_item = QTableWidgetItem(f"{profit:.2f} грн")
-            profit_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            self.products_table.setItem(row, 7, profit_item)
-            # Расчётная цена
-            calc_item = QTableWidgetItem(f"{calculated_price:.2f} грн")
-            calc_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            self.products_table.setItem(row, 8, calc_item)
-            # Утверждённая цена
-            approved_item = QTableWidgetItem(f"{approved_price:.2f} грн" if approved_price else "Не утверждена")
-            approved_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-
-            # Визуальное сравнение цен
-            if approved_price and calculated_price:
-                price_diff = abs(approved_price - calculated_price)
-                if price_diff > 0.01:
-                    if approved_price > calculated_price:
-                        color = QColor(255, 255, 200)  # светло-жёлтый
-                    else:
-                        color = QColor(255, 200, 200)  # светло-красный
-                    calc_item.setBackground(color)
-                    approved_item.setBackground(color)
-                else:
-                    color = QColor(200, 255, 200)  # светло-зелёный
-                    calc_item.setBackground(color)
-                    approved_item.setBackground(color)
-
-            self.products_table.setItem(row, 9, approved_item)
-            # Дата создания
-            date_item = QTableWidgetItem(created_date[:10] if created_date else "")
-            date_item.setTextAlignment(Qt.AlignCenter)
-            self.products_table.setItem(row, 10, date_item)
+    def _set_sort(self, sort):
+        if sort != self._sort:
+            self._sort = sort
+            self.apply_filters()
+
+    def _update_stats(self):
+        self.stats_label.setText(f"Всего изделий: {self.model.filtered_count()}")
+
+    def selected_product_id(self):
+        """ID изделия в текущей строке каталога или None"""
+        index = self.products_table.currentIndex()
+        if not index.isValid():
+            return None
+        return self.model.product_id_at(index.row())
+
+    def on_products_inserted(self, product_ids):
+        """Добавленные изделия встают в каталог на места по текущей сортировке"""
+        self.refresh_products(product_ids, inserted=True)
+
+    def refresh_products(self, product_ids, inserted=False):
+        """
+        Точечное обновление строк каталога для измененных или удаленных изделий;
+        при большом числе изделий или неизвестном положении строки окно перечитывается
+        (читается только видимая страница)
+        """
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+        try:
+            if len(product_ids) > CATALOG_ROW_REFRESH_LIMIT or not self.model.apply_changes(product_ids, inserted):
+                self.model.reload()
+            else:
+                logger.debug(f"Обновлено строк каталога: {len(product_ids)}")
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении строк каталога: {e}", exc_info=True)
+            self.model.reload()
+        self._update_stats()
 
     def edit_selected_product(self):
         """Редактирование выбранного изделия"""
-        current_row = self.products_table.currentRow()
-        if current_row < 0:
+        product_id = self.selected_product_id()
+        if product_id is None:
             QMessageBox.warning(self, "Ошибка", "Выберите изделие для редактирования")
             return
 
-        # Получаем ID изделия
-        product_id_item = self.products_table.item(current_row, 0)
-        if not product_id_item:
-            QMessageBox.warning(self, "Ошибка", "Не удалось получить ID изделия")
-            return
-
-        product_id = int(product_id_item.text())
         logger.info(f"Запрос на редактирование изделия ID {product_id}")
 
         # Отправляем сигнал для открытия редактора
         self.product_edit_requested.emit(product_id)
 
-    # Остальные методы остаются без изменений
     def on_product_double_click(self, index):
         """Обработка двойного клика по изделию"""
-        row = index.row()
-        product_id_item = self.products_table.item(row, 0)
-
-        if product_id_item:
-            product_id = int(product_id_item.text())
-            logger.info(f"Выбрано изделие ID {product_id} в каталоге")
-            self.product_selected.emit(product_id)
+        if not index.isValid():
+            return
+        product_id = self.model.product_id_at(index.row())
+        logger.info(f"Выбрано изделие ID {product_id} в каталоге")
+        self.product_selected.emit(product_id)
 
     def delete_selected_product(self):
         """Удаление выбранного изделия"""
-        current_row = self.products_table.currentRow()
-        if current_row < 0:
+        index = self.products_table.currentIndex()
+        if not index.isValid():
             QMessageBox.warning(self, "Ошибка", "Выберите изделие для удаления")
-
-        # Уведомляем интерфейс, что изделие удалено
-        if hasattr(self.parent(), 'on_catalog_product_deleted'):
-            self.parent().on_catalog_product_deleted(product_id)
-            return
-
-        # Получаем ID изделия
-        product_id_item = self.products_table.item(current_row, 0)
-        if not product_id_item:
-            QMessageBox.warning(self, "Ошибка", "Не удалось получить ID изделия")
             return
 
-        product_id = int(product_id_item.text())
-        product_name = self.products_table.item(current_row, 2).text() or "Неизвестно"
+        product_id = self.model.product_id_at(index.row())
+        product_name = self.model.product_name_at(index.row()) or "Неизвестно"
 
         # Подтверждение удаления
         reply = QMessageBox.question(
@@ -322,15 +529,16 @@ class CatalogTable(QWidget):
 
         if reply == QMessageBox.Yes:
             try:
-                # Удаляем через db_manager
-                self.db_manager.execute_query("DELETE FROM operations WHERE product_id = ?", (product_id,))
-                self.db_manager.execute_query("DELETE FROM product_materials WHERE product_id = ?", (product_id,))
-                self.db_manager.execute_query("DELETE FROM products WHERE id = ?", (product_id,))
+                # Удаляем через db_manager одной транзакцией
+                with self.db_manager.transaction():
+                    self.db_manager.execute_query("DELETE FROM operations WHERE product_id = ?", (product_id,))
+                    self.db_manager.execute_query("DELETE FROM product_materials WHERE product_id = ?", (product_id,))
+                    self.db_manager.execute_query("DELETE FROM products WHERE id = ?", (product_id,))
 
-                # Обновляем каталог
-                self.load_products()
+                # Строка удаляется из каталога (и у других подписчиков шины)
+                self.product_events.notify_deleted([product_id])
 
-                # Отправляем сигнал
+                # Отправляем сигнал (интерфейс сбрасывает форму, если изделие было открыто)
                 self.product_deleted.emit(product_id)
                 self.catalog_updated.emit()
 
@@ -354,25 +562,12 @@ class CatalogTable(QWidget):
             )
 
             if file_path:
-                # Подготавливаем данные для экспорта
-                export_data = []
-                for row in range(self.products_table.rowCount()):
-                    row_data = []
-                    for col in range(self.products_table.columnCount()):
-                        item = self.products_table.item(row, col)
-                        row_data.append(item.text() if item else "")
-                    export_data.append(row_data)
-
-                # Создаем DataFrame
-                df = pd.DataFrame(export_data, columns=[
-                    "ID", "Артикул", "Название", "Себестоимость", "Накладные", "Прибыль",
-                    "Расчетная цена", "Утвержденная цена", "Дата создания"
-                ])
-
-                # Экспортируем
-                df.to_excel(file_path, index=False)
-                QMessageBox.information(self, "Успех", f"Каталог экспортирован в {file_path}")
-                logger.info(f"Каталог экспортирован в {file_path}")
+                # Отфильтрованные строки в текущем порядке читаются и форматируются в потоке экспорта
+                self.export_queue.submit(
+                    f"Каталог: {os.path.basename(file_path)}",
+                    write_catalog_excel, self.model.window().copy(), list(CATALOG_COLUMNS), file_path,
+                    key=os.path.abspath(file_path)
+                )
 
         except Exception as e:
             logger.error(f"Ошибка при экспорте каталога: {e}", exc_info=True)
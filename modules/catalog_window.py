@@ -0,0 +1,251 @@
+# modules/catalog_window.py
+"""
+Окно строк каталога: фильтр и сортировка выполняются в SQL, строки читаются страницами
+по CATALOG_PAGE_SIZE с keyset-пагинацией — следующая страница начинается после
+(ключ сортировки, ID) последней строки предыдущей, по индексу ключа (migrations.INDEXES).
+
+В памяти — только недавно прочитанные страницы (CATALOG_PAGE_CACHE) и границы страниц.
+Страница, до которой не дочитали (прокрутка в конец), находится через OFFSET по индексу
+ключа (без чтения строк). При сортировке по релевантности поиска порядок задает
+список ID из поискового индекса, страницы читаются по ID.
+
+Изменение отдельных изделий (modules/events.py) окно принимает без перечитывания:
+строка с прежним ключом сортировки заменяется в странице, появившаяся или сменившая
+место строка сдвигает позиции — страницы начиная с нее забываются и читаются заново.
+"""
+import logging
+from collections import OrderedDict
+
+from modules.queries import (
+    CATALOG_SUMMARY_BY_IDS, CATALOG_WINDOW, CATALOG_WINDOW_COUNT, CATALOG_WINDOW_KEY, expand_in
+)
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PAGE_SIZE = 200
+
+# Страниц в памяти (вытесняются давно не запрошенные)
+CATALOG_PAGE_CACHE = 16
+
+# Порядок обхода таблиц (CROSS JOIN): первой — таблица с индексом ключа сортировки
+_PRODUCTS_FIRST = "products p CROSS JOIN product_cost_summary s ON s.product_id = p.id"
+_SUMMARY_FIRST = "product_cost_summary s CROSS JOIN products p ON p.id = s.product_id"
+
+# Ключ сортировки -> (выражение, ID изделия, таблицы); выражения совпадают с индексами
+# сортировки, иначе SQLite сортирует все строки. Расчетная цена — по сводке стоимости
+# (ее же показывает столбец каталога, см. catalog_table._display_row)
+SORT_KEYS = {
+    "id": ("p.id", "p.id", _PRODUCTS_FIRST),
+    "article": ("COALESCE(p.article, '')", "p.id", _PRODUCTS_FIRST),
+    "name": ("p.name", "p.id", _PRODUCTS_FIRST),
+    "created_date": ("COALESCE(p.created_date, '')", "p.id", _PRODUCTS_FIRST),
+    "approved_price": ("COALESCE(p.approved_price, 0)", "p.id", _PRODUCTS_FIRST),
+    "calculated_price": ("s.calculated_price", "s.product_id", _SUMMARY_FIRST),
+    "prime_cost": ("s.prime_cost", "s.product_id", _SUMMARY_FIRST),
+}
+
+# Ключи, которые правка изделия не меняет
+STABLE_SORT_KEYS = ("id", "created_date")
+
+
+class CatalogWindow:
+    """
+    Строки каталога по позициям при заданных сортировке и фильтре.
+    condition — условие WHERE (изделие p, сводка s) с параметрами params;
+    ranked_ids — найденные изделия в порядке релевантности (вместо сортировки и условия).
+    """
+
+    def __init__(self, db_manager, sort_key="created_date", descending=True,
+                 condition=None, params=(), ranked_ids=None):
+        self.db_manager = db_manager
+        self.sort_key = sort_key
+        self.descending = descending
+        self.condition = condition
+        self.params = tuple(params)
+        self.ranked_ids = ranked_ids
+        self._pages = OrderedDict()
+        # Номер страницы -> (ключ, ID) ее последней строки
+        self._bounds = {}
+        self._count = None
+
+    def copy(self, db_manager=None):
+        """Окно с теми же сортировкой и фильтром (без прочитанных страниц), например для потока экспорта"""
+        return CatalogWindow(db_manager or self.db_manager, self.sort_key, self.descending,
+                             self.condition, self.params, self.ranked_ids)
+
+    def reset(self):
+        """Забыть прочитанные страницы и число строк (данные в БД изменились)"""
+        self._pages.clear()
+        self._bounds.clear()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if self.ranked_ids is not None:
+                self._count = len(self.ranked_ids)
+            else:
+                # Порядок обхода для подсчета не важен — без сводки в качестве внешней таблицы
+                query = self._format(CATALOG_WINDOW_COUNT, self.condition or "1", source=_PRODUCTS_FIRST)
+                self._count = self.db_manager.fetch_one(query, self.params).count
+        return self._count
+
+    def row(self, position):
+        """Строка CATALOG_WINDOW (для релевантности — CATALOG_SUMMARY_BY_IDS) или None"""
+        if not 0 <= position < self.count():
+            return None
+        page = self.page(position // CATALOG_PAGE_SIZE)
+        offset = position % CATALOG_PAGE_SIZE
+        return page[offset] if offset < len(page) else None
+
+    def page(self, number):
+        page = self._pages.get(number)
+        if page is None:
+            page = self._read_page(number)
+            self._pages[number] = page
+            while len(self._pages) > CATALOG_PAGE_CACHE:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(number)
+        return page
+
+    def cached_rows(self, product_ids):
+        """Изделия в прочитанных страницах: {ID: (позиция, строка)}"""
+        cached = {}
+        for number, page in self._pages.items():
+            for offset, row in enumerate(page):
+                if row.id in product_ids:
+                    cached[row.id] = (number * CATALOG_PAGE_SIZE + offset, row)
+        return cached
+
+    def known_positions(self, product_ids):
+        """
+        Позиции изделий, известные без запроса к БД: {ID: позиция}. При релевантности —
+        все изделия окна (порядок задан списком ID), иначе — только из прочитанных страниц
+        """
+        if self.ranked_ids is not None:
+            return {product_id: position for position, product_id in enumerate(self.ranked_ids)
+                    if product_id in product_ids}
+        return {product_id: position for product_id, (position, _row) in self.cached_rows(product_ids).items()}
+
+    def keys_stable(self):
+        """Не меняет ли правка изделия ни порядок строк, ни состав окна"""
+        return self.ranked_ids is None and self.condition is None and self.sort_key in STABLE_SORT_KEYS
+
+    def fresh_rows(self, product_ids):
+        """Текущие строки изделий, входящих в окно (при сортировке в SQL — с ключом сортировки)"""
+        if self.ranked_ids is not None:
+            ranked = set(self.ranked_ids)
+            return self._rows_by_ids([product_id for product_id in product_ids if product_id in ranked])
+        product_ids = list(product_ids)
+        if not product_ids:
+            return []
+        # Параметры — в порядке условий: сначала фильтр окна, затем список ID
+        conditions = [self.condition] if self.condition else []
+        conditions.append(f"p.id IN ({', '.join('?' * len(product_ids))})")
+        query = self._format(CATALOG_WINDOW, " AND ".join(conditions))
+        return self.db_manager.fetch_all(query, list(self.params) + product_ids + [len(product_ids)])
+
+    def position_of(self, row):
+        """Позиция строки fresh_rows в окне: число строк перед ней по ключу сортировки"""
+        expression, tie, _source = SORT_KEYS[self.sort_key]
+        conditions, params = [], list(self.params)
+        if self.condition:
+            conditions.append(self.condition)
+        conditions.append(f"({expression}, {tie}) {'>' if self.descending else '<'} (?, ?)")
+        params.extend((row.sort_key, row.sort_id))
+        return self.db_manager.fetch_one(self._format(CATALOG_WINDOW_COUNT, " AND ".join(conditions)), params).count
+
+    def insert_row(self, position):
+        """Строка появилась на позиции (уже в БД): страницы с нее будут перечитаны"""
+        if self._count is not None:
+            self._count += 1
+        self._forget_from(position)
+
+    def remove_row(self, position):
+        """Строка на позиции ушла из окна: страницы с нее будут перечитаны"""
+        if self.ranked_ids is not None:
+            # Список может читать копия окна в потоке экспорта — заменяется, а не изменяется
+            self.ranked_ids = self.ranked_ids[:position] + self.ranked_ids[position + 1:]
+        if self._count is not None:
+            self._count -= 1
+        self._forget_from(position)
+
+    def _forget_from(self, position):
+        # Строки до позиции не сдвинулись: страницы перед ней и их границы остаются верными
+        first = position // CATALOG_PAGE_SIZE
+        for number in [number for number in self._pages if number >= first]:
+            del self._pages[number]
+        for number in [number for number in self._bounds if number >= first]:
+            del self._bounds[number]
+
+    def patch_rows(self, rows):
+        """Заменить значения прочитанных строк свежими строками сводки (позиции не меняются)"""
+        fresh = {row.id: row for row in rows}
+        for number, page in self._pages.items():
+            for offset, row in enumerate(page):
+                new = fresh.get(row.id)
+                if new is not None:
+                    # Ключ keyset остается прежним: граница страницы задана прочитанным порядком
+                    page[offset] = row._make(tuple(new) + tuple(row[len(new):]))
+
+    def iter_rows(self, batch=CATALOG_PAGE_SIZE * 5):
+        """Все строки окна по порядку, без кэша страниц (экспорт)"""
+        if self.ranked_ids is not None:
+            for start in range(0, len(self.ranked_ids), batch):
+                yield from self._rows_by_ids(self.ranked_ids[start:start + batch])
+            return
+        after = None
+        while True:
+            rows = self._read_after(after, batch)
+            yield from rows
+            if len(rows) < batch:
+                return
+            after = (rows[-1].sort_key, rows[-1].sort_id)
+
+    def _read_page(self, number):
+        start = number * CATALOG_PAGE_SIZE
+        if self.ranked_ids is not None:
+            return self._rows_by_ids(self.ranked_ids[start:start + CATALOG_PAGE_SIZE])
+        if number == 0:
+            after = None
+        elif number - 1 in self._bounds:
+            after = self._bounds[number - 1]
+        else:
+            # Граница предыдущей страницы неизвестна — ключ строки перед началом страницы по OFFSET
+            key = self.db_manager.fetch_one(
+                self._format(CATALOG_WINDOW_KEY, self.condition or "1"), self.params + (start - 1,))
+            if key is None:
+                return []
+            after = (key.sort_key, key.sort_id)
+        rows = self._read_after(after, CATALOG_PAGE_SIZE)
+        if rows:
+            self._bounds[number] = (rows[-1].sort_key, rows[-1].sort_id)
+        logger.debug(f"[КАТАЛОГ] Прочитана страница {number} ({len(rows)} строк)")
+        return rows
+
+    def _read_after(self, after, limit):
+        """Строки после (ключ, ID) after (None — с начала) в порядке сортировки"""
+        conditions, params = [], list(self.params)
+        if self.condition:
+            conditions.append(self.condition)
+        if after is not None:
+            expression, tie, _source = SORT_KEYS[self.sort_key]
+            conditions.append(f"({expression}, {tie}) {'<' if self.descending else '>'} (?, ?)")
+            params.extend(after)
+        query = self._format(CATALOG_WINDOW, " AND ".join(conditions) or "1")
+        return self.db_manager.fetch_all(query, params + [limit])
+
+    def _rows_by_ids(self, product_ids):
+        if not product_ids:
+            return []
+        rows = {row.id: row for row in self.db_manager.fetch_all(
+            expand_in(CATALOG_SUMMARY_BY_IDS, len(product_ids)), product_ids)}
+        return [rows[product_id] for product_id in product_ids if product_id in rows]
+
+    def _format(self, query, where, source=None):
+        expression, tie, key_source = SORT_KEYS[self.sort_key]
+        source = source or key_source
+        direction = "DESC" if self.descending else "ASC"
+        return query._replace(sql=query.sql.format(
+            source=source, key=expression, tie=tie, where=where,
+            order=f"{expression} {direction}, {tie} {direction}"))
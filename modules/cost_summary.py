@@ -0,0 +1,148 @@
+# modules/cost_summary.py
+"""
+Сводка стоимости изделий (product_cost_summary), поддерживаемая триггерами
+(таблица и триггеры создаются миграциями 8 и 10, modules/migrations.py).
+
+Запуск из корня проекта:
+    python -m modules.cost_summary verify   — проверить сводку
+    python -m modules.cost_summary rebuild  — пересобрать сводку
+"""
+import argparse
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Допустимое расхождение сумм (накопление погрешности при инкрементальных изменениях)
+TOLERANCE = 0.005
+
+SUMMARY_COLUMNS = (
+    "materials_cost", "operations_cost", "labor_cost", "total_weight",
+    "paint_area", "prime_cost", "calculated_price"
+)
+
+# Стоимость работ по строке операции: утвержденная расценка, если задана, иначе расчетная
+LABOR_EXPR = "(CASE WHEN typeof({r}.approved_rate) IN ('real', 'integer') THEN {r}.approved_rate ELSE COALESCE({r}.cost, 0) END)"
+
+# Полный пересчет сводки по исходным таблицам (сгруппированные агрегаты)
+EXPECTED_SUMMARY_QUERY = f"""
+    WITH mat AS (
+        SELECT pm.product_id,
+               SUM(COALESCE(pm.cost, 0)) AS materials_cost,
+               SUM(COALESCE(pm.length, 0) / 1000.0 * COALESCE(m.weight_per_meter, 0)
+                   * COALESCE(pm.quantity, 0)) AS total_weight
+        FROM product_materials pm
+        LEFT JOIN materials m ON m.id = pm.material_id
+        GROUP BY pm.product_id
+    ),
+    ops AS (
+        SELECT o.product_id,
+               SUM(COALESCE(o.cost, 0)) AS operations_cost,
+               SUM({LABOR_EXPR.format(r="o")}) AS labor_cost
+        FROM operations o
+        GROUP BY o.product_id
+    ),
+    base AS (
+        SELECT p.id AS product_id,
+               COALESCE(m.materials_cost, 0) AS materials_cost,
+               COALESCE(o.operations_cost, 0) AS operations_cost,
+               COALESCE(o.labor_cost, 0) AS labor_cost,
+               COALESCE(m.total_weight, 0) AS total_weight,
+               COALESCE(p.total_paint_area, 0) AS paint_area,
+               COALESCE(p.overhead_percent, 0.55) AS overhead_percent,
+               COALESCE(p.profit_percent, 0.30) AS profit_percent
+        FROM products p
+        LEFT JOIN mat m ON m.product_id = p.id
+        LEFT JOIN ops o ON o.product_id = p.id
+    )
+    SELECT product_id, materials_cost, operations_cost, labor_cost, total_weight, paint_area,
+           materials_cost + labor_cost AS prime_cost,
+           (materials_cost + labor_cost) * (1 + overhead_percent) * (1 + profit_percent) AS calculated_price
+    FROM base
+"""
+
+
+def rebuild(conn):
+    """Полная пересборка сводки; возвращает количество строк"""
+    conn.execute("DELETE FROM product_cost_summary")
+    cursor = conn.execute(
+        f"INSERT INTO product_cost_summary (product_id, {', '.join(SUMMARY_COLUMNS)}) "
+        f"{EXPECTED_SUMMARY_QUERY}"
+    )
+    logger.info(f"[СВОДКА] Сводка стоимости пересобрана: {cursor.rowcount} изделий")
+    return cursor.rowcount
+
+
+def verify(conn):
+    """Сверка сводки с исходными таблицами; возвращает список ID изделий с расхождениями"""
+    mismatch_conditions = " OR ".join(
+        f"ABS(s.{col} - e.{col}) > {TOLERANCE}" for col in SUMMARY_COLUMNS
+    )
+    rows = conn.execute(f"""
+        WITH expected AS ({EXPECTED_SUMMARY_QUERY})
+        SELECT e.product_id FROM expected e
+        LEFT JOIN product_cost_summary s ON s.product_id = e.product_id
+        WHERE s.product_id IS NULL OR {mismatch_conditions}
+        UNION
+        SELECT s.product_id FROM product_cost_summary s
+        WHERE s.product_id NOT IN (SELECT id FROM products)
+        ORDER BY 1
+    """).fetchall()
+    mismatched = [row[0] for row in rows]
+    if mismatched:
+        logger.warning(f"[СВОДКА] Расхождения сводки стоимости: {len(mismatched)} изделий")
+    else:
+        logger.info("[СВОДКА] Сводка стоимости совпадает с исходными данными")
+    return mismatched
+
+
+class CostSummaryManager:
+    """Обслуживание сводки стоимости изделий"""
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def rebuild(self):
+        """Пересборка сводки в одной транзакции"""
+        try:
+            with self.db_manager.transaction():
+                return rebuild(self.db_manager.connection)
+        except Exception as e:
+            logger.error(f"[СВОДКА] Ошибка при пересборке сводки: {e}", exc_info=True)
+            return None
+
+    def verify(self):
+        """Список ID изделий, у которых сводка расходится с исходными данными"""
+        return verify(self.db_manager.connection)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сводка стоимости изделий (product_cost_summary)")
+    parser.add_argument("command", choices=("verify", "rebuild"))
+    parser.add_argument("--db", default="data/database.db", help="путь к файлу БД")
+    parser.add_argument("--profile", default=None, help="профиль хранения DatabaseManager (local/network)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+
+    from modules.database import DatabaseManager
+
+    with DatabaseManager(args.db, storage_profile=args.profile) as db_manager:
+        manager = CostSummaryManager(db_manager)
+        if args.command == "rebuild":
+            count = manager.rebuild()
+            if count is None:
+                return 1
+            print(f"Сводка пересобрана: {count} изделий")
+            return 0
+
+        mismatched = manager.verify()
+        if mismatched:
+            print(f"Расхождения у {len(mismatched)} изделий: {', '.join(map(str, mismatched[:50]))}")
+            return 1
+        print("Сводка стоимости актуальна")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
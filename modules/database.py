@@ -1,19 +1,68 @@
 # modules/database.py
 import sqlite3
 import os
+import threading
 from contextlib import contextmanager
 import logging
-import pandas as pd
+from modules.migrations import apply_migrations
+from modules.queries import Query
 
 logger = logging.getLogger(__name__)
 
+# Профили хранения: PRAGMA-настройки, применяемые один раз при открытии соединения.
+# foreign_keys включены: импорт материалов не удаляет строки справочника (снятые с прайса
+# помечаются is_active = 0), поэтому ссылки спецификаций изделий остаются целыми.
+STORAGE_PROFILES = {
+    # Локальный диск: WAL — чтение не ждет записи, fsync только на контрольных точках
+    "local": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,  # 64 МБ
+        "mmap_size": 268435456,  # 256 МБ
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+    # Общая сетевая папка (SMB/NFS): WAL требует общей памяти и через сеть не работает
+    "network": {
+        "busy_timeout": 15000,
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    },
+}
+
+DEFAULT_STORAGE_PROFILE = "local"
+
+# Размер кэша подготовленных операторов sqlite3 на соединение (запросы реестра modules/queries.py)
+STATEMENT_CACHE_SIZE = 256
+
+# SQL-функции соединения. LIKE и lower() SQLite приводят регистр только для ASCII —
+# py_lower приводит регистр любых букв (поиск по каталогу без FTS5, modules/catalog_search.py)
+SQL_FUNCTIONS = {
+    "py_lower": (1, lambda value: value.casefold() if isinstance(value, str) else value),
+}
+
+# Переменная окружения для выбора профиля без изменения кода (например, на рабочих местах с БД в сети)
+STORAGE_PROFILE_ENV = "KATALOG_STORAGE_PROFILE"
+
 
 class DatabaseManager:
-    def __init__(self, db_path="data/database.db"):
+    def __init__(self, db_path="data/database.db", storage_profile=None):
         self.db_path = db_path
+        self.storage_profile = storage_profile or os.environ.get(STORAGE_PROFILE_ENV) or DEFAULT_STORAGE_PROFILE
+        if self.storage_profile not in STORAGE_PROFILES:
+            raise ValueError(
+                f"Неизвестный профиль хранения '{self.storage_profile}', доступны: {', '.join(STORAGE_PROFILES)}"
+            )
+        # Долгоживущие соединения: по одному на поток, переиспользуются всем процессом
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self.ensure_data_directory()
         self.init_database()
-        self.migrate_database()  # Добавляем миграцию
 
     def ensure_data_directory(self):
         """Создание директории data, если она не существует"""
@@ -21,187 +70,20 @@ class DatabaseManager:
         logger.debug("Директория 'data' проверена/создана")
 
     def migrate_database(self):
-        """Миграция базы данных - добавление недостающих столбцов"""
-        try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-
-                # Проверяем и добавляем столбец surname если его нет
-                try:
-                    cursor.execute("SELECT surname FROM employees LIMIT 1")
-                    logger.debug("Столбец 'surname' уже существует")
-                except sqlite3.OperationalError:
-                    cursor.execute("ALTER TABLE employees ADD COLUMN surname TEXT DEFAULT ''")
-                    logger.info("Добавлен столбец 'surname' в таблицу employees")
-
-                # Проверяем и добавляем столбец position если его нет
-                try:
-                    cursor.execute("SELECT position FROM employees LIMIT 1")
-                    logger.debug("Столбец 'position' уже существует")
-                except sqlite3.OperationalError:
-                    cursor.execute("ALTER TABLE employees ADD COLUMN position TEXT DEFAULT ''")
-                    logger.info("Добавлен столбец 'position' в таблицу employees")
-
-                # Обновляем существующие записи
-                cursor.execute("UPDATE employees SET surname = '' WHERE surname IS NULL")
-                cursor.execute("UPDATE employees SET position = '' WHERE position IS NULL")
-
-                conn.commit()
-                logger.info("Миграция базы данных завершена успешно")
-
-        except Exception as e:
-            logger.error(f"Ошибка при миграции базы данных: {e}", exc_info=True)
+        """Приведение схемы БД к актуальной версии (PRAGMA user_version)"""
+        with self.get_connection() as conn:
+            return apply_migrations(conn)
 
     def init_database(self):
         """Инициализация базы данных и создание таблиц"""
         logger.info("Начало инициализации базы данных")
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            logger.debug("Подключение к базе данных установлено")
-
-            # Создание таблицы сотрудников - ОБНОВЛЕННАЯ ВЕРСИЯ
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS employees (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    surname TEXT DEFAULT '',
-                    position TEXT DEFAULT ''
-                )
-            ''')
-            logger.debug("Таблица 'employees' создана или уже существует")
-
-            # Создание таблицы ставок (если еще не создана)
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS rates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    category TEXT,
-                    operation_name TEXT NOT NULL,
-                    rate_per_hour REAL DEFAULT 0.0,
-                    rate_per_minute REAL DEFAULT 0.0,
-                    rate_per_second REAL DEFAULT 0.0,
-                    old_rate REAL DEFAULT 0.0,
-                    new_rate REAL DEFAULT 0.0
-                )
-            ''')
-            logger.debug("Таблица 'rates' создана или уже существует")
-
-            # Создание таблицы операций
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS operations_list (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    rate_per_minute REAL DEFAULT 0.0
-                )
-            ''')
-            logger.debug("Таблица 'operations_list' создана или уже существует")
-
-            # Создание таблицы материалов
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS materials (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    category TEXT,
-                    name TEXT NOT NULL,
-                    diameter REAL,
-                    section_length REAL,
-                    section_width REAL,
-                    thickness REAL,
-                    weight_per_meter REAL,
-                    purchase_price_t REAL,
-                    delivery_price_t REAL,
-                    waste_price REAL,
-                    final_price_kg REAL,
-                    unit_of_measurement TEXT,
-                    our_price_per_kg REAL  -- Наша цена за кг
-                )
-            ''')
-            logger.debug("Таблица 'materials' создана или уже существует")
-
-            # Создание таблицы изделий
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    product_id TEXT,
-                    article TEXT,
-                    name TEXT NOT NULL,
-                    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            logger.debug("Таблица 'products' создана или уже существует")
-
-            # Создание таблицы операций для изделий
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS operations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    product_id INTEGER,
-                    operation_name TEXT NOT NULL,
-                    quantity_measured INTEGER,
-                    time_measured REAL,
-                    time_per_unit REAL,
-                    rate_per_minute REAL,
-                    cost REAL,
-                    employee_id INTEGER,
-                    approved_rate REAL DEFAULT NULL, -- Новый столбец
-                    FOREIGN KEY (product_id) REFERENCES products (id),
-                    FOREIGN KEY (employee_id) REFERENCES employees (id) -- Внешний ключ
-                )
-            ''')
-            logger.debug("Таблица 'operations' создана или уже существует")
-
-            # Создание таблицы материалов изделия
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS product_materials (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    product_id INTEGER,
-                    material_id INTEGER,
-                    length REAL,
-                    width REAL,
-                    thickness REAL,
-                    quantity INTEGER,
-                    cost REAL,
-                    FOREIGN KEY (product_id) REFERENCES products (id),
-                    FOREIGN KEY (material_id) REFERENCES materials (id)
-                )
-            ''')
-            logger.debug("Таблица 'product_materials' создана или уже существует")
-
-            # удалить фрагмент # Создание таблицы изделий с полями для цены
-            # cursor.execute('''
-            #             CREATE TABLE IF NOT EXISTS products (
-            #                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-            #                 product_id TEXT,
-            #                 article TEXT,
-            #                 name TEXT NOT NULL,
-            #                 overhead_percent REAL DEFAULT 0.55,
-            #                 profit_percent REAL DEFAULT 0.30,
-            #                 approved_price REAL DEFAULT 0.0,
-            #                 created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            #             )
-            #         ''')
-            # logger.debug("Таблица 'products' создана или уже существует")
-
-            # Добавляем стандартные операции, если их нет
-            cursor.execute("SELECT COUNT(*) FROM operations_list")
-            if cursor.fetchone()[0] == 0:
-                default_operations = [
-                    ("Токарная обработка", 2.5),
-                    ("Фрезерование", 3.0),
-                    ("Сверление", 1.5),
-                    ("Шлифовка", 2.0),
-                    ("Сборка", 1.8),
-                    ("Покраска", 2.2)
-                ]
-
-                cursor.executemany(
-                    "INSERT INTO operations_list (name, rate_per_minute) VALUES (?, ?)",
-                    default_operations
-                )
-                logger.info("Добавлены стандартные операции")
+        applied = self.migrate_database()
 
-            # Загрузка сотрудников из Excel (если файл существует)
+        # Начальное заполнение справочников — только при создании/обновлении схемы
+        if applied:
             self.load_employees_from_excel()
 
-            conn.commit()
-            logger.info("Инициализация базы данных завершена успешно")
+        logger.info("Инициализация базы данных завершена успешно")
 
     def load_employees_from_excel(self):
         """Загрузка сотрудников из Excel файла - ТОЛЬКО ЕСЛИ БД ПУСТАЯ"""
@@ -285,53 +167,166 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Ошибка при создании примера файла сотрудников: {e}")
 
-    def _add_default_employee(self):
-        """Добавление сотрудника по умолчанию если файл не найден или ошибка"""
-        cursor = self.execute_query("SELECT COUNT(*) FROM employees")
-        if cursor.fetchone()[0] == 0:
-            self.execute_query("INSERT INTO employees (name) VALUES (?)", ("Не назначен",))
-            logger.info("Добавлен сотрудник 'Не назначен' по умолчанию.")
+    def _connect(self):
+        """Открытие и настройка нового соединения для текущего потока"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        for name, value in STORAGE_PROFILES[self.storage_profile].items():
+            result = conn.execute(f"PRAGMA {name} = {value}").fetchone()
+            # journal_mode возвращает фактический режим (например, WAL недоступен для :memory:)
+            if name == "journal_mode" and str(result[0]).upper() != str(value).upper():
+                logger.warning(f"Режим журнала {value} не применен для '{self.db_path}', используется {result[0]}")
+        for name, (arguments, function) in SQL_FUNCTIONS.items():
+            conn.create_function(name, arguments, function, deterministic=True)
+        with self._connections_lock:
+            self._connections.append(conn)
+        logger.debug(f"Открыто соединение с БД '{self.db_path}' (профиль '{self.storage_profile}') "
+                     f"для потока {threading.current_thread().name}")
+        return conn
+
+    @property
+    def connection(self):
+        """Постоянное соединение текущего потока (создается при первом обращении)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def release_thread_connection(self):
+        """
+        Закрыть соединение текущего потока. Вызывается в конце задания QThreadPool:
+        PyQt не сохраняет thread-local данные Python между заданиями потока пула,
+        и следующее задание открыло бы новое соединение, а прежнее осталось бы открытым
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._connections_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Ошибка при закрытии соединения с БД: {e}")
 
     @contextmanager
     def get_connection(self):
-        """Контекстный менеджер для подключения к базе данных"""
-        conn = sqlite3.connect(self.db_path)
+        """Контекстный менеджер для подключения к базе данных (соединение не закрывается)"""
+        conn = self.connection
         try:
             yield conn
         except Exception as e:
-            conn.rollback()
+            # Внутри transaction() откатом управляет сама транзакция
+            if not self.in_transaction():
+                conn.rollback()
             logger.error(f"Ошибка в контекстном менеджере БД: {e}", exc_info=True)
             raise e
+
+    def in_transaction(self):
+        """Открыта ли в текущем потоке транзакция через transaction()"""
+        return getattr(self._local, 'tx_depth', 0) > 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Единица работы: все запросы внутри блока (в т.ч. execute_query/execute_many)
+        фиксируются одним COMMIT или откатываются целиком при ошибке.
+        Вложенные вызовы присоединяются к внешней транзакции.
+        """
+        conn = self.connection
+        depth = getattr(self._local, 'tx_depth', 0)
+        if depth:
+            self._local.tx_depth = depth + 1
+            try:
+                yield conn
+            finally:
+                self._local.tx_depth = depth
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.tx_depth = 1
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Транзакция отменена: {e}", exc_info=True)
+            raise
         finally:
-            conn.close()
+            self._local.tx_depth = 0
+
+    def close(self):
+        """Закрытие всех открытых соединений"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Ошибка при закрытии соединения с БД: {e}")
+        logger.debug(f"Закрыто соединений с БД: {len(connections)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    @staticmethod
+    def _sql(query):
+        """Текст SQL: строка или именованный запрос из реестра (Query)"""
+        return query.sql if isinstance(query, Query) else query
+
+    @staticmethod
+    def _typed_rows(query, rows):
+        """Преобразование строк в тип строки Query (namedtuple), если он задан"""
+        if isinstance(query, Query) and query.row is not None:
+            return [query.row._make(row) for row in rows]
+        return rows
 
     def execute_query(self, query, params=None):
         """Выполнение запроса к базе данных"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             if params:
-                cursor.execute(query, params)
+                cursor.execute(self._sql(query), params)
             else:
-                cursor.execute(query)
-            conn.commit()
-            return cursor.fetchall()
+                cursor.execute(self._sql(query))
+            if not self.in_transaction():
+                conn.commit()
+            return self._typed_rows(query, cursor.fetchall())
+
+    def execute_many(self, query, params_seq):
+        """Пакетное выполнение запроса (executemany); возвращает число затронутых строк"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(self._sql(query), params_seq)
+            if not self.in_transaction():
+                conn.commit()
+            return cursor.rowcount
 
     def fetch_all(self, query, params=None):
-        """Получение всех записей из базы данных"""
+        """Получение всех записей из базы данных (для Query — строки типа query.row)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             if params:
-                cursor.execute(query, params)
+                cursor.execute(self._sql(query), params)
             else:
-                cursor.execute(query)
-            return cursor.fetchall()
+                cursor.execute(self._sql(query))
+            return self._typed_rows(query, cursor.fetchall())
 
     def fetch_one(self, query, params=None):
-        """Получение одной записи из базы данных"""
+        """Получение одной записи из базы данных (для Query — строка типа query.row)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             if params:
-                cursor.execute(query, params)
+                cursor.execute(self._sql(query), params)
             else:
-                cursor.execute(query)
-            return cursor.fetchone()
+                cursor.execute(self._sql(query))
+            row = cursor.fetchone()
+            if row is not None and isinstance(query, Query) and query.row is not None:
+                return query.row._make(row)
+            return row
@@ -0,0 +1,60 @@
+# modules/dependencies.py
+"""
+Обратные зависимости справочников: материал -> изделия, операция -> изделия.
+
+Индекс хранится в самой БД — вторичные индексы product_materials(material_id)
+и operations(operation_name) (см. migrations.INDEXES) обновляются SQLite вместе
+со строками спецификаций, поэтому не требуют отдельной синхронизации.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько значений передавать в одном IN (...) — с запасом до лимита параметров SQLite
+LOOKUP_CHUNK_SIZE = 500
+
+PRODUCTS_BY_MATERIALS_SQL = """
+    SELECT DISTINCT product_id FROM product_materials
+    WHERE material_id IN ({placeholders}) AND product_id IS NOT NULL
+"""
+
+PRODUCTS_BY_OPERATIONS_SQL = """
+    SELECT DISTINCT product_id FROM operations
+    WHERE operation_name IN ({placeholders}) AND product_id IS NOT NULL
+"""
+
+
+class DependencyIndex:
+    """Поиск изделий, затронутых изменением материалов или ставок операций"""
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    def _lookup(self, sql, keys):
+        """Множество product_id по ключам, запросами с IN по группам"""
+        keys = list(dict.fromkeys(key for key in keys if key is not None))
+        product_ids = set()
+        for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+            rows = self.db_manager.fetch_all(sql.format(placeholders=", ".join("?" for _ in chunk)), chunk)
+            product_ids.update(row[0] for row in rows)
+        return product_ids
+
+    def products_for_materials(self, material_ids):
+        """ID изделий, в спецификации которых есть хотя бы один из материалов"""
+        product_ids = self._lookup(PRODUCTS_BY_MATERIALS_SQL, material_ids)
+        logger.debug(f"[ЗАВИСИМОСТИ] Материалы -> изделия: {len(product_ids)}")
+        return sorted(product_ids)
+
+    def products_for_operations(self, operation_names):
+        """ID изделий, в которых выполняется хотя бы одна из операций"""
+        product_ids = self._lookup(PRODUCTS_BY_OPERATIONS_SQL, operation_names)
+        logger.debug(f"[ЗАВИСИМОСТИ] Операции -> изделия: {len(product_ids)}")
+        return sorted(product_ids)
+
+    def affected_products(self, material_ids=(), operation_names=()):
+        """ID изделий, затронутых изменением материалов и/или ставок операций"""
+        product_ids = set(self.products_for_materials(material_ids)) if material_ids else set()
+        if operation_names:
+            product_ids.update(self.products_for_operations(operation_names))
+        return sorted(product_ids)
@@ -0,0 +1,38 @@
+# modules/events.py
+"""
+Уведомления об изменении изделий в БД.
+
+Код, записавший изделие (сохранение, удаление, применение цены, пересчет стоимости),
+сообщает ID изделий ProductEventBus после фиксации транзакции; подписчики (каталог)
+перечитывают только эти изделия, а не весь список.
+"""
+import logging
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+
+class ProductEventBus(QObject):
+    """Шина событий изделий: добавление, изменение, удаление"""
+
+    products_inserted = pyqtSignal(list)  # ID добавленных изделий
+    products_updated = pyqtSignal(list)  # ID изделий с измененными данными или стоимостью
+    products_deleted = pyqtSignal(list)  # ID удаленных изделий
+
+    def notify_inserted(self, product_ids):
+        self._notify(self.products_inserted, "добавлены", product_ids)
+
+    def notify_updated(self, product_ids):
+        self._notify(self.products_updated, "изменены", product_ids)
+
+    def notify_deleted(self, product_ids):
+        self._notify(self.products_deleted, "удалены", product_ids)
+
+    @staticmethod
+    def _notify(signal, action, product_ids):
+        product_ids = sorted({int(product_id) for product_id in product_ids if product_id is not None})
+        if not product_ids:
+            return
+        logger.debug(f"[СОБЫТИЯ] Изделия {action}: {len(product_ids)} шт.")
+        signal.emit(product_ids)
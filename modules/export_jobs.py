@@ -0,0 +1,171 @@
+# modules/export_jobs.py
+"""
+Фоновые задания экспорта (карточки изделий в Excel/PDF, каталог).
+
+Задание — список шагов (функция, аргументы); функция возвращает True при успехе,
+как ProductManager.save_product_to_excel и ReportManager.export_product_*.
+Шаги выполняются в пуле потоков (у каждого потока свое соединение DatabaseManager),
+о ходе и завершении ExportQueue сообщает сигналами в поток интерфейса.
+Отмена проверяется между шагами: начатая запись файла доводится до конца.
+Соединение потока пула с БД очереди (db_manager) закрывается в конце задания.
+
+Задания с одинаковым ключом (обычно путь файла) не выполняются одновременно:
+пока идет одно, новые ждут, и из ожидающих остается только последнее —
+серия сохранений изделия дает одну запись карточки после текущей.
+"""
+import itertools
+import logging
+import threading
+
+from PyQt5.QtCore import QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+# Потоков экспорта: запись файлов в основном занята Python-кодом openpyxl/reportlab
+EXPORT_WORKERS = 2
+
+
+class _JobSignals(QObject):
+    # Испускаются из потока пула, слоты ExportQueue вызываются в потоке интерфейса
+    progress = pyqtSignal(int, int, int)  # job_id, выполнено шагов, всего шагов
+    finished = pyqtSignal(int, bool, bool, str)  # job_id, успех, отменено, текст ошибки
+
+
+class ExportJob(QRunnable):
+    """Задание экспорта: шаги выполняются по порядку в потоке пула"""
+
+    def __init__(self, job_id, title, steps, key, signals, db_manager=None):
+        super().__init__()
+        self.job_id = job_id
+        self.title = title
+        self.steps = steps
+        self.key = key
+        self.signals = signals
+        self.db_manager = db_manager
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        try:
+            self._run_steps()
+        finally:
+            # Соединение этого задания не переживет его (см. DatabaseManager.release_thread_connection)
+            if self.db_manager is not None:
+                self.db_manager.release_thread_connection()
+
+    def _run_steps(self):
+        total = len(self.steps)
+        try:
+            for done, (target, args) in enumerate(self.steps):
+                if self.is_cancelled():
+                    logger.info(f"[ЭКСПОРТ] Задание '{self.title}' отменено (выполнено {done} из {total})")
+                    self.signals.finished.emit(self.job_id, False, True, "")
+                    return
+                if not target(*args):
+                    self.signals.finished.emit(self.job_id, False, False, f"шаг {done + 1} из {total} не выполнен")
+                    return
+                self.signals.progress.emit(self.job_id, done + 1, total)
+        except Exception as e:
+            logger.error(f"[ЭКСПОРТ] Ошибка задания '{self.title}': {e}", exc_info=True)
+            self.signals.finished.emit(self.job_id, False, False, str(e))
+            return
+        self.signals.finished.emit(self.job_id, True, False, "")
+
+
+class ExportQueue(QObject):
+    """Очередь фоновых заданий экспорта с прогрессом и отменой"""
+
+    job_started = pyqtSignal(int, str)  # job_id, заголовок
+    job_progress = pyqtSignal(int, str, int, int)  # job_id, заголовок, выполнено, всего
+    job_finished = pyqtSignal(int, str, bool, str)  # job_id, заголовок, успех, текст ошибки
+    job_cancelled = pyqtSignal(int, str)  # job_id, заголовок
+    idle = pyqtSignal()  # все задания завершены
+
+    def __init__(self, workers=EXPORT_WORKERS, parent=None, db_manager=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(workers)
+        self._ids = itertools.count(1)
+        # Переданные в пул задания (до прихода finished) и ожидающие своего ключа
+        self._active = {}
+        self._deferred = {}
+
+        self._signals = _JobSignals()
+        self._signals.progress.connect(self._on_progress)
+        self._signals.finished.connect(self._on_finished)
+
+    def submit(self, title, target, *args, key=None):
+        """Задание из одного шага target(*args); возвращает job_id"""
+        return self.submit_steps(title, [(target, args)], key=key)
+
+    def submit_steps(self, title, steps, key=None):
+        """Задание из нескольких шагов [(target, args), ...]; возвращает job_id"""
+        job = ExportJob(next(self._ids), title, list(steps), key, self._signals, self.db_manager)
+        # Объект задания принадлежит очереди: пул не удаляет его после run()
+        job.setAutoDelete(False)
+        if key is not None and any(active.key == key for active in self._active.values()):
+            replaced = self._deferred.get(key)
+            if replaced:
+                logger.debug(f"[ЭКСПОРТ] Задание '{replaced.title}' заменено более новым")
+            self._deferred[key] = job
+            logger.debug(f"[ЭКСПОРТ] Задание '{title}' ждет завершения предыдущего ({key})")
+        else:
+            self._start(job)
+        return job.job_id
+
+    def cancel_all(self):
+        """Отменить ожидающие задания и остановить выполняемые после текущего шага"""
+        for job in self._deferred.values():
+            self.job_cancelled.emit(job.job_id, job.title)
+        self._deferred.clear()
+        for job in self._active.values():
+            job.cancel()
+        if not self._active:
+            self.idle.emit()
+
+    def active_count(self):
+        """Число незавершенных заданий (выполняемые и ожидающие)"""
+        return len(self._active) + len(self._deferred)
+
+    def wait_for_all(self):
+        """Дождаться всех заданий, включая ожидающие своего ключа (закрытие приложения)"""
+        while self.active_count():
+            self._pool.waitForDone()
+            # Сигналы finished доставляются через очередь событий и запускают ожидающие задания
+            QCoreApplication.processEvents()
+
+    def _start(self, job):
+        self._active[job.job_id] = job
+        logger.info(f"[ЭКСПОРТ] Запуск задания '{job.title}' (шагов: {len(job.steps)})")
+        self.job_started.emit(job.job_id, job.title)
+        self._pool.start(job)
+
+    def _on_progress(self, job_id, done, total):
+        job = self._active.get(job_id)
+        if job:
+            self.job_progress.emit(job_id, job.title, done, total)
+
+    def _on_finished(self, job_id, success, cancelled, error):
+        job = self._active.pop(job_id, None)
+        if job is None:
+            return
+        if cancelled:
+            self.job_cancelled.emit(job_id, job.title)
+        else:
+            if success:
+                logger.info(f"[ЭКСПОРТ] Задание '{job.title}' выполнено")
+            else:
+                logger.error(f"[ЭКСПОРТ] Задание '{job.title}' не выполнено: {error}")
+            self.job_finished.emit(job_id, job.title, success, error)
+
+        deferred = self._deferred.pop(job.key, None) if job.key is not None else None
+        if deferred:
+            self._start(deferred)
+        elif not self._active:
+            self.idle.emit()
@@ -0,0 +1,55 @@
+# modules/import_utils.py
+"""Общие функции импорта справочников из Excel: векторизованная очистка столбцов pandas"""
+from collections import namedtuple
+
+import pandas as pd
+
+# Итог импорта: принятые строки, отклоненные строки, сообщения по строкам
+ImportReport = namedtuple("ImportReport", "accepted rejected messages")
+
+# Первое число в ячейке: "12,5 мм" -> 12.5, "ф 20" -> 20, "1.5т" -> 1.5
+NUMBER_PATTERN = r"(-?\d+(?:[.,]\d+)?)"
+
+# Сколько сообщений по строкам сохранять в отчете
+MAX_REPORT_MESSAGES = 50
+
+
+def column_or_default(df, column, default):
+    """Столбец DataFrame или Series со значением по умолчанию, если столбца нет"""
+    if column in df.columns:
+        return df[column]
+    return pd.Series(default, index=df.index, dtype=object)
+
+
+def clean_text(series):
+    """Текстовый столбец: пустые значения -> '', пробелы по краям убраны"""
+    return series.where(series.notna(), "").astype(str).str.strip()
+
+
+def parse_numeric(series):
+    """
+    Числовой столбец без циклов по строкам: числа остаются как есть, из строк
+    извлекается первое число (запятая как десятичный разделитель, единицы отбрасываются).
+    Возвращает (значения float с NaN для нераспознанных, маска непустых нераспознанных ячеек).
+    """
+    values = pd.to_numeric(series, errors="coerce")
+    text_mask = values.isna() & series.notna()
+    if text_mask.any():
+        text = series[text_mask].astype(str).str.strip()
+        extracted = text.str.extract(NUMBER_PATTERN, expand=False).str.replace(",", ".", regex=False)
+        values.loc[text_mask] = pd.to_numeric(extracted, errors="coerce")
+        # Пустые строки не считаются ошибкой разбора
+        text_mask.loc[text_mask] = text != ""
+    invalid = text_mask & values.isna()
+    return values.astype(float), invalid
+
+
+def excel_row_numbers(df, header_row):
+    """Номера строк Excel для строк DataFrame (header_row — индекс строки заголовка в read_excel)"""
+    return df.index + header_row + 2
+
+
+def add_message(messages, text):
+    """Добавление сообщения в отчет с ограничением количества"""
+    if len(messages) < MAX_REPORT_MESSAGES:
+        messages.append(text)
@@ -21,6 +21,7 @@ from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QFont, QColor
 from modules.pricing import PricingManager
 from modules.database import DatabaseManager
+from modules.recalc_scheduler import RecalcScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +46,13 @@ class PricingTab(QWidget):
 
         # Флаг для предотвращения рекурсивных обновлений
         self._updating = False
+        # Сообщить об окончании расчета, запрошенного кнопкой 'Обновить'
+        self._notify_on_update = False
+
+        # Расчет цены из БД — в фоновом потоке, результат в _on_pricing_ready
+        self.recalc_scheduler = RecalcScheduler(db_manager, parent=self)
+        self.recalc_scheduler.pricing_ready.connect(self._on_pricing_ready)
+        self.recalc_scheduler.pricing_failed.connect(self._on_pricing_failed)
 
         self._init_ui()
 
@@ -108,17 +116,10 @@ class PricingTab(QWidget):
             # Собираем текущие данные
             pricing_data = self._collect_current_pricing_data()
 
-            # Испускаем сигнал
+            # Испускаем сигнал: цену сохраняет и строку каталога обновляет
+            # MainApplication.save_pricing_changes (MainInterface.update_catalog_prices)
             self.pricing_applied.emit(self.current_product_id, pricing_data)
 
-            # ОБНОВЛЯЕМ КАТАЛОГ
-            if hasattr(self, 'parent') and hasattr(self.parent(), 'update_catalog_prices'):
-                self.parent().update_catalog_prices(
-                    self.current_product_id,
-                    pricing_data['approved_price'],
-                    pricing_data['calculated_price']
-                )
-
             QMessageBox.information(self, "Успех", "Изменения применены и сохранены в БД")
 
         except Exception as e:
@@ -223,6 +224,8 @@ class PricingTab(QWidget):
         self.overhead_percent_spinbox = QDoubleSpinBox()
         self.overhead_percent_spinbox.setRange(0.0, 200.0)
         self.overhead_percent_spinbox.setDecimals(2)
+        # valueChanged по Enter/потере фокуса/стрелкам, а не на каждую набранную цифру
+        self.overhead_percent_spinbox.setKeyboardTracking(False)
         self.overhead_percent_spinbox.setSuffix(" %")
         self.overhead_percent_spinbox.setValue(self._current_overhead_percent * 100)
         self.overhead_percent_spinbox.valueChanged.connect(self._on_overhead_changed)
@@ -242,6 +245,7 @@ class PricingTab(QWidget):
         self.profit_percent_spinbox = QDoubleSpinBox()
         self.profit_percent_spinbox.setRange(0.0, 200.0)
         self.profit_percent_spinbox.setDecimals(2)
+        self.profit_percent_spinbox.setKeyboardTracking(False)
         self.profit_percent_spinbox.setSuffix(" %")
         self.profit_percent_spinbox.setValue(self._current_profit_percent * 100)
         self.profit_percent_spinbox.valueChanged.connect(self._on_profit_changed)
@@ -281,6 +285,7 @@ class PricingTab(QWidget):
         self.approved_price_spinbox = QDoubleSpinBox()
         self.approved_price_spinbox.setRange(0.0, 10000000.0)
         self.approved_price_spinbox.setDecimals(2)
+        self.approved_price_spinbox.setKeyboardTracking(False)
         self.approved_price_spinbox.setPrefix("₴ ")
         self.approved_price_spinbox.valueChanged.connect(self._on_approved_price_changed)
         self.approved_price_spinbox.setFixedWidth(150)
@@ -298,26 +303,28 @@ class PricingTab(QWidget):
         self.update_pricing()
 
     def update_pricing(self):
-        """Обновление расчета цены (с сохранением утвержденной из базы)"""
+        """Обновление расчета цены (с сохранением утвержденной из базы); расчет идет в фоне"""
         logger.info(f"[ЦЕНА_ИНТЕРФЕЙС] === НАЧАЛО ОБНОВЛЕНИЯ РАСЧЕТА ЦЕНЫ ДЛЯ ИЗДЕЛИЯ ID {self.current_product_id} ===")
         if not self.current_product_id:
+            self.recalc_scheduler.cancel()
             self._clear_ui()
             self._set_fields_enabled(False)
             return
 
+        # До прихода результата поля показывают прежний расчет — блокируем их, чтобы не применить его
+        self._set_fields_enabled(False)
+        self.recalc_scheduler.schedule(self.current_product_id, immediate=True)
+
+    def _on_pricing_ready(self, product_id, pricing_data):
+        """Результат фонового расчета цены"""
+        if product_id != self.current_product_id:
+            return
         try:
             # Сохраняем текущую утвержденную цену из базы перед пересчетом
             query = "SELECT approved_price FROM products WHERE id = ?"
-            result = self.db_manager.fetch_one(query, (self.current_product_id,))
+            result = self.db_manager.fetch_one(query, (product_id,))
             db_approved_price = result[0] if result and result[0] is not None else None
 
-            # Получаем новые расчетные данные
-            pricing_data = self.pricing_manager.calculate_pricing(self.current_product_id)
-            if not pricing_data:
-                self._clear_ui()
-                QMessageBox.critical(self, "Ошибка", "Не удалось рассчитать цену изделия.")
-                return
-
             # Если утвержденная цена уже есть в БД — не затираем ее расчетной
             if db_approved_price and db_approved_price > 0:
                 pricing_data["cost_indicators"]["approved_price"] = db_approved_price
@@ -328,13 +335,26 @@ class PricingTab(QWidget):
             # Обновляем интерфейс
             self._populate_ui(pricing_data)
             self._set_fields_enabled(True)
-            logger.info(f"[ЦЕНА_ИНТЕРФЕЙС] Цена для изделия ID {self.current_product_id} успешно обновлена")
+            logger.info(f"[ЦЕНА_ИНТЕРФЕЙС] Цена для изделия ID {product_id} успешно обновлена")
+
+            if self._notify_on_update:
+                self._notify_on_update = False
+                QMessageBox.information(self, "Успех", "Расчет цены обновлен (утвержденная цена сохранена).")
 
         except Exception as e:
             logger.error(f"[ЦЕНА_ИНТЕРФЕЙС] Ошибка при обновлении цены: {e}", exc_info=True)
             QMessageBox.critical(self, "Ошибка", f"Ошибка при обновлении цены: {e}")
             self._set_fields_enabled(False)
 
+    def _on_pricing_failed(self, product_id, error):
+        """Ошибка фонового расчета цены"""
+        if product_id != self.current_product_id:
+            return
+        self._notify_on_update = False
+        self._clear_ui()
+        message = "Не удалось рассчитать цену изделия."
+        QMessageBox.critical(self, "Ошибка", f"{message}\n{error}" if error else message)
+
     def _populate_ui(self, pricing_data):
         """Заполнение интерфейса данными"""
         logger.debug("[ЦЕНА_ИНТЕРФЕЙС] === ЗАПОЛНЕНИЕ UI ДАННЫМИ РАСЧЕТА ЦЕНЫ ===")
@@ -550,8 +570,9 @@ class PricingTab(QWidget):
         """Обработчик нажатия кнопки 'Обновить'"""
         logger.info("[ЦЕНА_ИНТЕРФЕЙС] Нажата кнопка 'Обновить'")
         try:
+            # Сообщение об успехе — когда придет результат (_on_pricing_ready)
+            self._notify_on_update = True
             self.update_pricing()
-            QMessageBox.information(self, "Успех", "Расчет цены обновлен (утвержденная цена сохранена).")
         except Exception as e:
             logger.error(f"[ЦЕНА_ИНТЕРФЕЙС] Ошибка при обновлении: {e}", exc_info=True)
             QMessageBox.critical(self, "Ошибка", f"Ошибка при обновлении расчета цены:\n{e}")
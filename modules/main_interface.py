@@ -29,6 +29,11 @@ from modules.calculations import CalculationManager
 from modules.reports import ReportManager
 from modules.interface_pricing import PricingTab
 from modules.catalog_table import CatalogTable
+from modules.pricing import PricingManager
+from modules.queries import PRODUCT_BY_ID
+from modules.events import ProductEventBus
+from modules.export_jobs import ExportQueue
+from modules.recalc_scheduler import RecalcScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +63,16 @@ class MainInterface(QWidget):
         # Создаём вкладку цены сразу
         self.pricing_tab = PricingTab(self.db_manager, self)
 
+        # Пересчет цены после правок операций — отложенно и в фоновом потоке
+        self.recalc_scheduler = RecalcScheduler(self.db_manager, parent=self)
+        self.recalc_scheduler.pricing_ready.connect(self._on_background_pricing_ready)
+
+        # Запись карточек изделий и отчетов — фоновыми заданиями (строка состояния окна)
+        self.export_queue = ExportQueue(parent=self, db_manager=self.db_manager)
+
+        # Уведомления об изменении изделий: каталог обновляет только их строки
+        self.product_events = ProductEventBus(self)
+
         # Инициализация UI компонентов
         self._init_ui_components()
 
@@ -213,16 +228,13 @@ class MainInterface(QWidget):
         logger.info(f"Загрузка изделия ID {product_id} в форму")
         try:
             # Получение информации об изделии
-            product_info = self.db_manager.fetch_one(
-                "SELECT id, product_id, article, name FROM products WHERE id = ?",
-                (product_id,)
-            )
+            product_info = self.db_manager.fetch_one(PRODUCT_BY_ID, (product_id,))
 
             if product_info:
-                self.current_product_id = product_info[0]  # Внутренний ID БД
-                self.product_id_input.setText(str(product_info[1] if product_info[1] else ""))  # Отображаемый ID
-                self.article_input.setText(product_info[2] if product_info[2] else "")
-                self.name_input.setText(product_info[3] if product_info[3] else "")
+                self.current_product_id = product_info.id  # Внутренний ID БД
+                self.product_id_input.setText(str(product_info.product_id or ""))  # Отображаемый ID
+                self.article_input.setText(product_info.article or "")
+                self.name_input.setText(product_info.name or "")
 
                 # Загрузка операций
                 self._load_operations_to_form(product_id)
@@ -234,7 +246,7 @@ class MainInterface(QWidget):
 
                 # Обновляем статус
                 if hasattr(self, 'parent') and hasattr(self.parent(), 'status_bar'):
-                    self.parent().status_bar.showMessage(f"Загружено изделие: {product_info[3]}")
+                    self.parent().status_bar.showMessage(f"Загружено изделие: {product_info.name}")
 
             else:
                 logger.error(f"Изделие ID {product_id} не найдено в БД")
@@ -319,40 +331,6 @@ class MainInterface(QWidget):
             logger.error(f"Ошибка при загрузке операций: {e}", exc_info=True)
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить операции:\n{e}")
 
-    def _on_employee_changed(self, row, combo):
-        """
-        Обработчик изменения сотрудника в выпадающем списке таблицы операций.
-        Автоматически сохраняет выбор в базу данных и пересчитывает стоимость изделия.
-        """
-        try:
-            operation = self.operations_data[row]
-            operation_id = operation["id"]
-            new_employee_id = combo.currentData()
-            new_employee_name = combo.currentText()
-
-            # Обновляем локальные данные
-            self.operations_data[row]["employee_id"] = new_employee_id
-
-            # Обновляем в базе
-            query = "UPDATE operations SET employee_id = ? WHERE id = ?"
-            self.db_manager.execute_query(query, (new_employee_id, operation_id))
-            logger.info(f"Обновлен сотрудник операции {operation_id}: {new_employee_name}")
-
-            # Пересчитываем себестоимость (автоматически)
-            from modules.pricing import PricingManager
-            pricing = PricingManager(self.db_manager)
-            result = pricing.calculate_pricing(self.current_product_id)
-
-            calculated_price = result["cost_indicators"]["calculated_price"]
-            approved_price = result["cost_indicators"]["approved_price"]
-
-            if hasattr(self, "pricing_tab") and self.pricing_tab:
-                self.pricing_tab.update_price_display(calculated_price, approved_price)
-
-        except Exception as e:
-            logger.error(f"Ошибка при обновлении сотрудника в операции: {e}", exc_info=True)
-            QMessageBox.critical(self, "Ошибка", f"Не удалось обновить сотрудника:\n{e}")
-
     def _refresh_employee_combos_in_table(self):
         """Обновление всех выпадающих списков сотрудников в таблице"""
         # Загружаем актуальный список сотрудников
@@ -602,7 +580,8 @@ class MainInterface(QWidget):
         logger.debug("Создание вкладки каталога")
 
         # Используем готовый виджет CatalogTable
-        self.catalog_table = CatalogTable(self.db_manager, self)
+        self.catalog_table = CatalogTable(self.db_manager, self, export_queue=self.export_queue,
+                                          product_events=self.product_events)
 
         # Подключаем сигналы
         self.catalog_table.product_selected.connect(self.on_catalog_product_selected)
@@ -637,9 +616,9 @@ class MainInterface(QWidget):
         # Обновляем другие компоненты при необходимости
 
     def update_catalog_prices(self, product_id, approved_price, calculated_price):
-        """Обновление цен в каталоге при изменении в PricingTab"""
-        if hasattr(self, 'catalog_table'):
-            self.catalog_table.update_product_price(product_id, approved_price, calculated_price)
+        """Обновление цен в каталоге после сохранения цены из PricingTab (строка изделия перечитывается из БД)"""
+        logger.debug(f"Цены изделия ID {product_id} в каталоге: утверждённая {approved_price}, расчётная {calculated_price}")
+        self.product_events.notify_updated([product_id])
 
     def load_initial_data(self):
         """Загрузка начальных данных"""
@@ -823,9 +802,9 @@ class MainInterface(QWidget):
             current_material_id = self.material_combo.currentData()
             if current_material_id:
                 material_info = self.material_manager.get_material_by_id(current_material_id)
-                if material_info and len(material_info) >= 14:  # Проверяем, что у нас достаточно данных
+                if material_info:
                     # Определяем тип материала по категории
-                    category = material_info[1]  # индекс категории в базе данных
+                    category = material_info.category
 
                     # Определяем, какие поля ввода показывать
                     if category in ['Труба', 'Проволока', 'Профиль', 'Профиль г/к', 'Прут']:
@@ -1075,6 +1054,8 @@ class MainInterface(QWidget):
             # После успешного обновления перезагружаем операции из БД, чтобы гарантировать консистентность
             if self.current_product_id:
                 self._load_operations_to_form(self.current_product_id)
+                # Стоимость работ изменилась — строка изделия в каталоге
+                self.product_events.notify_updated([self.current_product_id])
 
             QMessageBox.information(None, "Успех", "Операция успешно обновлена")
 
@@ -1082,21 +1063,24 @@ class MainInterface(QWidget):
             logger.error(f"Ошибка при обновлении операции: {e}", exc_info=True)
             QMessageBox.critical(None, "Ошибка", f"Не удалось обновить операцию:\n{e}")
 
-        try:
-            from modules.pricing import PricingManager
-            pricing = PricingManager(self.db_manager)
-            result = pricing.calculate_pricing(self.current_product_id)
+        # Автоматический пересчет цены — в фоне, результат в _on_background_pricing_ready
+        self.recalc_scheduler.schedule(self.current_product_id)
 
-            calculated_price = result["cost_indicators"]["calculated_price"]
-            approved_price = result["cost_indicators"]["approved_price"]
+    def _on_background_pricing_ready(self, product_id, result):
+        """Результат фонового пересчета цены: площадь покраски в БД, обновление вкладки 'Цена изделия'"""
+        if product_id != self.current_product_id:
+            return
+        # Производные поля расчета (площадь покраски) — в БД; неизменившиеся не перезаписываются
+        if PricingManager(self.db_manager).persist_derived_fields({product_id: result}) is None:
+            logger.warning(f"Площадь покраски изделия ID {product_id} после пересчета не сохранена")
+        calculated_price = result["cost_indicators"]["calculated_price"]
+        approved_price = result["cost_indicators"]["approved_price"]
 
-            # Если вкладка "Цена изделия" уже открыта — обновим её визуально
-            if hasattr(self, "pricing_tab") and self.pricing_tab:
-                self.pricing_tab.update_price_display(calculated_price, approved_price)
+        # Если вкладка "Цена изделия" уже открыта — обновим её визуально
+        if hasattr(self, "pricing_tab") and self.pricing_tab:
+            self.pricing_tab.update_price_display(calculated_price, approved_price)
 
-            logger.info(f"Автоматический пересчет цены изделия {self.current_product_id}: {calculated_price:.2f}")
-        except Exception as e:
-            logger.error(f"Ошибка при автоматическом пересчете себестоимости: {e}", exc_info=True)
+        logger.info(f"Автоматический пересчет цены изделия {product_id}: {calculated_price:.2f}")
 
     def delete_selected_operation(self):
         """Удаление выбранной операции из таблицы"""
@@ -1128,7 +1112,7 @@ class MainInterface(QWidget):
             QMessageBox.warning(None, "Ошибка", "Не удалось получить информацию о материале")
             return
 
-        category = material_info[1]
+        category = material_info.category
 
         # Определяем, какой виджет активен
         current_widget_index = self.material_type_widget.currentIndex()
@@ -1142,8 +1126,8 @@ class MainInterface(QWidget):
                 return
 
             # Расчет стоимости для труб, проволоки, профиля: длина * вес_1м * количество
-            weight_per_meter = material_info[7]  # индекс веса за 1 м
-            our_price_per_kg = material_info[13]  # наша цена за кг
+            weight_per_meter = material_info.weight_per_meter
+            our_price_per_kg = material_info.our_price_per_kg  # наша цена за кг
             total_weight = length * weight_per_meter * quantity
             cost = total_weight * our_price_per_kg
 
@@ -1172,7 +1156,7 @@ class MainInterface(QWidget):
             density = 7850  # плотность стали в кг/м3
             volume = length * width * thickness * quantity  # в м3
             weight = volume * density
-            our_price_per_kg = material_info[13]  # наша цена за кг
+            our_price_per_kg = material_info.our_price_per_kg  # наша цена за кг
             cost = weight * our_price_per_kg
 
             # Сохранение данных
@@ -1195,7 +1179,7 @@ class MainInterface(QWidget):
                 return
 
             # Расчет стоимости для метизов: цена_за_единицу * количество
-            our_price_per_kg = material_info[13]  # наша цена за кг или за штуку
+            our_price_per_kg = material_info.our_price_per_kg  # наша цена за кг или за штуку
             # В вашем файле для метизов цена указана за штуку, а не за кг
             cost = our_price_per_kg * quantity
 
@@ -1316,12 +1300,12 @@ class MainInterface(QWidget):
             if not material_info:
                 QMessageBox.warning(None, "Ошибка", "Материал не найден в справочнике")
                 return
-            material_id = material_info[0]
-            our_price_per_kg = material_info[13]
+            material_id = material_info.id
+            our_price_per_kg = material_info.our_price_per_kg
 
-            category = material_info[1]
+            category = material_info.category
             if category in ['Труба', 'Проволока', 'Профиль', 'Профиль г/к', 'Прут']:
-                weight_per_meter = material_info[7]
+                weight_per_meter = material_info.weight_per_meter
                 total_weight = length * weight_per_meter * quantity
                 cost = total_weight * our_price_per_kg
             elif category == 'Лист':
@@ -1347,6 +1331,7 @@ class MainInterface(QWidget):
                 )
                 self.db_manager.execute_query(update_query, params)
                 logger.info(f"Материал '{material_name}' обновлён в БД")
+                self.product_events.notify_updated([self.current_product_id])
 
             # Обновляем GUI
             self.materials_table.setItem(current_row, 4, QTableWidgetItem(f"{cost:.2f}"))
@@ -1358,14 +1343,8 @@ class MainInterface(QWidget):
                 self.materials_data[current_row]['width'] = width
                 self.materials_data[current_row]['quantity'] = quantity
 
-            # Автоматический пересчёт цены
-            from modules.pricing import PricingManager
-            pricing = PricingManager(self.db_manager)
-            result = pricing.calculate_pricing(self.current_product_id)
-            calculated_price = result["cost_indicators"]["calculated_price"]
-            approved_price = result["cost_indicators"]["approved_price"]
-            if hasattr(self, "pricing_tab") and self.pricing_tab:
-                self.pricing_tab.update_price_display(calculated_price, approved_price)
+            # Автоматический пересчет цены — в фоне; площадь покраски сохраняет _on_background_pricing_ready
+            self.recalc_scheduler.schedule(self.current_product_id)
 
             QMessageBox.information(None, "Успех", "Материал обновлён")
 
@@ -1415,18 +1394,19 @@ class MainInterface(QWidget):
 
         if file_path:
             if file_path.endswith('.xlsx'):
-                success = self.report_manager.export_product_to_excel(product_id, file_path)
+                target = self.report_manager.export_product_to_excel
             elif file_path.endswith('.pdf'):
-                success = self.report_manager.export_product_to_pdf(product_id, file_path)
-            else:
-                success = False
-
-            if success:
-                QMessageBox.information(None, "Успех", "Файл успешно сохранен")
-                logger.info("Файл успешно сохранен")
+                target = self.report_manager.export_product_to_pdf
             else:
                 QMessageBox.critical(None, "Ошибка", "Ошибка при сохранении файла")
-                logger.error("Ошибка при сохранении файла")
+                logger.error(f"Неподдерживаемый формат файла: {file_path}")
+                return
+
+            # Запись файла — в фоне, о завершении сообщит строка состояния
+            self.export_queue.submit(
+                f"Изделие: {os.path.basename(file_path)}", target, product_id, file_path,
+                key=os.path.abspath(file_path)
+            )
 
     def on_product_double_clicked(self, item):
         """Обработка двойного клика по изделию в каталоге"""
@@ -1636,17 +1616,8 @@ class MainInterface(QWidget):
             self.db_manager.execute_query(query, (new_employee_id, operation_id))
             logger.info(f"Обновлен сотрудник для операции ID={operation_id}: {new_employee_name}")
 
-            # После изменения — пересчет себестоимости
-            from modules.pricing import PricingManager
-            pricing = PricingManager(self.db_manager)
-            result = pricing.calculate_pricing(self.current_product_id)
-
-            calculated_price = result["cost_indicators"]["calculated_price"]
-            approved_price = result["cost_indicators"]["approved_price"]
-
-            # Обновляем вкладку "Цена изделия", если она есть
-            if hasattr(self, "pricing_tab") and self.pricing_tab:
-                self.pricing_tab.update_price_display(calculated_price, approved_price)
+            # После изменения — пересчет себестоимости (серия переключений дает один расчет)
+            self.recalc_scheduler.schedule(self.current_product_id)
 
         except Exception as e:
             logger.error(f"Ошибка при обновлении сотрудника в операции: {e}", exc_info=True)
@@ -1,130 +1,240 @@
 # modules/materials.py
+from collections import defaultdict, namedtuple
+
 import pandas as pd
-import re
 from modules.database import DatabaseManager
+from modules.import_utils import (
+    ImportReport, add_message, clean_text, column_or_default, excel_row_numbers, parse_numeric
+)
+from modules.queries import MATERIAL_BY_ID, MATERIAL_BY_NAME, MATERIAL_CATEGORIES, MATERIALS_BY_CATEGORY
 import logging
 
 logger = logging.getLogger(__name__)
 
+MATERIALS_SHEET = "материалы"
+MATERIALS_HEADER_ROW = 1  # заголовки во второй строке листа
+
+# Столбцы Excel -> столбцы БД (тип: text/number), в порядке INSERT_MATERIAL_QUERY
+MATERIAL_EXCEL_COLUMNS = (
+    ('Категория', 'category', 'text'),
+    ('Наименование материала', 'name', 'text'),
+    ('диаметр', 'diameter', 'number'),
+    ('Сечение_длина', 'section_length', 'number'),
+    ('Сечение_ширина', 'section_width', 'number'),
+    ('Толщина', 'thickness', 'number'),
+    ('Вес 1 м, кг', 'weight_per_meter', 'number'),
+    ('закупка розн/т ', 'purchase_price_t', 'number'),
+    ('доставка/т + 3 % к закупочной цене', 'delivery_price_t', 'number'),
+    ('Брак, остатки (3%) + к закупочной цене', 'waste_price', 'number'),
+    ('Выходит закупка в грн./ 1 кг', 'final_price_kg', 'number'),
+    ('unit_of_measurement', 'unit_of_measurement', 'text'),
+    ('Наша продажа/кг', 'our_price_per_kg', 'number'),  # Наша цена за кг
+)
+
+MATERIAL_DB_COLUMNS = [db_column for _, db_column, _ in MATERIAL_EXCEL_COLUMNS]
+
+INSERT_MATERIAL_QUERY = f"""
+    INSERT INTO materials ({', '.join(MATERIAL_DB_COLUMNS)})
+    VALUES ({', '.join('?' for _ in MATERIAL_DB_COLUMNS)})
+"""
+
+# Ключ сверки строки прайса с справочником: категория, наименование и размеры
+MATERIAL_KEY_COLUMNS = ['category', 'name', 'diameter', 'section_length', 'section_width', 'thickness']
+MATERIAL_VALUE_COLUMNS = [column for column in MATERIAL_DB_COLUMNS if column not in MATERIAL_KEY_COLUMNS]
+
+_TEXT_COLUMNS = {db_column for _, db_column, kind in MATERIAL_EXCEL_COLUMNS if kind == 'text'}
+
+LIVE_MATERIALS_QUERY = f"""
+    SELECT id, is_active, {', '.join(MATERIAL_DB_COLUMNS)}
+    FROM materials
+    ORDER BY id
+"""
+
+# Обновление цен и параметров; материал, вернувшийся в прайс, снова становится действующим
+UPDATE_MATERIAL_QUERY = f"""
+    UPDATE materials SET {', '.join(f'{column} = ?' for column in MATERIAL_VALUE_COLUMNS)}, is_active = 1
+    WHERE id = ?
+"""
+
+RETIRE_MATERIAL_QUERY = "UPDATE materials SET is_active = 0 WHERE id = ?"
+
+# Итог импорта материалов: ImportReport + изменения справочника;
+# updated_ids — ID обновленных материалов (для пересчета зависящих от них изделий)
+MaterialImportReport = namedtuple(
+    "MaterialImportReport", ImportReport._fields + ("inserted", "updated", "unchanged", "retired", "updated_ids")
+)
+
+
+def _normalized(column, value):
+    """Значение из БД в виде, сравнимом с очищенной строкой прайса (NULL -> '' или 0.0)"""
+    if value is None:
+        return '' if column in _TEXT_COLUMNS else 0.0
+    return value if column in _TEXT_COLUMNS else float(value)
+
 
 class MaterialManager:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
 
     def load_materials_from_excel(self, file_path):
-        """Загрузка материалов из Excel файла"""
+        """
+        Инкрементальная синхронизация справочника материалов с Excel файлом.
+        Строки сверяются по ключу MATERIAL_KEY_COLUMNS: измененные обновляются, новые
+        добавляются, отсутствующие в прайсе снимаются (is_active = 0), а не удаляются,
+        поэтому ID материалов и ссылки спецификаций изделий сохраняются.
+        Возвращает MaterialImportReport или None при ошибке.
+        """
         logger.info(f"[МАТЕРИАЛЫ] Начало загрузки материалов из файла: {file_path}")
         try:
             # Читаем Excel файл, указывая лист "материалы" и используя вторую строку как заголовки
-            df = pd.read_excel(file_path, sheet_name="материалы", header=1)
+            df = pd.read_excel(file_path, sheet_name=MATERIALS_SHEET, header=MATERIALS_HEADER_ROW)
 
             # Удаляем строки, которые содержат только NaN или пустые значения
             df = df.dropna(how='all')
-
-            # Очистка существующих материалов
-            self.db_manager.execute_query("DELETE FROM materials")
-            logger.debug("[МАТЕРИАЛЫ] Очищены существующие материалы из БД")
-
-            # Вставка новых материалов
-            inserted_count = 0
-            for index, row in df.iterrows():
-                # Пропускаем строку, если в ней нет наименования материала
-                if pd.isna(row.get('Наименование материала', '')) or row['Наименование материала'] == '':
-                    continue
-
-                query = """
-                    INSERT INTO materials 
-                    (category, name, diameter, section_length, section_width, 
-                     thickness, weight_per_meter, purchase_price_t, delivery_price_t,
-                     waste_price, final_price_kg, unit_of_measurement, our_price_per_kg)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """
-
-                # Функция для безопасного преобразования значений в float
-                def safe_float(val):
-                    try:
-                        if pd.isna(val) or val == '' or val is None:
-                            return 0.0
-                        # Проверяем, является ли значение строкой
-                        if isinstance(val, str):
-                            # Ищем числовые значения в строке
-                            numbers = re.findall(r'[\d.,]+', val)
-                            if numbers:
-                                # Берем первое найденное число и заменяем запятую на точку
-                                num_str = numbers[0].replace(',', '.')
-                                try:
-                                    return float(num_str)
-                                except ValueError:
-                                    return 0.0
-                            else:
-                                return 0.0
-                        return float(val)
-                    except (ValueError, TypeError, AttributeError):
-                        return 0.0
-
-                # Функция для безопасного преобразования значений в строку
-                def safe_str(val):
-                    try:
-                        if pd.isna(val) or val is None:
-                            return ''
-                        # Преобразуем в строку и убираем лишние пробелы
-                        return str(val).strip()
-                    except:
-                        return ''
-
-                params = (
-                    safe_str(row.get('Категория', '')),
-                    safe_str(row.get('Наименование материала', '')),
-                    safe_float(row.get('диаметр', 0.0)),
-                    safe_float(row.get('Сечение_длина', 0.0)),
-                    safe_float(row.get('Сечение_ширина', 0.0)),
-                    safe_float(row.get('Толщина', 0.0)),
-                    safe_float(row.get('Вес 1 м, кг', 0.0)),
-                    safe_float(row.get('закупка розн/т ', 0.0)),
-                    safe_float(row.get('доставка/т + 3 % к закупочной цене', 0.0)),
-                    safe_float(row.get('Брак, остатки (3%) + к закупочной цене', 0.0)),
-                    safe_float(row.get('Выходит закупка в грн./ 1 кг', 0.0)),
-                    safe_str(row.get('unit_of_measurement', '')),
-                    safe_float(row.get('Наша продажа/кг', 0.0))  # Наша цена за кг
-                )
-
-                self.db_manager.execute_query(query, params)
-                inserted_count += 1
-                logger.debug(f"[МАТЕРИАЛЫ] Добавлен материал: {params[1]}")
-
-            logger.info(f"[МАТЕРИАЛЫ] Загружено {inserted_count} строк из Excel файла материалов")
-            return True
+            rows, prepared = self._prepare_material_rows(df)
+
+            # Сверка и применение изменений — одна транзакция
+            with self.db_manager.transaction():
+                inserted, updated_ids, unchanged, retired = self._sync_materials(rows)
+
+            updated = len(updated_ids)
+            report = MaterialImportReport(
+                *prepared, inserted=inserted, updated=updated, unchanged=unchanged, retired=retired,
+                updated_ids=updated_ids
+            )
+            logger.info(f"[МАТЕРИАЛЫ] Загружено {report.accepted} строк из Excel файла материалов, "
+                        f"отклонено {report.rejected}: добавлено {inserted}, обновлено {updated}, "
+                        f"без изменений {unchanged}, снято {retired}")
+            for message in report.messages:
+                logger.warning(f"[МАТЕРИАЛЫ] {message}")
+            return report
         except Exception as e:
             logger.error(f"[МАТЕРИАЛЫ] Ошибка при загрузке материалов: {e}", exc_info=True)
-            return False
+            return None
+
+    def _prepare_material_rows(self, df):
+        """Векторизованная очистка столбцов и формирование строк для executemany"""
+        row_numbers = excel_row_numbers(df, MATERIALS_HEADER_ROW)
+        messages = []
+
+        names = clean_text(column_or_default(df, 'Наименование материала', ''))
+        accepted_mask = names != ''
+        for row_number in row_numbers[~accepted_mask.to_numpy()]:
+            add_message(messages, f"Строка {row_number}: нет наименования материала, строка пропущена")
+
+        columns = {'name': names}
+        for excel_column, db_column, kind in MATERIAL_EXCEL_COLUMNS:
+            if db_column == 'name':
+                continue
+            source = column_or_default(df, excel_column, '' if kind == 'text' else 0.0)
+            if kind == 'text':
+                columns[db_column] = clean_text(source)
+                continue
+            values, invalid = parse_numeric(source)
+            invalid &= accepted_mask
+            for row_number in row_numbers[invalid.to_numpy()]:
+                add_message(messages, f"Строка {row_number}: '{excel_column}' не распознано как число, записан 0")
+            columns[db_column] = values.fillna(0.0)
+
+        cleaned = pd.DataFrame(columns)[accepted_mask]
+        rows = list(cleaned[MATERIAL_DB_COLUMNS].itertuples(index=False, name=None))
+        report = ImportReport(accepted=len(rows), rejected=int((~accepted_mask).sum()), messages=messages)
+        return rows, report
+
+    def _sync_materials(self, rows):
+        """
+        Сверка строк прайса с справочником (вызывается внутри транзакции).
+        Повторяющиеся ключи сопоставляются по порядку появления: n-я строка прайса
+        с ключом — n-му по ID материалу с тем же ключом.
+        Возвращает (добавлено, ID обновленных, без изменений, снято).
+        """
+        key_positions = [MATERIAL_DB_COLUMNS.index(column) for column in MATERIAL_KEY_COLUMNS]
+        value_positions = [MATERIAL_DB_COLUMNS.index(column) for column in MATERIAL_VALUE_COLUMNS]
+
+        live = defaultdict(list)
+        for row in self.db_manager.fetch_all(LIVE_MATERIALS_QUERY):
+            material_id, is_active, values = row[0], row[1], row[2:]
+            normalized = tuple(_normalized(column, value) for column, value in zip(MATERIAL_DB_COLUMNS, values))
+            live[tuple(normalized[i] for i in key_positions)].append((material_id, is_active, normalized))
+
+        inserts, updates = [], []
+        unchanged = 0
+        occurrences = defaultdict(int)
+        for row in rows:
+            key = tuple(row[i] for i in key_positions)
+            occurrence = occurrences[key]
+            occurrences[key] += 1
+            matches = live.get(key, ())
+            if occurrence >= len(matches):
+                inserts.append(row)
+                continue
+            material_id, is_active, current = matches[occurrence]
+            new_values = tuple(row[i] for i in value_positions)
+            if is_active and new_values == tuple(current[i] for i in value_positions):
+                unchanged += 1
+            else:
+                updates.append(new_values + (material_id,))
+
+        # Действующие материалы, которых больше нет в прайсе
+        retires = [
+            (material_id,)
+            for key, matches in live.items()
+            for material_id, is_active, _ in matches[occurrences.get(key, 0):]
+            if is_active
+        ]
+
+        if updates:
+            self.db_manager.execute_many(UPDATE_MATERIAL_QUERY, updates)
+        if inserts:
+            self.db_manager.execute_many(INSERT_MATERIAL_QUERY, inserts)
+        if retires:
+            self.db_manager.execute_many(RETIRE_MATERIAL_QUERY, retires)
+        return len(inserts), [update[-1] for update in updates], unchanged, len(retires)
+
+    def update_materials(self, edits):
+        """
+        Запись правок справочника {ID материала: {столбец: значение}} одной транзакцией
+        (или в транзакции вызывающего). Материалы с одинаковым набором измененных столбцов
+        обновляются одним пакетным запросом. Возвращает число обновленных материалов.
+        """
+        groups = defaultdict(list)
+        for material_id, changes in edits.items():
+            columns = tuple(sorted(changes))
+            unknown = set(columns) - set(MATERIAL_DB_COLUMNS)
+            if unknown:
+                raise ValueError(f"Неизвестные столбцы материалов: {', '.join(sorted(unknown))}")
+            groups[columns].append(tuple(changes[column] for column in columns) + (material_id,))
+
+        with self.db_manager.transaction():
+            for columns, params in groups.items():
+                query = f"UPDATE materials SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?"
+                self.db_manager.execute_many(query, params)
+        logger.info(f"[МАТЕРИАЛЫ] Обновлено материалов: {len(edits)} ({len(groups)} пакетов)")
+        return len(edits)
 
     def get_all_materials(self):
-        """Получение всех материалов"""
+        """Получение всех действующих материалов"""
         logger.debug("[МАТЕРИАЛЫ] Получение всех материалов из БД")
-        query = "SELECT id, name FROM materials ORDER BY name"
+        query = "SELECT id, name FROM materials WHERE is_active = 1 ORDER BY name"
         return self.db_manager.fetch_all(query)
 
     def get_categories(self):
         """Получение всех категорий материалов"""
         logger.debug("[МАТЕРИАЛЫ] Получение всех категорий материалов из БД")
-        query = "SELECT DISTINCT category FROM materials WHERE category != '' ORDER BY category"
-        categories = self.db_manager.fetch_all(query)
-        return [row[0] for row in categories]
+        categories = self.db_manager.fetch_all(MATERIAL_CATEGORIES)
+        return [row.category for row in categories]
 
     def get_materials_by_category(self, category):
         """Получение материалов по категории"""
         logger.debug(f"[МАТЕРИАЛЫ] Получение материалов по категории: {category}")
-        query = "SELECT id, name FROM materials WHERE category = ? ORDER BY name"
-        return self.db_manager.fetch_all(query, (category,))
+        return self.db_manager.fetch_all(MATERIALS_BY_CATEGORY, (category,))
 
     def get_material_by_id(self, material_id):
         """Получение материала по ID"""
         logger.debug(f"[МАТЕРИАЛЫ] Получение материала по ID: {material_id}")
-        query = "SELECT * FROM materials WHERE id = ?"
-        return self.db_manager.fetch_one(query, (material_id,))
+        return self.db_manager.fetch_one(MATERIAL_BY_ID, (material_id,))
 
     def get_material_by_name(self, name):
         """Получение материала по названию"""
         logger.debug(f"[МАТЕРИАЛЫ] Получение материала по названию: {name}")
-        query = "SELECT * FROM materials WHERE name = ?"
-        return self.db_manager.fetch_one(query, (name,))
+        return self.db_manager.fetch_one(MATERIAL_BY_NAME, (name,))
@@ -2,22 +2,243 @@
 import logging
 import pandas as pd
 from PyQt5.QtWidgets import (
-    QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+    QDialog, QVBoxLayout, QHBoxLayout, QTableView, QAbstractItemView,
     QPushButton, QHeaderView, QLineEdit, QFileDialog, QMessageBox, QLabel
 )
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QDoubleValidator
+from PyQt5.QtCore import Qt, pyqtSignal, QAbstractTableModel, QModelIndex, QTimer
+from PyQt5.QtGui import QColor
+
+from modules.dependencies import DependencyIndex
+from modules.materials import MaterialManager
+from modules.pricing import PricingManager
+from modules.queries import MATERIALS_ALL
 
 logger = logging.getLogger(__name__)
 
+# Поля материала, от которых зависит стоимость строк спецификаций (см. PricingManager.reprice_products)
+COST_COLUMNS = {"category", "weight_per_meter", "our_price_per_kg"}
+
+# Пауза после ввода в поле поиска перед фильтрацией, мс
+SEARCH_DEBOUNCE_MS = 200
+
+MATERIAL_HEADERS = (
+    "ID", "Категория", "Наименование", "Диаметр",
+    "Сечение (длина)", "Сечение (ширина)", "Толщина",
+    "Вес 1 м, кг", "Закупка за т", "Доставка за т", "Брак за т",
+    "Закупка за кг", "Ед. изм.", "Наша цена/кг"
+)
+
+# Столбцы БД в порядке столбцов таблицы (строки MATERIALS_ALL)
+MATERIAL_FIELDS = MATERIALS_ALL.row._fields
+
+NUMERIC_FIELDS = {
+    "diameter", "section_length", "section_width", "thickness",
+    "weight_per_meter", "purchase_price_t", "delivery_price_t",
+    "waste_price", "final_price_kg", "our_price_per_kg"
+}
+
+# Сколько строк просматривается при подборе ширины столбцов
+MATERIALS_SIZE_HINT_ROWS = 200
+
+# Ячейка с несохраненной правкой
+_COLOR_PENDING = QColor(255, 240, 200)
+
+
+def _numeric_sort_key(value):
+    """Ключ сортировки числового столбца: пустые и нечисловые значения — после чисел"""
+    try:
+        return False, float(value)
+    except (TypeError, ValueError):
+        return True, 0.0
+
+
+class MaterialsModel(QAbstractTableModel):
+    """
+    Модель справочника материалов: строки загружаются один раз, для поиска хранится
+    строка «наименование + категория» в нижнем регистре. Текст ячейки формируется только
+    при запросе представлением. Правки копятся до apply/revert диалога.
+    """
+
+    # Значение не принято (текст сообщения)
+    edit_rejected = pyqtSignal(str)
+    # Изменилось число материалов с несохраненными правками
+    pending_changed = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._search_keys = []
+        # Индексы строк в порядке сортировки и отобранные фильтром (в том же порядке)
+        self._order = []
+        self._visible = []
+        self._filter_text = ""
+        # Индекс строки -> {столбец БД: новое значение}
+        self._pending = {}
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._search_keys = [self._search_key(row) for row in self._rows]
+        self._order = list(range(len(self._rows)))
+        self._pending = {}
+        self._visible = self._filtered(self._order, self._filter_text)
+        self.endResetModel()
+        self.pending_changed.emit(0)
+
+    @staticmethod
+    def _search_key(row):
+        return f"{row.name or ''}\n{row.category or ''}".lower()
+
+    def set_filter(self, text):
+        """Подстрока в наименовании или категории; уточнение запроса ищет среди уже найденных"""
+        text = text.strip().lower()
+        if text == self._filter_text:
+            return
+        candidates = self._visible if self._filter_text and self._filter_text in text else self._order
+        self.beginResetModel()
+        self._filter_text = text
+        self._visible = self._filtered(candidates, text)
+        self.endResetModel()
+
+    def _filtered(self, candidates, text):
+        if not text:
+            return list(candidates)
+        keys = self._search_keys
+        return [index for index in candidates if text in keys[index]]
+
+    def total_count(self):
+        return len(self._rows)
+
+    def visible_rows(self):
+        """Сохраненные значения отобранных материалов в порядке таблицы"""
+        return [self._rows[index] for index in self._visible]
+
+    # --- Правки ---
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def pending_edits(self):
+        """Несохраненные правки: {ID материала: {столбец БД: значение}}"""
+        return {self._rows[index].id: dict(changes) for index, changes in self._pending.items()}
+
+    def commit_pending(self):
+        """
+        Правки записаны в БД: становятся сохраненными значениями строк. Отбор повторяется —
+        измененные наименование или категория могут вывести материал из поиска или вернуть в него
+        """
+        for index, changes in self._pending.items():
+            self._rows[index] = self._rows[index]._replace(**changes)
+            self._search_keys[index] = self._search_key(self._rows[index])
+        self._pending = {}
+        self.beginResetModel()
+        self._visible = self._filtered(self._order, self._filter_text)
+        self.endResetModel()
+        self.pending_changed.emit(0)
+
+    def revert(self):
+        self._finish_pending()
+
+    def _finish_pending(self):
+        self._pending = {}
+        if self._visible:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self._visible) - 1, len(MATERIAL_FIELDS) - 1))
+        self.pending_changed.emit(0)
+
+    def _value(self, index, column):
+        changes = self._pending.get(index)
+        field = MATERIAL_FIELDS[column]
+        if changes and field in changes:
+            return changes[field]
+        return self._rows[index][column]
+
+    # --- QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._visible)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(MATERIAL_FIELDS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and 0 <= section < len(MATERIAL_HEADERS):
+            return MATERIAL_HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() != 0:  # ID — только для чтения
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignRight | Qt.AlignVCenter if MATERIAL_FIELDS[column] in NUMERIC_FIELDS else None
+        row_index = self._visible[index.row()]
+        if role == Qt.BackgroundRole:
+            changes = self._pending.get(row_index)
+            return _COLOR_PENDING if changes and MATERIAL_FIELDS[column] in changes else None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            value = self._value(row_index, column)
+            return "" if value is None else str(value)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole or index.column() == 0:
+            return False
+        field = MATERIAL_FIELDS[index.column()]
+        text = str(value).strip()
+        if field in NUMERIC_FIELDS:
+            try:
+                new_value = float(text.replace(',', '.'))
+            except ValueError:
+                self.edit_rejected.emit(f"Неверный формат числа в поле '{MATERIAL_HEADERS[index.column()]}'")
+                return False
+        else:
+            new_value = text
+
+        row_index = self._visible[index.row()]
+        changes = self._pending.setdefault(row_index, {})
+        if new_value == self._rows[row_index][index.column()]:
+            # Возврат к сохраненному значению — правки нет
+            changes.pop(field, None)
+        else:
+            changes[field] = new_value
+        if not changes:
+            del self._pending[row_index]
+        self.dataChanged.emit(index, index)
+        self.pending_changed.emit(len(self._pending))
+        return True
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Сортировка по столбцу (сохраненные значения); column < 0 — порядок загрузки"""
+        rows = self._rows
+        if column < 0:
+            self._order = list(range(len(rows)))
+        else:
+            if MATERIAL_FIELDS[column] in NUMERIC_FIELDS or column == 0:
+                keys = [_numeric_sort_key(row[column]) for row in rows]
+            else:
+                keys = [str(row[column] or "").lower() for row in rows]
+            self._order = sorted(range(len(rows)), key=keys.__getitem__, reverse=order == Qt.DescendingOrder)
+        self.beginResetModel()
+        self._visible = self._filtered(self._order, self._filter_text)
+        self.endResetModel()
+
 
 class MaterialsDialog(QDialog):
     # Сигнал для обновления справочника в других модулях (если понадобится)
     materials_updated = pyqtSignal()
+    # ID изделий, стоимость которых пересчитана после правки материала
+    products_repriced = pyqtSignal(list)
 
     def __init__(self, db_manager, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
+        self.material_manager = MaterialManager(db_manager)
         self.setWindowTitle("Справочник материалов")
         self.resize(1200, 700)
         self.setup_ui()
@@ -31,148 +252,135 @@ class MaterialsDialog(QDialog):
         search_layout.addWidget(QLabel("Поиск:"))
         self.search_edit = QLineEdit()
         self.search_edit.setPlaceholderText("Введите текст для поиска по наименованию или категории...")
-        self.search_edit.textChanged.connect(self.apply_filter)
         search_layout.addWidget(self.search_edit)
+        self.count_label = QLabel()
+        search_layout.addWidget(self.count_label)
         layout.addLayout(search_layout)
 
-        # === Таблица материалов ===
-        self.table = QTableWidget()
-        self.table.setColumnCount(14)
-        self.table.setHorizontalHeaderLabels([
-            "ID", "Категория", "Наименование", "Диаметр",
-            "Сечение (длина)", "Сечение (ширина)", "Толщина",
-            "Вес 1 м, кг", "Закупка за т", "Доставка за т", "Брак за т",
-            "Закупка за кг", "Ед. изм.", "Наша цена/кг"
-        ])
+        # Фильтр — после паузы во вводе, а не на каждый символ
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.apply_filter)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+
+        # === Таблица материалов: ячейки форматируются только для видимых строк ===
+        self.model = MaterialsModel(self)
+        self.model.edit_rejected.connect(lambda message: QMessageBox.warning(self, "Ошибка", message))
+        self.model.pending_changed.connect(self._on_pending_changed)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QAbstractItemView.DoubleClicked)
+        # Высота строк постоянна, ширина столбцов — по первым строкам, а не по всему справочнику
+        vertical_header = self.table.verticalHeader()
+        vertical_header.setSectionResizeMode(QHeaderView.Fixed)
+        vertical_header.setDefaultSectionSize(vertical_header.minimumSectionSize() + 6)
         header = self.table.horizontalHeader()
-        header.setSectionResizeMode(QHeaderView.ResizeToContents)
+        header.setResizeContentsPrecision(MATERIALS_SIZE_HINT_ROWS)
+        header.setSectionResizeMode(QHeaderView.Interactive)
         header.setStretchLastSection(False)
-        header.sectionClicked.connect(self.sort_by_column)  # Сортировка по клику
-        self.table.setSortingEnabled(False)  # Управляем сортировкой вручную из-за фильтрации
-
-        # Разрешаем редактирование всех ячеек (кроме ID)
-        self.table.setEditTriggers(QTableWidget.DoubleClicked)
-        self.table.itemChanged.connect(self.on_item_changed)
-
+        # Сортировка по клику на заголовок — в модели, поверх фильтра; до клика — порядок загрузки
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
         layout.addWidget(self.table)
 
         # === Кнопки ===
         button_layout = QHBoxLayout()
+        self.apply_btn = QPushButton("Применить")
+        self.apply_btn.clicked.connect(self.apply_changes)
+        self.revert_btn = QPushButton("Отменить изменения")
+        self.revert_btn.clicked.connect(self.revert_changes)
         self.export_btn = QPushButton("Экспорт в Excel")
         self.export_btn.clicked.connect(self.export_to_excel)
         close_btn = QPushButton("Закрыть")
         close_btn.clicked.connect(self.accept)
+        button_layout.addWidget(self.apply_btn)
+        button_layout.addWidget(self.revert_btn)
         button_layout.addStretch()
         button_layout.addWidget(self.export_btn)
         button_layout.addWidget(close_btn)
         layout.addLayout(button_layout)
-
-        self.all_materials = []  # все материалы (без фильтрации)
-        self.filtered_materials = []  # отфильтрованные
+        self._on_pending_changed(0)
 
     def load_materials(self):
         """Загружает все материалы из БД"""
         try:
-            query = "SELECT * FROM materials ORDER BY category, name"
-            self.all_materials = self.db_manager.fetch_all(query)
-            self.apply_filter()  # применяет текущий поиск (если есть)
-            logger.info(f"Загружено {len(self.all_materials)} материалов")
+            self.model.set_rows(self.db_manager.fetch_all(MATERIALS_ALL))
+            self.table.resizeColumnsToContents()
+            self._update_count()
+            logger.info(f"Загружено {self.model.total_count()} материалов")
         except Exception as e:
             logger.error(f"Ошибка загрузки материалов: {e}", exc_info=True)
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить справочник:\n{e}")
 
     def apply_filter(self):
         """Применяет фильтр поиска"""
-        filter_text = self.search_edit.text().strip().lower()
-        if not filter_text:
-            self.filtered_materials = self.all_materials
-        else:
-            self.filtered_materials = [
-                row for row in self.all_materials
-                if (row[2] and filter_text in row[2].lower()) or  # Наименование
-                   (row[1] and filter_text in row[1].lower())      # Категория
-            ]
-        self.update_table()
-
-    def update_table(self):
-        """Обновляет таблицу на основе filtered_materials"""
-        self.table.setSortingEnabled(False)
-        self.table.setRowCount(len(self.filtered_materials))
-        for row_idx, row_data in enumerate(self.filtered_materials):
-            for col_idx, value in enumerate(row_data):
-                item = QTableWidgetItem(str(value) if value is not None else "")
-                if col_idx == 0:  # ID — только для чтения
-                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-                else:
-                    # Попытка применить числовой валидатор (необязательно, но полезно)
-                    if col_idx in [3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]:
-                        item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-                self.table.setItem(row_idx, col_idx, item)
-        self.table.setSortingEnabled(True)
+        self.search_timer.stop()
+        self.model.set_filter(self.search_edit.text())
+        self._update_count()
 
-    def sort_by_column(self, logical_index):
-        """Сортировка по клику на заголовок (игнорируем при поиске, чтобы не ломать фильтр)"""
-        # В данном случае мы не реализуем сортировку поверх фильтрации,
-        # чтобы не усложнять. Можно добавить позже при необходимости.
-        pass
+    def _update_count(self):
+        self.count_label.setText(f"Материалов: {self.model.rowCount()} из {self.model.total_count()}")
 
-    def on_item_changed(self, item):
-        """Сохраняет изменение ячейки в БД"""
-        try:
-            row = item.row()
-            col = item.column()
-            new_value = item.text().strip()
+    def _on_pending_changed(self, count):
+        self.apply_btn.setEnabled(count > 0)
+        self.revert_btn.setEnabled(count > 0)
+        self.apply_btn.setText(f"Применить ({count})" if count else "Применить")
 
-            # Получаем ID материала из первого столбца
-            id_item = self.table.item(row, 0)
-            if not id_item:
-                return
-            material_id = int(id_item.text())
-
-            # Получаем имя колонки для SQL (по порядку)
-            column_names = [
-                "id", "category", "name", "diameter",
-                "section_length", "section_width", "thickness",
-                "weight_per_meter", "purchase_price_t", "delivery_price_t",
-                "waste_price", "final_price_kg", "unit_of_measurement", "our_price_per_kg"
-            ]
-            if col >= len(column_names):
-                return
+    def apply_changes(self):
+        """
+        Запись всех правок одной транзакцией вместе с пересчетом стоимости изделий,
+        в спецификации которых есть материалы с измененной ценой или параметрами.
+        При ошибке ничего не сохраняется, правки остаются в таблице. Возвращает успех.
+        """
+        edits = self.model.pending_edits()
+        if not edits:
+            return True
+        cost_material_ids = [material_id for material_id, changes in edits.items() if COST_COLUMNS & changes.keys()]
+        product_ids = []
+        try:
+            with self.db_manager.transaction():
+                self.material_manager.update_materials(edits)
+                if cost_material_ids:
+                    product_ids = DependencyIndex(self.db_manager).products_for_materials(cost_material_ids)
+                if product_ids and PricingManager(self.db_manager).reprice_products(product_ids) is None:
+                    raise RuntimeError("не удалось пересчитать стоимость изделий с этими материалами")
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении изменений справочника: {e}", exc_info=True)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить изменения:\n{e}")
+            return False
 
-            column_name = column_names[col]
-            if column_name == "id":
-                return  # ID нельзя менять
-
-            # Преобразуем значение в нужный тип (число или строка)
-            if column_name in [
-                "diameter", "section_length", "section_width", "thickness",
-                "weight_per_meter", "supplier_price_per_ton", "delivery_cost_per_ton",
-                "waste_cost_per_ton", "supplier_price_per_kg", "our_price", "reserved"
-            ]:
-                try:
-                    float_val = float(new_value.replace(',', '.'))
-                    query = f"UPDATE materials SET {column_name} = ? WHERE id = ?"
-                    self.db_manager.execute_query(query, (float_val, material_id))
-                except ValueError:
-                    QMessageBox.warning(self, "Ошибка", f"Неверный формат числа в поле '{column_names[col]}'")
-                    # Восстанавливаем старое значение (опционально)
-                    return
-            else:
-                # Строка
-                query = f"UPDATE materials SET {column_name} = ? WHERE id = ?"
-                self.db_manager.execute_query(query, (new_value, material_id))
+        self.model.commit_pending()
+        self._update_count()
+        logger.info(f"Сохранены правки {len(edits)} материалов, пересчитана стоимость {len(product_ids)} изделий")
+        self.materials_updated.emit()
+        if product_ids:
+            self.products_repriced.emit(product_ids)
+        return True
 
-            logger.info(f"Обновлён материал ID={material_id}, поле={column_name}, значение={new_value}")
-            self.materials_updated.emit()
+    def revert_changes(self):
+        """Отмена несохраненных правок"""
+        self.model.revert()
 
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении изменения: {e}", exc_info=True)
-            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить изменение:\n{e}")
+    def done(self, result):
+        """Закрытие диалога: несохраненные правки применяются или отбрасываются по выбору"""
+        if self.model.pending_count():
+            reply = QMessageBox.question(
+                self, "Справочник материалов",
+                f"Есть несохраненные изменения ({self.model.pending_count()} материалов). Применить?",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel
+            )
+            if reply == QMessageBox.Cancel:
+                return
+            if reply == QMessageBox.Yes and not self.apply_changes():
+                return
+        super().done(result)
 
     def export_to_excel(self):
         """Экспортирует текущий (отфильтрованный) список материалов в Excel"""
         try:
-            if not self.filtered_materials:
+            rows = self.model.visible_rows()
+            if not rows:
                 QMessageBox.warning(self, "Пусто", "Нет данных для экспорта.")
                 return
 
@@ -185,14 +393,8 @@ class MaterialsDialog(QDialog):
             if not file_path:
                 return
 
-            # Подготавливаем данные
-            headers = [
-                "ID", "Категория", "Наименование", "Диаметр",
-                "Сечение (длина)", "Сечение (ширина)", "Толщина",
-                "Вес 1 м, кг", "Закупка розн/т", "Доставка/т", "Брак/т",
-                "Закупка за кг", "Наша цена/кг", "Резерв"
-            ]
-            df = pd.DataFrame(self.filtered_materials, columns=headers)
+            # Заголовки — как в таблице диалога
+            df = pd.DataFrame(rows, columns=MATERIAL_HEADERS)
 
             # Сохраняем
             df.to_excel(file_path, index=False)
@@ -201,4 +403,4 @@ class MaterialsDialog(QDialog):
 
         except Exception as e:
             logger.error(f"Ошибка экспорта в Excel: {e}", exc_info=True)
-            QMessageBox.critical(self, "Ошибка", f"Не удалось экспортировать:\n{e}")
\ No newline at end of file
+            QMessageBox.critical(self, "Ошибка", f"Не удалось экспортировать:\n{e}")
@@ -0,0 +1,762 @@
+# modules/migrations.py
+import logging
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+
+def _column_exists(conn, table, column):
+    """Проверка наличия столбца в таблице (через PRAGMA table_info, без пробных запросов)"""
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _add_column(conn, table, column, definition):
+    """Добавление столбца, если его еще нет"""
+    if not _column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        logger.info(f"[МИГРАЦИИ] Добавлен столбец '{column}' в таблицу {table}")
+
+
+def _migration_001_base_schema(conn):
+    """Базовые таблицы и стандартный список операций"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS employees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            surname TEXT DEFAULT '',
+            position TEXT DEFAULT ''
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT,
+            operation_name TEXT NOT NULL,
+            rate_per_hour REAL DEFAULT 0.0,
+            rate_per_minute REAL DEFAULT 0.0,
+            rate_per_second REAL DEFAULT 0.0,
+            old_rate REAL DEFAULT 0.0,
+            new_rate REAL DEFAULT 0.0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS operations_list (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            rate_per_minute REAL DEFAULT 0.0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS materials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT,
+            name TEXT NOT NULL,
+            diameter REAL,
+            section_length REAL,
+            section_width REAL,
+            thickness REAL,
+            weight_per_meter REAL,
+            purchase_price_t REAL,
+            delivery_price_t REAL,
+            waste_price REAL,
+            final_price_kg REAL,
+            unit_of_measurement TEXT,
+            our_price_per_kg REAL  -- Наша цена за кг
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id TEXT,
+            article TEXT,
+            name TEXT NOT NULL,
+            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS operations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            operation_name TEXT NOT NULL,
+            quantity_measured INTEGER,
+            time_measured REAL,
+            time_per_unit REAL,
+            rate_per_minute REAL,
+            cost REAL,
+            employee_id INTEGER,
+            approved_rate REAL DEFAULT NULL,
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (employee_id) REFERENCES employees (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS product_materials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            material_id INTEGER,
+            length REAL,
+            width REAL,
+            thickness REAL,
+            quantity INTEGER,
+            cost REAL,
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (material_id) REFERENCES materials (id)
+        )
+    ''')
+
+    # Стандартные операции — только для пустого справочника
+    if conn.execute("SELECT COUNT(*) FROM operations_list").fetchone()[0] == 0:
+        default_operations = [
+            ("Токарная обработка", 2.5),
+            ("Фрезерование", 3.0),
+            ("Сверление", 1.5),
+            ("Шлифовка", 2.0),
+            ("Сборка", 1.8),
+            ("Покраска", 2.2)
+        ]
+        conn.executemany(
+            "INSERT INTO operations_list (name, rate_per_minute) VALUES (?, ?)",
+            default_operations
+        )
+        logger.info("[МИГРАЦИИ] Добавлены стандартные операции")
+
+
+def _migration_002_employee_details(conn):
+    """Фамилия и должность сотрудника"""
+    _add_column(conn, "employees", "surname", "TEXT DEFAULT ''")
+    _add_column(conn, "employees", "position", "TEXT DEFAULT ''")
+    conn.execute("UPDATE employees SET surname = '' WHERE surname IS NULL")
+    conn.execute("UPDATE employees SET position = '' WHERE position IS NULL")
+
+
+def _migration_003_product_pricing(conn):
+    """Параметры цены изделия и площадь покраски"""
+    _add_column(conn, "products", "overhead_percent", "REAL DEFAULT 0.55")
+    _add_column(conn, "products", "profit_percent", "REAL DEFAULT 0.30")
+    _add_column(conn, "products", "approved_price", "REAL DEFAULT 0.0")
+    _add_column(conn, "products", "total_paint_area", "REAL DEFAULT 0.0")
+    _add_column(conn, "products", "calculated_price", "REAL")
+
+
+def _migration_004_product_material_dimensions(conn):
+    """Ширина, толщина и площадь покраски позиции материала"""
+    _add_column(conn, "product_materials", "width", "REAL DEFAULT 0")
+    _add_column(conn, "product_materials", "thickness", "REAL DEFAULT 0")
+    _add_column(conn, "product_materials", "paint_area", "REAL DEFAULT 0.0")
+
+
+def _migration_005_fix_pricing_types(conn):
+    """Сброс некорректных (нечисловых) параметров цены к значениям по умолчанию"""
+    cursor = conn.execute("""
+        UPDATE products
+        SET overhead_percent = 0.55, profit_percent = 0.30, approved_price = 0.0
+        WHERE overhead_percent IS NOT NULL AND typeof(overhead_percent) != 'real'
+           OR profit_percent IS NOT NULL AND typeof(profit_percent) != 'real'
+           OR approved_price IS NOT NULL AND typeof(approved_price) != 'real'
+    """)
+    if cursor.rowcount:
+        logger.warning(f"[МИГРАЦИИ] Исправлено {cursor.rowcount} изделий с некорректными данными цены")
+
+
+# -----------------------
+# Вторичные индексы миграций (зафиксированы на версии миграции): имя -> (таблица, столбцы)
+# -----------------------
+# Миграция создает индексы своего набора и удаляет замененные индексы прежних наборов;
+# новый индекс — новая миграция со своим набором, а не правка наборов ниже.
+
+_INDEXES_V6 = {
+    "idx_operations_product_id": ("operations", "product_id"),
+    "idx_operations_employee_id": ("operations", "employee_id"),
+    "idx_product_materials_product_id": ("product_materials", "product_id"),
+    "idx_product_materials_material_id": ("product_materials", "material_id"),
+    "idx_materials_category_name": ("materials", "category, name"),
+    "idx_materials_name": ("materials", "name"),
+}
+
+# Покрывающие индексы: сводка каталога агрегирует стоимость без обращения к таблице
+_INDEXES_V7 = {
+    "idx_operations_product_cost": ("operations", "product_id, cost, approved_rate"),
+    "idx_product_materials_product_cost": ("product_materials", "product_id, cost"),
+}
+_DROPPED_INDEXES_V7 = ("idx_operations_product_id", "idx_product_materials_product_id")
+
+_INDEXES_V8 = {
+    "idx_products_created_date": ("products", "created_date"),
+}
+
+# Ключ сверки справочника материалов при импорте
+_INDEXES_V9 = {
+    "idx_materials_import_key": (
+        "materials", "category, name, diameter, section_length, section_width, thickness"
+    ),
+}
+
+# Ставка операции по названию (пакетный пересчет цен)
+_INDEXES_V10 = {
+    "idx_operations_list_name": ("operations_list", "name"),
+}
+
+# Обратная зависимость операция -> изделия (modules/dependencies.py)
+_INDEXES_V11 = {
+    "idx_operations_operation_name": ("operations", "operation_name"),
+}
+
+# Ключи сортировки окна каталога с ID изделия (keyset-пагинация, modules/catalog_window.py);
+# выражения совпадают с catalog_window.SORT_KEYS
+_INDEXES_V14 = {
+    "idx_products_sort_article": ("products", "COALESCE(article, ''), id"),
+    "idx_products_sort_name": ("products", "name, id"),
+    "idx_products_sort_created": ("products", "COALESCE(created_date, ''), id"),
+    "idx_products_sort_approved": ("products", "COALESCE(approved_price, 0), id"),
+    "idx_cost_summary_sort_price": ("product_cost_summary", "calculated_price, product_id"),
+    "idx_cost_summary_sort_prime": ("product_cost_summary", "prime_cost, product_id"),
+}
+
+_INDEX_SETS = (_INDEXES_V6, _INDEXES_V7, _INDEXES_V8, _INDEXES_V9, _INDEXES_V10, _INDEXES_V11, _INDEXES_V14)
+_DROPPED_INDEXES = _DROPPED_INDEXES_V7
+
+# Вторичные индексы актуальной схемы (после всех миграций)
+INDEXES = {
+    name: definition for indexes in _INDEX_SETS for name, definition in indexes.items()
+    if name not in _DROPPED_INDEXES
+}
+
+
+def _create_indexes(conn, indexes, dropped=()):
+    """Создание индексов набора миграции и удаление замененных ею индексов прежних наборов"""
+    for name in dropped:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+        logger.info(f"[МИГРАЦИИ] Удален устаревший индекс {name}")
+    for name, (table, columns) in indexes.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        logger.info(f"[МИГРАЦИИ] Создан индекс {name} ON {table} ({columns})")
+
+
+def ensure_indexes(conn):
+    """
+    Приведение БД актуальной схемы к набору INDEXES (например, после удаления индексов
+    в замерах): создание недостающих, удаление замененных миграциями. Другие индексы не трогаются
+    """
+    _create_indexes(conn, INDEXES, _DROPPED_INDEXES)
+
+
+# -----------------------
+# DDL миграций (зафиксирован на версии миграции)
+# -----------------------
+# Миграция всегда создает ту схему, что была на момент ее выпуска, поэтому старая БД
+# проходит те же шаги, что прошли рабочие БД. Изменение таблиц и триггеров — новая
+# миграция, которая удаляет и пересоздает их, а не правка констант ниже.
+
+def _create_triggers(conn, triggers):
+    """Создание триггеров {имя: тело} (существующие с тем же именем пересоздаются)"""
+    for name, body in triggers.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {body}")
+
+
+# --- Версия 8: сводка стоимости изделий (product_cost_summary) ---
+
+_SUMMARY_TABLE_V8 = """
+    CREATE TABLE IF NOT EXISTS product_cost_summary (
+        product_id INTEGER PRIMARY KEY,
+        materials_cost REAL NOT NULL DEFAULT 0,
+        operations_cost REAL NOT NULL DEFAULT 0,
+        labor_cost REAL NOT NULL DEFAULT 0,
+        total_weight REAL NOT NULL DEFAULT 0,
+        paint_area REAL NOT NULL DEFAULT 0,
+        prime_cost REAL NOT NULL DEFAULT 0,
+        calculated_price REAL NOT NULL DEFAULT 0,
+        FOREIGN KEY (product_id) REFERENCES products (id)
+    )
+"""
+
+# Стоимость работ по строке операции: утвержденная расценка, если задана, иначе расчетная
+_SUMMARY_LABOR_V8 = ("(CASE WHEN typeof({r}.approved_rate) IN ('real', 'integer') THEN {r}.approved_rate "
+                     "ELSE COALESCE({r}.cost, 0) END)")
+
+# Вес строки материала: длина (м) * вес погонного метра * количество
+_SUMMARY_WEIGHT_V8 = ("(COALESCE({r}.length, 0) / 1000.0 * COALESCE((SELECT weight_per_meter FROM materials "
+                      "WHERE id = {r}.material_id), 0) * COALESCE({r}.quantity, 0))")
+
+# Производные поля (себестоимость и цена) по параметрам изделия
+_SUMMARY_REFRESH_V8 = """
+    UPDATE product_cost_summary SET
+        prime_cost = materials_cost + labor_cost,
+        calculated_price = (materials_cost + labor_cost)
+            * (1 + COALESCE((SELECT overhead_percent FROM products WHERE id = {pid}), 0.55))
+            * (1 + COALESCE((SELECT profit_percent FROM products WHERE id = {pid}), 0.30))
+    WHERE product_id = {pid};
+"""
+
+
+def _summary_material_delta_v8(row, sign):
+    """Изменение сумм материалов на величину строки row (NEW/OLD) со знаком sign"""
+    return f"""
+        UPDATE product_cost_summary SET
+            materials_cost = materials_cost {sign} COALESCE({row}.cost, 0),
+            total_weight = total_weight {sign} {_SUMMARY_WEIGHT_V8.format(r=row)}
+        WHERE product_id = {row}.product_id;
+    """ + _SUMMARY_REFRESH_V8.format(pid=f"{row}.product_id")
+
+
+def _summary_operation_delta_v8(row, sign):
+    """Изменение сумм операций на величину строки row (NEW/OLD) со знаком sign"""
+    return f"""
+        UPDATE product_cost_summary SET
+            operations_cost = operations_cost {sign} COALESCE({row}.cost, 0),
+            labor_cost = labor_cost {sign} {_SUMMARY_LABOR_V8.format(r=row)}
+        WHERE product_id = {row}.product_id;
+    """ + _SUMMARY_REFRESH_V8.format(pid=f"{row}.product_id")
+
+
+# Пересчет веса изделий, использующих материал (при изменении или удалении материала)
+_SUMMARY_MATERIAL_WEIGHT_V8 = """
+    UPDATE product_cost_summary SET total_weight = (
+        SELECT COALESCE(SUM(COALESCE(pm.length, 0) / 1000.0 * COALESCE(m.weight_per_meter, 0)
+                            * COALESCE(pm.quantity, 0)), 0)
+        FROM product_materials pm
+        LEFT JOIN materials m ON m.id = pm.material_id
+        WHERE pm.product_id = product_cost_summary.product_id
+    )
+    WHERE product_id IN (SELECT product_id FROM product_materials WHERE material_id = {mid});
+"""
+
+_SUMMARY_TRIGGERS_V8 = {
+    "trg_summary_product_insert": """
+        AFTER INSERT ON products BEGIN
+            INSERT OR IGNORE INTO product_cost_summary (product_id, paint_area)
+            VALUES (NEW.id, COALESCE(NEW.total_paint_area, 0));
+        END
+    """,
+    "trg_summary_product_update": f"""
+        AFTER UPDATE OF overhead_percent, profit_percent, total_paint_area ON products BEGIN
+            UPDATE product_cost_summary SET paint_area = COALESCE(NEW.total_paint_area, 0)
+            WHERE product_id = NEW.id;
+            {_SUMMARY_REFRESH_V8.format(pid="NEW.id")}
+        END
+    """,
+    "trg_summary_product_delete": """
+        AFTER DELETE ON products BEGIN
+            DELETE FROM product_cost_summary WHERE product_id = OLD.id;
+        END
+    """,
+    "trg_summary_material_line_insert": f"""
+        AFTER INSERT ON product_materials BEGIN
+            {_summary_material_delta_v8("NEW", "+")}
+        END
+    """,
+    "trg_summary_material_line_update": f"""
+        AFTER UPDATE ON product_materials BEGIN
+            {_summary_material_delta_v8("OLD", "-")}
+            {_summary_material_delta_v8("NEW", "+")}
+        END
+    """,
+    "trg_summary_material_line_delete": f"""
+        AFTER DELETE ON product_materials BEGIN
+            {_summary_material_delta_v8("OLD", "-")}
+        END
+    """,
+    "trg_summary_operation_insert": f"""
+        AFTER INSERT ON operations BEGIN
+            {_summary_operation_delta_v8("NEW", "+")}
+        END
+    """,
+    "trg_summary_operation_update": f"""
+        AFTER UPDATE ON operations BEGIN
+            {_summary_operation_delta_v8("OLD", "-")}
+            {_summary_operation_delta_v8("NEW", "+")}
+        END
+    """,
+    "trg_summary_operation_delete": f"""
+        AFTER DELETE ON operations BEGIN
+            {_summary_operation_delta_v8("OLD", "-")}
+        END
+    """,
+    "trg_summary_material_weight_update": f"""
+        AFTER UPDATE OF weight_per_meter ON materials BEGIN
+            {_SUMMARY_MATERIAL_WEIGHT_V8.format(mid="NEW.id")}
+        END
+    """,
+    "trg_summary_material_delete": f"""
+        AFTER DELETE ON materials BEGIN
+            {_SUMMARY_MATERIAL_WEIGHT_V8.format(mid="OLD.id")}
+        END
+    """,
+}
+
+# Заполнение сводки по исходным таблицам (сгруппированные агрегаты)
+_SUMMARY_FILL_V8 = f"""
+    INSERT INTO product_cost_summary (product_id, materials_cost, operations_cost, labor_cost,
+                                      total_weight, paint_area, prime_cost, calculated_price)
+    WITH mat AS (
+        SELECT pm.product_id,
+               SUM(COALESCE(pm.cost, 0)) AS materials_cost,
+               SUM(COALESCE(pm.length, 0) / 1000.0 * COALESCE(m.weight_per_meter, 0)
+                   * COALESCE(pm.quantity, 0)) AS total_weight
+        FROM product_materials pm
+        LEFT JOIN materials m ON m.id = pm.material_id
+        GROUP BY pm.product_id
+    ),
+    ops AS (
+        SELECT o.product_id,
+               SUM(COALESCE(o.cost, 0)) AS operations_cost,
+               SUM({_SUMMARY_LABOR_V8.format(r="o")}) AS labor_cost
+        FROM operations o
+        GROUP BY o.product_id
+    ),
+    base AS (
+        SELECT p.id AS product_id,
+               COALESCE(m.materials_cost, 0) AS materials_cost,
+               COALESCE(o.operations_cost, 0) AS operations_cost,
+               COALESCE(o.labor_cost, 0) AS labor_cost,
+               COALESCE(m.total_weight, 0) AS total_weight,
+               COALESCE(p.total_paint_area, 0) AS paint_area,
+               COALESCE(p.overhead_percent, 0.55) AS overhead_percent,
+               COALESCE(p.profit_percent, 0.30) AS profit_percent
+        FROM products p
+        LEFT JOIN mat m ON m.product_id = p.id
+        LEFT JOIN ops o ON o.product_id = p.id
+    )
+    SELECT product_id, materials_cost, operations_cost, labor_cost, total_weight, paint_area,
+           materials_cost + labor_cost,
+           (materials_cost + labor_cost) * (1 + overhead_percent) * (1 + profit_percent)
+    FROM base
+"""
+
+# --- Версия 10: однодельтовые триггеры сводки (пакетный пересчет цен) ---
+
+
+def _summary_material_update_v10():
+    """
+    Изменение строки материала в пределах изделия одним UPDATE сводки;
+    вес пересчитывается, только если изменились материал, длина или количество
+    """
+    return f"""
+        UPDATE product_cost_summary SET
+            materials_cost = materials_cost - COALESCE(OLD.cost, 0) + COALESCE(NEW.cost, 0),
+            total_weight = total_weight + (CASE
+                WHEN OLD.material_id IS NEW.material_id AND OLD.length IS NEW.length
+                     AND OLD.quantity IS NEW.quantity THEN 0
+                ELSE {_SUMMARY_WEIGHT_V8.format(r="NEW")} - {_SUMMARY_WEIGHT_V8.format(r="OLD")} END)
+        WHERE product_id = NEW.product_id;
+    """ + _SUMMARY_REFRESH_V8.format(pid="NEW.product_id")
+
+
+def _summary_operation_update_v10():
+    """Изменение операции в пределах изделия одним UPDATE сводки"""
+    return f"""
+        UPDATE product_cost_summary SET
+            operations_cost = operations_cost - COALESCE(OLD.cost, 0) + COALESCE(NEW.cost, 0),
+            labor_cost = labor_cost - {_SUMMARY_LABOR_V8.format(r="OLD")} + {_SUMMARY_LABOR_V8.format(r="NEW")}
+        WHERE product_id = NEW.product_id;
+    """ + _SUMMARY_REFRESH_V8.format(pid="NEW.product_id")
+
+
+# Триггеры обновления строк, замененные версией 10 (прочие триггеры сводки — версии 8)
+_SUMMARY_TRIGGERS_V10 = {
+    # Обновление строки в пределах изделия (в т.ч. пакетный пересчет цен) — одна дельта
+    "trg_summary_material_line_update": f"""
+        AFTER UPDATE ON product_materials WHEN OLD.product_id IS NEW.product_id BEGIN
+            {_summary_material_update_v10()}
+        END
+    """,
+    "trg_summary_material_line_move": f"""
+        AFTER UPDATE ON product_materials WHEN OLD.product_id IS NOT NEW.product_id BEGIN
+            {_summary_material_delta_v8("OLD", "-")}
+            {_summary_material_delta_v8("NEW", "+")}
+        END
+    """,
+    "trg_summary_operation_update": f"""
+        AFTER UPDATE ON operations WHEN OLD.product_id IS NEW.product_id BEGIN
+            {_summary_operation_update_v10()}
+        END
+    """,
+    "trg_summary_operation_move": f"""
+        AFTER UPDATE ON operations WHEN OLD.product_id IS NOT NEW.product_id BEGIN
+            {_summary_operation_delta_v8("OLD", "-")}
+            {_summary_operation_delta_v8("NEW", "+")}
+        END
+    """,
+}
+
+# --- Версия 12: ревизия изделия (кэш расчета цены, modules/pricing_cache.py) ---
+
+_REVISION_BUMP_V12 = "UPDATE products SET revision = revision + 1 WHERE id {condition};"
+
+_REVISION_TRIGGERS_V12 = {
+    "trg_revision_material_line_insert": f"""
+        AFTER INSERT ON product_materials BEGIN
+            {_REVISION_BUMP_V12.format(condition="= NEW.product_id")}
+        END""",
+    # Пересчет стоимости меняет миллионы строк: в обычном случае (строка осталась у изделия) —
+    # поиск изделия по rowid, без списка IN
+    "trg_revision_material_line_update": f"""
+        AFTER UPDATE OF material_id, length, width, thickness, quantity, cost ON product_materials
+        WHEN OLD.product_id IS NEW.product_id BEGIN
+            {_REVISION_BUMP_V12.format(condition="= NEW.product_id")}
+        END""",
+    "trg_revision_material_line_move": f"""
+        AFTER UPDATE OF product_id ON product_materials WHEN OLD.product_id IS NOT NEW.product_id BEGIN
+            {_REVISION_BUMP_V12.format(condition="IN (OLD.product_id, NEW.product_id)")}
+        END""",
+    "trg_revision_material_line_delete": f"""
+        AFTER DELETE ON product_materials BEGIN
+            {_REVISION_BUMP_V12.format(condition="= OLD.product_id")}
+        END""",
+    "trg_revision_operation_insert": f"""
+        AFTER INSERT ON operations BEGIN
+            {_REVISION_BUMP_V12.format(condition="= NEW.product_id")}
+        END""",
+    # Сотрудник и замеры времени в цену не входят — только стоимость и утвержденная расценка
+    "trg_revision_operation_update": f"""
+        AFTER UPDATE OF cost, approved_rate ON operations WHEN OLD.product_id IS NEW.product_id BEGIN
+            {_REVISION_BUMP_V12.format(condition="= NEW.product_id")}
+        END""",
+    "trg_revision_operation_move": f"""
+        AFTER UPDATE OF product_id ON operations WHEN OLD.product_id IS NOT NEW.product_id BEGIN
+            {_REVISION_BUMP_V12.format(condition="IN (OLD.product_id, NEW.product_id)")}
+        END""",
+    "trg_revision_operation_delete": f"""
+        AFTER DELETE ON operations BEGIN
+            {_REVISION_BUMP_V12.format(condition="= OLD.product_id")}
+        END""",
+    "trg_revision_product_update": f"""
+        AFTER UPDATE OF product_id, article, name, overhead_percent, profit_percent, approved_price
+        ON products BEGIN
+            {_REVISION_BUMP_V12.format(condition="= NEW.id")}
+        END""",
+    # Изделия, использующие материал, — по индексу product_materials(material_id)
+    "trg_revision_material_update": f"""
+        AFTER UPDATE OF category, name, weight_per_meter, diameter, section_length, section_width,
+            our_price_per_kg, final_price_kg ON materials BEGIN
+            {_REVISION_BUMP_V12.format(
+                condition="IN (SELECT product_id FROM product_materials WHERE material_id = NEW.id)")}
+        END""",
+    "trg_revision_material_delete": f"""
+        AFTER DELETE ON materials BEGIN
+            {_REVISION_BUMP_V12.format(
+                condition="IN (SELECT product_id FROM product_materials WHERE material_id = OLD.id)")}
+        END""",
+}
+
+# --- Версия 13: полнотекстовый поиск по каталогу (products_fts, modules/catalog_search.py) ---
+
+_FTS_TABLE_V13 = """
+    CREATE VIRTUAL TABLE products_fts USING fts5(
+        article, name, product_code, materials, operations,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+    )
+"""
+
+# Вес столбцов в bm25: артикул, название, код изделия, материалы, операции
+_FTS_RANK_V13 = "bm25(10.0, 5.0, 5.0, 1.0, 1.0)"
+
+# Названия материалов и операций изделия — через пробел, без повторов
+_FTS_MATERIALS_V13 = """(SELECT group_concat(name, ' ') FROM (
+            SELECT DISTINCT m.name FROM product_materials pm JOIN materials m ON m.id = pm.material_id
+            WHERE pm.product_id = {product_id}))"""
+_FTS_OPERATIONS_V13 = """(SELECT group_concat(operation_name, ' ') FROM (
+            SELECT DISTINCT operation_name FROM operations WHERE product_id = {product_id}))"""
+
+_FTS_FILL_V13 = f"""
+    INSERT INTO products_fts (rowid, article, name, product_code, materials, operations)
+    SELECT p.id, p.article, p.name, p.product_id,
+           COALESCE({_FTS_MATERIALS_V13.format(product_id="p.id")}, ''),
+           COALESCE({_FTS_OPERATIONS_V13.format(product_id="p.id")}, '')
+    FROM products p
+"""
+
+
+def _fts_set_materials_v13(product_id):
+    return (f"UPDATE products_fts SET materials = {_FTS_MATERIALS_V13.format(product_id=product_id)} "
+            f"WHERE rowid = {product_id};")
+
+
+def _fts_set_operations_v13(product_id):
+    return (f"UPDATE products_fts SET operations = {_FTS_OPERATIONS_V13.format(product_id=product_id)} "
+            f"WHERE rowid = {product_id};")
+
+
+def _fts_set_materials_of_material_v13(material_id):
+    return (f"UPDATE products_fts SET materials = {_FTS_MATERIALS_V13.format(product_id='products_fts.rowid')} "
+            f"WHERE rowid IN (SELECT product_id FROM product_materials WHERE material_id = {material_id});")
+
+
+_FTS_TRIGGERS_V13 = {
+    "trg_fts_product_insert": """
+        AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, article, name, product_code, materials, operations)
+            VALUES (NEW.id, NEW.article, NEW.name, NEW.product_id, '', '');
+        END""",
+    "trg_fts_product_update": """
+        AFTER UPDATE OF article, name, product_id ON products BEGIN
+            UPDATE products_fts SET article = NEW.article, name = NEW.name, product_code = NEW.product_id
+            WHERE rowid = NEW.id;
+        END""",
+    "trg_fts_product_delete": """
+        AFTER DELETE ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = OLD.id;
+        END""",
+    "trg_fts_material_line_insert": f"""
+        AFTER INSERT ON product_materials BEGIN
+            {_fts_set_materials_v13("NEW.product_id")}
+        END""",
+    "trg_fts_material_line_update": f"""
+        AFTER UPDATE OF material_id, product_id ON product_materials BEGIN
+            {_fts_set_materials_v13("OLD.product_id")}
+            {_fts_set_materials_v13("NEW.product_id")}
+        END""",
+    "trg_fts_material_line_delete": f"""
+        AFTER DELETE ON product_materials BEGIN
+            {_fts_set_materials_v13("OLD.product_id")}
+        END""",
+    "trg_fts_operation_insert": f"""
+        AFTER INSERT ON operations BEGIN
+            {_fts_set_operations_v13("NEW.product_id")}
+        END""",
+    "trg_fts_operation_update": f"""
+        AFTER UPDATE OF operation_name, product_id ON operations BEGIN
+            {_fts_set_operations_v13("OLD.product_id")}
+            {_fts_set_operations_v13("NEW.product_id")}
+        END""",
+    "trg_fts_operation_delete": f"""
+        AFTER DELETE ON operations BEGIN
+            {_fts_set_operations_v13("OLD.product_id")}
+        END""",
+    "trg_fts_material_rename": f"""
+        AFTER UPDATE OF name ON materials BEGIN
+            {_fts_set_materials_of_material_v13("NEW.id")}
+        END""",
+    "trg_fts_material_delete": f"""
+        AFTER DELETE ON materials BEGIN
+            {_fts_set_materials_of_material_v13("OLD.id")}
+        END""",
+}
+
+
+def _fts5_supported(conn):
+    """Собран ли SQLite с FTS5"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _migration_006_indexes(conn):
+    """Вторичные индексы по внешним ключам и полям фильтрации"""
+    _create_indexes(conn, _INDEXES_V6)
+
+
+def _migration_007_covering_indexes(conn):
+    """Покрывающие индексы для сводки каталога (заменяют индексы по product_id)"""
+    _create_indexes(conn, _INDEXES_V7, _DROPPED_INDEXES_V7)
+
+
+def _migration_008_cost_summary(conn):
+    """Сводка стоимости изделий, поддерживаемая триггерами"""
+    conn.execute(_SUMMARY_TABLE_V8)
+    _create_triggers(conn, _SUMMARY_TRIGGERS_V8)
+    conn.execute("DELETE FROM product_cost_summary")
+    conn.execute(_SUMMARY_FILL_V8)
+    _create_indexes(conn, _INDEXES_V8)
+
+
+def _migration_009_material_soft_retire(conn):
+    """Признак активности материала (снятые с прайса не удаляются) и ключ сверки импорта"""
+    _add_column(conn, "materials", "is_active", "INTEGER NOT NULL DEFAULT 1")
+    _create_indexes(conn, _INDEXES_V9)
+
+
+def _migration_010_bulk_repricing(conn):
+    """Пакетный пересчет цен: индекс справочника операций по названию, однодельтовые триггеры сводки"""
+    _create_triggers(conn, _SUMMARY_TRIGGERS_V10)
+    _create_indexes(conn, _INDEXES_V10)
+
+
+def _migration_011_dependency_indexes(conn):
+    """Индекс операций по названию: изделия, затронутые изменением ставки"""
+    _create_indexes(conn, _INDEXES_V11)
+
+
+def _migration_012_product_revision(conn):
+    """Ревизия изделия (кэш расчета цены) и триггеры, увеличивающие ее при изменениях"""
+    _add_column(conn, "products", "revision", "INTEGER NOT NULL DEFAULT 0")
+    _create_triggers(conn, _REVISION_TRIGGERS_V12)
+
+
+def _migration_013_catalog_search(conn):
+    """Полнотекстовый поиск по каталогу (FTS5) и триггеры его обновления; без FTS5 — пропускается"""
+    if not _fts5_supported(conn):
+        logger.warning("[МИГРАЦИИ] SQLite без FTS5: поиск по каталогу будет искать подстроку")
+        return
+    for name in _FTS_TRIGGERS_V13:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("DROP TABLE IF EXISTS products_fts")
+    conn.execute(_FTS_TABLE_V13)
+    conn.execute("INSERT INTO products_fts (products_fts, rank) VALUES ('rank', ?)", (_FTS_RANK_V13,))
+    conn.execute(_FTS_FILL_V13)
+    _create_triggers(conn, _FTS_TRIGGERS_V13)
+
+
+def _migration_014_catalog_sort_indexes(conn):
+    """Индексы ключей сортировки каталога (сортировка и постраничное чтение в SQL)"""
+    _create_indexes(conn, _INDEXES_V14)
+
+
+# Упорядоченный список миграций: (версия, описание, функция)
+MIGRATIONS = [
+    (1, "Базовая схема", _migration_001_base_schema),
+    (2, "Данные сотрудников", _migration_002_employee_details),
+    (3, "Параметры цены изделия", _migration_003_product_pricing),
+    (4, "Размеры материалов изделия", _migration_004_product_material_dimensions),
+    (5, "Исправление типов параметров цены", _migration_005_fix_pricing_types),
+    (6, "Вторичные индексы", _migration_006_indexes),
+    (7, "Покрывающие индексы сводки каталога", _migration_007_covering_indexes),
+    (8, "Сводка стоимости изделий", _migration_008_cost_summary),
+    (9, "Активность материалов", _migration_009_material_soft_retire),
+    (10, "Пакетный пересчет цен", _migration_010_bulk_repricing),
+    (11, "Индексы обратных зависимостей", _migration_011_dependency_indexes),
+    (12, "Ревизия изделия для кэша расчета цены", _migration_012_product_revision),
+    (13, "Полнотекстовый поиск по каталогу", _migration_013_catalog_search),
+    (14, "Индексы сортировки каталога", _migration_014_catalog_sort_indexes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Текущая версия схемы БД (PRAGMA user_version)"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn):
+    """
+    Применяет недостающие миграции по порядку, каждую в своей транзакции.
+    Возвращает список примененных версий (пустой, если схема актуальна).
+    """
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        logger.debug(f"[МИГРАЦИИ] Схема БД актуальна (версия {SCHEMA_VERSION})")
+        return []
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Повторная проверка под блокировкой: миграцию мог применить другой процесс
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            logger.info(f"[МИГРАЦИИ] Применение миграции {version}: {description}")
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            applied.append(version)
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"[МИГРАЦИИ] Ошибка миграции {version} ({description}): {e}", exc_info=True)
+            raise
+
+    logger.info(f"[МИГРАЦИИ] Схема БД обновлена до версии {SCHEMA_VERSION}, применено миграций: {len(applied)}")
+    return applied
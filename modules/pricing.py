@@ -1,13 +1,92 @@
 # modules/pricing.py
 import logging
 import math
-from collections import defaultdict
-from typing import Dict, Any, List, Optional
+from collections import defaultdict, namedtuple
+from typing import Callable, Dict, Any, Iterable, List, Optional
 
+from modules import pricing_cache, pricing_kernel
 from modules.database import DatabaseManager
+from modules.queries import (
+    PRODUCT_BY_ID, PRODUCT_MATERIALS_FOR_PRICING, PRODUCT_OPERATIONS, PRODUCT_REVISION,
+    PRODUCTS_BY_IDS, PRODUCTS_MATERIALS_FOR_PRICING, PRODUCTS_OPERATIONS, expand_in
+)
 
 logger = logging.getLogger(__name__)
 
+# -----------------------
+# Пакетный пересчет стоимости строк изделий по текущим справочникам
+# -----------------------
+STEEL_DENSITY = 7850  # плотность стали в кг/м3 (как в MainInterface.add_material)
+DEFAULT_RATE_PER_MINUTE = 2.0  # ставка по умолчанию, если в справочнике 0 (как в add_operation)
+REPRICE_CHUNK_SIZE = 500  # изделий на один шаг пересчета (и отчет о прогрессе)
+COST_TOLERANCE = 1e-6  # строки с неизменившейся стоимостью не перезаписываются
+PRICING_CHUNK_SIZE = 500  # изделий на группу пакетного расчета цены (calculate_pricing_many)
+
+# Стоимость строки материала по типу (категории) материала — формулы MainInterface.add_material:
+# лист — по объему и плотности, метизы — цена за штуку, остальное — длина * вес 1 м
+MATERIAL_COST_EXPR = f"""(
+    SELECT CASE m.category
+        WHEN 'Лист' THEN COALESCE(product_materials.length, 0) * COALESCE(product_materials.width, 0)
+            * COALESCE(product_materials.thickness, 0) * COALESCE(product_materials.quantity, 0)
+            * {STEEL_DENSITY} * COALESCE(m.our_price_per_kg, 0)
+        WHEN 'Метизы' THEN COALESCE(m.our_price_per_kg, 0) * COALESCE(product_materials.quantity, 0)
+        ELSE COALESCE(product_materials.length, 0) * COALESCE(m.weight_per_meter, 0)
+            * COALESCE(product_materials.quantity, 0) * COALESCE(m.our_price_per_kg, 0)
+    END
+    FROM materials m WHERE m.id = product_materials.material_id
+)"""
+
+# Текущая ставка операции из справочника (первая по ID при повторах названия)
+OPERATION_RATE_EXPR = f"""COALESCE(NULLIF((
+    SELECT ol.rate_per_minute FROM operations_list ol
+    WHERE ol.name = operations.operation_name ORDER BY ol.id LIMIT 1
+), 0), {DEFAULT_RATE_PER_MINUTE})"""
+
+# Операция с утвержденной расценкой сохраняет стоимость (расценка — абсолютная сумма).
+# Расценку из таблицы операций сохраняют строкой как введена ("12,5" остается TEXT),
+# поэтому проверяется непустое значение, а не числовой тип
+OPERATION_COST_EXPR = f"""(CASE WHEN NULLIF(TRIM(approved_rate), '') IS NOT NULL THEN cost
+    ELSE COALESCE(time_per_unit, 0) * {OPERATION_RATE_EXPR} END)"""
+
+REPRICE_MATERIALS_SQL = f"""
+    UPDATE product_materials SET cost = {MATERIAL_COST_EXPR}
+    WHERE product_id IN ({{placeholders}})
+      AND material_id IN (SELECT id FROM materials)
+      AND (cost IS NULL OR ABS(cost - {MATERIAL_COST_EXPR}) > {COST_TOLERANCE})
+"""
+
+# Строки без изменений пропускаются; операции, которых нет в справочнике, не трогаются
+REPRICE_OPERATIONS_SQL = f"""
+    UPDATE operations SET rate_per_minute = {OPERATION_RATE_EXPR}, cost = {OPERATION_COST_EXPR}
+    WHERE product_id IN ({{placeholders}})
+      AND operation_name IN (SELECT name FROM operations_list)
+      AND (rate_per_minute IS NULL OR ABS(rate_per_minute - {OPERATION_RATE_EXPR}) > {COST_TOLERANCE}
+           OR cost IS NULL OR ABS(cost - {OPERATION_COST_EXPR}) > {COST_TOLERANCE})
+"""
+
+# Расчетная цена изделий по сводке стоимости, уже обновленной триггерами пересчета строк
+# (округление — как в cost_indicators); неизменившиеся цены не перезаписываются
+REPRICE_PRODUCTS_SQL = f"""
+    UPDATE products SET calculated_price = (
+        SELECT ROUND(s.calculated_price, 2) FROM product_cost_summary s WHERE s.product_id = products.id
+    )
+    WHERE id IN ({{placeholders}})
+      AND id IN (SELECT product_id FROM product_cost_summary)
+      AND (calculated_price IS NULL OR ABS(calculated_price - (
+          SELECT ROUND(s.calculated_price, 2) FROM product_cost_summary s WHERE s.product_id = products.id
+      )) > {COST_TOLERANCE})
+"""
+
+# Производные поля расчета цены в products (PricingManager.persist_derived_fields)
+PERSIST_DERIVED_FIELDS_SQL = f"""
+    UPDATE products SET total_paint_area = ?
+    WHERE id = ? AND (total_paint_area IS NULL OR ABS(total_paint_area - ?) > {COST_TOLERANCE})
+"""
+
+# Итог пакетного пересчета: изделий обработано, строк материалов и операций изменено,
+# расчетных цен изделий изменено
+RepriceReport = namedtuple("RepriceReport", "products material_lines operation_lines prices")
+
 
 class PricingManager:
     """
@@ -29,145 +108,43 @@ class PricingManager:
         """
         Основной метод. Возвращает структуру pricing_data или None при ошибке.
         Включает вычисление площади покраски и стоимости краски (если в составе есть материал 'краска'/'лак').
+        Только чтение: производные поля изделия сохраняет persist_derived_fields.
+        Результат кэшируется до изменения ревизии изделия (modules/pricing_cache.py).
         """
         logger.info(f"[ЦЕНА_БД] === НАЧАЛО РАСЧЕТА ЦЕНЫ ИЗД. ID {product_id} ===")
         try:
-            pricing_data: Dict[str, Any] = {}
+            # 0) Ревизия читается до данных: расчет не может оказаться новее своей ревизии
+            revision_row = self.db_manager.fetch_one(PRODUCT_REVISION, (product_id,))
+            if not revision_row:
+                logger.error(f"[ЦЕНА_БД] Изделие ID {product_id} не найдено")
+                return None
+            cache = pricing_cache.cache_for(self.db_manager)
+            cache_key = (product_id, paint_consumption_kg_per_m2_per_layer, layers, loss_coeff, use_loss_coeff)
+            pricing_data = cache.get(cache_key, revision_row.revision)
+            if pricing_data is not None:
+                logger.info(f"[ЦЕНА_БД] Расчет цены изд. ID {product_id} взят из кэша (ревизия {revision_row.revision})")
+                return pricing_data
 
             # 1) Получить product_info
-            product_row = self.db_manager.fetch_one("SELECT * FROM products WHERE id = ?", (product_id,))
+            product_row = self.db_manager.fetch_one(PRODUCT_BY_ID, (product_id,))
             if not product_row:
                 logger.error(f"[ЦЕНА_БД] Изделие ID {product_id} не найдено")
                 return None
 
-            # product_row - кортеж, порядок полей зависит от DDL; доступ через индексы оставляем как раньше
-            # Безопасно читаем предполагаемые поля (порядок в вашем проекте соответствует предыдущей версии)
-            product_id_field = product_row[1] if len(product_row) > 1 else None
-            article = product_row[2] if len(product_row) > 2 else ""
-            name = product_row[3] if len(product_row) > 3 else ""
-
-            # считываем сохраненные коэффициенты — если отсутствуют, используем дефолты
-            def _safe_float_from_row(row, idx, default):
-                try:
-                    return float(row[idx]) if len(row) > idx and row[idx] is not None else default
-                except Exception:
-                    return default
-
-            overhead_percent_saved = _safe_float_from_row(product_row, 4, 0.55)
-            profit_percent_saved = _safe_float_from_row(product_row, 5, 0.30)
-            approved_price_saved = _safe_float_from_row(product_row, 6, 0.0)
-
-            pricing_data['product_info'] = {
-                'product_id': product_id_field,
-                'article': article,
-                'name': name,
-                'total_weight_kg': 0.0,
-                'total_paint_area_m2': 0.0
-            }
-
-            # 2) Материалы изделия — получаем нужные поля
-            # Здесь выбираем те поля, которые в вашем проекте используются: category, pm.length, pm.width, pm.thickness, pm.quantity, pm.cost, m.name, m.weight_per_meter, pm.material_id
-            materials_rows = self.db_manager.fetch_all("""
-                SELECT 
-                    COALESCE(m.category, '') as category,
-                    COALESCE(pm.length, 0.0) as length_mm,
-                    COALESCE(pm.width, 0.0) as width_mm,
-                    COALESCE(pm.thickness, 0.0) as thickness_mm,
-                    COALESCE(pm.quantity, 0) as quantity,
-                    COALESCE(pm.cost, 0.0) as cost,
-                    COALESCE(m.name, '') as material_name,
-                    COALESCE(m.weight_per_meter, 0.0) as weight_per_meter,
-                    pm.material_id as material_id,
-                    COALESCE(m.diameter, 0.0) as diameter_mm,
-                    COALESCE(m.section_length, 0.0) as section_length_mm,
-                    COALESCE(m.section_width, 0.0) as section_width_mm,
-                    COALESCE(m.our_price_per_kg, m.final_price_kg, 0.0) as price_per_kg
-                FROM product_materials pm
-                JOIN materials m ON pm.material_id = m.id
-                WHERE pm.product_id = ?
-                ORDER BY m.category, m.name
-            """, (product_id,))
-
-            # Преобразуем строки в упорядоченный список словарей для дальнейших расчетов
-            product_materials: List[Dict[str, Any]] = []
-            for row in materials_rows or []:
-                # row соответствует полям в SELECT выше
-                (category, length_mm, width_mm, thickness_mm, quantity, cost, material_name,
-                 weight_per_meter, material_id, diameter_mm, section_length_mm, section_width_mm,
-                 price_per_kg) = row
-                product_materials.append({
-                    'category': category,
-                    'length_mm': float(length_mm),
-                    'width_mm': float(width_mm),
-                    'thickness_mm': float(thickness_mm),
-                    'quantity': int(quantity),
-                    'cost': float(cost),
-                    'name': material_name,
-                    'weight_per_meter': float(weight_per_meter),
-                    'material_id': material_id,
-                    'diameter_mm': float(diameter_mm),
-                    'section_length_mm': float(section_length_mm),
-                    'section_width_mm': float(section_width_mm),
-                    'price_per_kg': float(price_per_kg)
-                })
-
-            # 2.1 Суммируем материалы по категориям и считаем вес/стоимость (и предварительную площадь покраски)
-            materials_summary = self._summarize_materials_from_list(product_materials)
-            pricing_data['materials_summary'] = materials_summary
-
-            # Заполняем total_weight и preliminary paint area (сейчас в м^2)
-            total_weight = sum(cat['total_weight'] for cat in materials_summary.values())
-            preliminary_paint_area = sum(cat['total_paint_area'] for cat in materials_summary.values())
-            pricing_data['product_info']['total_weight_kg'] = round(total_weight, 3)
-            pricing_data['product_info']['total_paint_area_m2'] = round(preliminary_paint_area, 3)
+            # 2) Материалы изделия с параметрами справочника — столбцами (pricing_kernel.BomArrays)
+            materials_rows = self.db_manager.fetch_all(PRODUCT_MATERIALS_FOR_PRICING, (product_id,))
+            bom = pricing_kernel.bom_from_rows(materials_rows)
 
             # 3) Операции (работы)
-            ops_rows = self.db_manager.fetch_all("""
-                SELECT 
-                    COALESCE(o.operation_name, ''),
-                    COALESCE(o.quantity_measured, 0),
-                    COALESCE(o.time_measured, 0.0),
-                    COALESCE(o.time_per_unit, 0.0),
-                    COALESCE(o.rate_per_minute, 0.0),
-                    COALESCE(o.cost, 0.0),
-                    COALESCE(e.name, ''),
-                    COALESCE(o.approved_rate, '')
-                FROM operations o
-                LEFT JOIN employees e ON o.employee_id = e.id
-                WHERE o.product_id = ?
-                ORDER BY o.id
-            """, (product_id,))
-
-            labor_cost = self._calculate_labor_cost_from_db(ops_rows)
-            pricing_data['labor_cost'] = labor_cost
-
-            # 4) Стоимостные показатели (пока без учета краски)
-            cost_indicators = self._calculate_cost_indicators(
-                labor_cost,
-                materials_summary,
-                overhead_percent_saved,
-                profit_percent_saved,
-                approved_price_saved
-            )
-            pricing_data['cost_indicators'] = cost_indicators
-
-            # 5) Площадь покраски + стоимость краски (если есть материал 'краска'/'лак'):
-            pricing_data['product_materials'] = product_materials  # для функции apply_paint_costs_to_pricing
-            pricing_data = self.apply_paint_costs_to_pricing(
-                pricing_data,
-                paint_consumption_kg_per_m2_per_layer=paint_consumption_kg_per_m2_per_layer,
-                layers=layers,
-                loss_coeff=loss_coeff,
-                use_loss_coeff=use_loss_coeff
-            )
+            ops_rows = self.db_manager.fetch_all(PRODUCT_OPERATIONS, (product_id,))
 
-            # 6) Попытка записать total_paint_area в products (если колонка есть)
-            try:
-                total_area = pricing_data.get('product_info', {}).get('total_paint_area_m2', 0.0)
-                self.db_manager.execute_query("UPDATE products SET total_paint_area = ? WHERE id = ?", (total_area, product_id))
-            except Exception:
-                # Если такой колонки нет — не критично, логируем
-                logger.debug("[ЦЕНА_БД] Не удалось записать total_paint_area в products (возможно, колонка отсутствует)")
+            pricing_data = self._price_product(
+                product_row, bom, pricing_kernel.profile_paint_area(bom), ops_rows,
+                paint_consumption_kg_per_m2_per_layer, layers, loss_coeff, use_loss_coeff
+            )
+            # Незафиксированные изменения могут откатиться, и номер ревизии достанется другим данным
+            if not self.db_manager.connection.in_transaction:
+                cache.put(cache_key, revision_row.revision, pricing_data)
 
             logger.info(f"[ЦЕНА_БД] === РАСЧЕТ ЦЕНЫ ИЗД. ID {product_id} ЗАВЕРШЕН УСПЕШНО ===")
             logger.debug(f"[ЦЕНА_БД] Итоговые данные pricing: {pricing_data}")
@@ -177,65 +154,206 @@ class PricingManager:
             logger.error(f"[ЦЕНА_БД] === КРИТИЧЕСКАЯ ОШИБКА ПРИ РАСЧЕТЕ ЦЕНЫ: {e} ===", exc_info=True)
             return None
 
-    # -----------------------
-    # Вспомогательные методы
-    # -----------------------
-    def _summarize_materials_from_list(self, product_materials: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    def calculate_pricing_many(self, product_ids: Iterable[int],
+                               paint_consumption_kg_per_m2_per_layer: float = 0.10,
+                               layers: int = 2,
+                               loss_coeff: float = 1.10,
+                               use_loss_coeff: bool = True) -> Optional[Dict[int, Dict[str, Any]]]:
         """
-        Суммирует материалы по категории и рассчитывает:
-            - total_weight (kg)
-            - total_cost (currency)
-            - total_paint_area (m2) (предварительный; для листов и профилей)
-        Возвращает dict {category: {total_weight, total_cost, total_paint_area}}
+        Расчет цены многих изделий: {id изделия: pricing_data} (как calculate_pricing).
+        Данные читаются тремя запросами с IN на группу из PRICING_CHUNK_SIZE изделий,
+        спецификация группы считается ядром одним набором массивов. Изделий, которых
+        нет в БД или которые не удалось рассчитать, в результате нет.
+        Только чтение (см. persist_derived_fields). Возвращает None при ошибке чтения БД.
         """
-        logger.debug("[ЦЕНА_БД] === СУММИРОВАНИЕ МАТЕРИАЛОВ (Список) ===")
-        summary = defaultdict(lambda: {'total_weight': 0.0, 'total_cost': 0.0, 'total_paint_area': 0.0})
+        product_ids = list(dict.fromkeys(product_ids))
+        logger.info(f"[ЦЕНА_БД] Пакетный расчет цены: {len(product_ids)} изделий")
+        results: Dict[int, Dict[str, Any]] = {}
+        try:
+            for start in range(0, len(product_ids), PRICING_CHUNK_SIZE):
+                chunk = product_ids[start:start + PRICING_CHUNK_SIZE]
+                chunk_results = self._price_chunk(
+                    chunk, paint_consumption_kg_per_m2_per_layer, layers, loss_coeff, use_loss_coeff)
+                results.update((product_id, chunk_results[product_id])
+                               for product_id in chunk if product_id in chunk_results)
+        except Exception as e:
+            logger.error(f"[ЦЕНА_БД] Ошибка пакетного расчета цены: {e}", exc_info=True)
+            return None
+
+        logger.info(f"[ЦЕНА_БД] Пакетный расчет цены завершен: рассчитано {len(results)} из {len(product_ids)}")
+        return results
 
-        for m in product_materials:
+    def persist_derived_fields(self, pricing_by_product: Dict[int, Dict[str, Any]]) -> Optional[int]:
+        """
+        Сохранение производных полей расчета ({id изделия: pricing_data}) в products —
+        площадь покраски (total_paint_area) — одной пакетной записью в транзакции.
+        Неизменившиеся значения не перезаписываются, изделия без расчета (None) пропускаются.
+        Возвращает число обновленных изделий или None при ошибке.
+        """
+        params = []
+        for product_id, pricing_data in pricing_by_product.items():
+            if pricing_data is None:
+                continue
+            total_area = pricing_data.get('product_info', {}).get('total_paint_area_m2', 0.0)
+            params.append((total_area, product_id, total_area))
+        if not params:
+            return 0
+        try:
+            with self.db_manager.transaction():
+                updated = self.db_manager.execute_many(PERSIST_DERIVED_FIELDS_SQL, params)
+        except Exception as e:
+            logger.error(f"[ЦЕНА_БД] Ошибка сохранения производных полей расчета: {e}", exc_info=True)
+            return None
+        logger.debug(f"[ЦЕНА_БД] Производные поля расчета: изделий {len(params)}, обновлено {updated}")
+        return updated
+
+    def _price_chunk(self, product_ids: List[int],
+                     paint_consumption_kg_per_m2_per_layer: float,
+                     layers: int,
+                     loss_coeff: float,
+                     use_loss_coeff: bool) -> Dict[int, Dict[str, Any]]:
+        """Расчет группы изделий: три запроса с IN, спецификация группы — одним BOM"""
+        count = len(product_ids)
+        product_rows = self.db_manager.fetch_all(expand_in(PRODUCTS_BY_IDS, count), product_ids)
+        materials_rows = self.db_manager.fetch_all(expand_in(PRODUCTS_MATERIALS_FOR_PRICING, count), product_ids)
+        ops_rows = self.db_manager.fetch_all(expand_in(PRODUCTS_OPERATIONS, count), product_ids)
+
+        # Строки отсортированы по изделию: границы его участка в общем BOM группы
+        bom = pricing_kernel.bom_from_rows(materials_rows)
+        paint_area = pricing_kernel.profile_paint_area(bom)
+        material_ranges = {}
+        for index, row in enumerate(materials_rows):
+            material_ranges.setdefault(row.product_id, [index, index])[1] = index + 1
+
+        ops_by_product = defaultdict(list)
+        for row in ops_rows:
+            ops_by_product[row.product_id].append(row)
+
+        results = {}
+        for product_row in product_rows:
             try:
-                cat = (m.get('category') or 'Без категории')
-                length_mm = float(m.get('length_mm') or 0.0)
-                width_mm = float(m.get('width_mm') or 0.0)
-                thickness_mm = float(m.get('thickness_mm') or 0.0)
-                qty = int(m.get('quantity') or 0)
-                cost = float(m.get('cost') or 0.0)
-                name = m.get('name') or ''
-                weight_per_meter = float(m.get('weight_per_meter') or 0.0)
-
-                # Вес: length (в метрах) * weight_per_meter * qty
-                length_m = length_mm / 1000
-                weight = length_m * weight_per_meter * qty
-                summary[cat]['total_weight'] += weight
-                summary[cat]['total_cost'] += cost
-
-                # Предварительная площадь покраски: используем упрощённую логику
-                # - если есть width_mm (>0) — считаем площадь L * W * кол-во (две стороны для листов)
-                # - иначе используем профильную аппроксимацию (см. calculate_paint_area_for_material дальше)
-                paint_area = 0.0
-                if width_mm and width_mm > 0:
-                    # лист или профиль с заданной шириной — считаем площадь одной стороны * 2 (две стороны)
-                    paint_area = (length_mm / 1000.0) * (width_mm / 1000.0) * 2.0 * qty
-                else:
-                    # попробуем расчет по диаметру/сечению (если есть)
-                    paint_area = self.calculate_paint_area_for_material(m, length_mm, qty)
+                start, stop = material_ranges.get(product_row.id, (0, 0))
+                results[product_row.id] = self._price_product(
+                    product_row, pricing_kernel.bom_slice(bom, start, stop), paint_area[start:stop],
+                    ops_by_product.get(product_row.id, []),
+                    paint_consumption_kg_per_m2_per_layer, layers, loss_coeff, use_loss_coeff
+                )
+            except Exception as e:
+                logger.error(f"[ЦЕНА_БД] Ошибка расчета цены изделия ID {product_row.id}: {e}", exc_info=True)
+        return results
+
+    def _price_product(self, product_row, bom, paint_area, ops_rows,
+                       paint_consumption_kg_per_m2_per_layer: float = 0.10,
+                       layers: int = 2,
+                       loss_coeff: float = 1.10,
+                       use_loss_coeff: bool = True) -> Dict[str, Any]:
+        """Расчет pricing_data по уже загруженным строкам изделия, спецификации (BOM) и операций"""
+        pricing_data: Dict[str, Any] = {}
+
+        # считываем сохраненные коэффициенты — если отсутствуют, используем дефолты
+        def _safe_float(value, default):
+            try:
+                return float(value) if value is not None else default
+            except (TypeError, ValueError):
+                return default
+
+        overhead_percent_saved = _safe_float(product_row.overhead_percent, 0.55)
+        profit_percent_saved = _safe_float(product_row.profit_percent, 0.30)
+        approved_price_saved = _safe_float(product_row.approved_price, 0.0)
+
+        pricing_data['product_info'] = {
+            'product_id': product_row.product_id,
+            'article': product_row.article or "",
+            'name': product_row.name or "",
+            'total_weight_kg': 0.0,
+            'total_paint_area_m2': 0.0
+        }
 
-                summary[cat]['total_paint_area'] += paint_area
+        # Суммируем материалы по категориям и считаем вес/стоимость (и предварительную площадь покраски)
+        materials_summary = pricing_kernel.summarize_materials(bom, paint_area)
+        pricing_data['materials_summary'] = materials_summary
+
+        # Заполняем total_weight и preliminary paint area (сейчас в м^2)
+        total_weight = sum(cat['total_weight'] for cat in materials_summary.values())
+        preliminary_paint_area = sum(cat['total_paint_area'] for cat in materials_summary.values())
+        pricing_data['product_info']['total_weight_kg'] = round(total_weight, 3)
+        pricing_data['product_info']['total_paint_area_m2'] = round(preliminary_paint_area, 3)
+
+        labor_cost = self._calculate_labor_cost_from_db(ops_rows)
+        pricing_data['labor_cost'] = labor_cost
+
+        # Стоимостные показатели (пока без учета краски)
+        cost_indicators = self._calculate_cost_indicators(
+            labor_cost,
+            materials_summary,
+            overhead_percent_saved,
+            profit_percent_saved,
+            approved_price_saved
+        )
+        pricing_data['cost_indicators'] = cost_indicators
+
+        # Площадь покраски + стоимость краски (если есть материал 'краска'/'лак'):
+        return self._apply_paint_costs(
+            pricing_data,
+            bom,
+            paint_consumption_kg_per_m2_per_layer=paint_consumption_kg_per_m2_per_layer,
+            layers=layers,
+            loss_coeff=loss_coeff,
+            use_loss_coeff=use_loss_coeff,
+            paint_area=paint_area
+        )
 
-            except Exception as e:
-                logger.warning(f"[ЦЕНА_БД] Ошибка при обработке материала {m}: {e}", exc_info=True)
-                continue
+    # -----------------------
+    # Пакетный пересчет
+    # -----------------------
+    def reprice_products(self, product_ids: Optional[Iterable[int]] = None,
+                         progress_callback: Optional[Callable[[int, int], bool]] = None) -> Optional[RepriceReport]:
+        """
+        Пересчет сохраненной стоимости строк материалов (product_materials.cost) и операций
+        (operations.cost, rate_per_minute) по текущим ценам материалов и ставкам справочника.
+        Set-based UPDATE по группам изделий в одной транзакции; сводка стоимости
+        обновляется триггерами, расчетная цена изделий (products.calculated_price) —
+        по сводке в той же группе. product_ids=None — все изделия.
+        progress_callback(обработано, всего) вызывается после каждой группы; если он
+        вернул False, пересчет отменяется и откатывается.
+        Возвращает RepriceReport или None при ошибке/отмене.
+        """
+        if product_ids is None:
+            product_ids = [row[0] for row in self.db_manager.fetch_all("SELECT id FROM products ORDER BY id")]
+        else:
+            product_ids = sorted(set(product_ids))
+        total = len(product_ids)
+        logger.info(f"[ЦЕНА_БД] Пакетный пересчет стоимости: {total} изделий")
 
-        # Округляем итог
-        result = {}
-        for cat, vals in summary.items():
-            result[cat] = {
-                'total_weight': round(vals['total_weight'], 3),
-                'total_cost': round(vals['total_cost'], 2),
-                'total_paint_area': round(vals['total_paint_area'], 3)
-            }
-        logger.debug(f"[ЦЕНА_БД] Сводка материалов: {result}")
-        return result
+        material_lines = operation_lines = prices = 0
+        try:
+            with self.db_manager.transaction():
+                conn = self.db_manager.connection
+                for start in range(0, total, REPRICE_CHUNK_SIZE):
+                    chunk = product_ids[start:start + REPRICE_CHUNK_SIZE]
+                    placeholders = ", ".join("?" for _ in chunk)
+                    material_lines += conn.execute(
+                        REPRICE_MATERIALS_SQL.format(placeholders=placeholders), chunk).rowcount
+                    operation_lines += conn.execute(
+                        REPRICE_OPERATIONS_SQL.format(placeholders=placeholders), chunk).rowcount
+                    prices += conn.execute(
+                        REPRICE_PRODUCTS_SQL.format(placeholders=placeholders), chunk).rowcount
+                    if progress_callback and progress_callback(start + len(chunk), total) is False:
+                        raise InterruptedError("пересчет отменен пользователем")
+        except InterruptedError as e:
+            logger.warning(f"[ЦЕНА_БД] Пакетный пересчет откатан: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"[ЦЕНА_БД] Ошибка пакетного пересчета стоимости: {e}", exc_info=True)
+            return None
+
+        logger.info(f"[ЦЕНА_БД] Пересчет завершен: изделий {total}, строк материалов изменено {material_lines}, "
+                    f"операций изменено {operation_lines}, расчетных цен изменено {prices}")
+        return RepriceReport(total, material_lines, operation_lines, prices)
 
+    # -----------------------
+    # Вспомогательные методы
+    # -----------------------
     def _calculate_labor_cost_from_db(self, operations_data: List[tuple]) -> float:
         """
         Рассчитывает суммарную стоимость работ, используя утверждённую расценку (approved_rate),
@@ -245,14 +363,9 @@ class PricingManager:
         total = 0.0
         for op in operations_data or []:
             try:
-                operation_name = str(op[0] or "")
-                quantity_measured = int(op[1] or 0)
-                time_measured = float(op[2] or 0.0)
-                time_per_unit = float(op[3] or 0.0)
-                rate_per_minute = float(op[4] or 0.0)
-                calculated_cost = float(op[5] or 0.0)
-                # employee_name = str(op[6] or "")  # не нужен для расчёта здесь
-                approved_rate_raw = op[7]
+                operation_name = str(op.operation_name or "")
+                calculated_cost = float(op.cost or 0.0)
+                approved_rate_raw = op.approved_rate
 
                 if approved_rate_raw is not None and str(approved_rate_raw).strip() != "" and str(approved_rate_raw).strip().lower() != "none":
                     try:
@@ -368,46 +481,49 @@ class PricingManager:
                                      loss_coeff: float = 1.10,
                                      use_loss_coeff: bool = True) -> Dict[str, Any]:
         """
-        Рассчитывает общую площадь покраски, потребность краски (кг) и её стоимость.
-        Изменяет pricing_data: добавляет pricing_data['product_info']['total_paint_area_m2'],
+        Рассчитывает общую площадь покраски, потребность краски (кг) и её стоимость
+        для материалов pricing_data['product_materials'] (список словарей).
+        """
+        bom = pricing_kernel.bom_from_dicts(pricing_data.get('product_materials', []))
+        return self._apply_paint_costs(pricing_data, bom, paint_consumption_kg_per_m2_per_layer,
+                                       layers, loss_coeff, use_loss_coeff)
+
+    def _apply_paint_costs(self, pricing_data: Dict[str, Any], bom,
+                           paint_consumption_kg_per_m2_per_layer: float = 0.10,
+                           layers: int = 2,
+                           loss_coeff: float = 1.10,
+                           use_loss_coeff: bool = True,
+                           paint_area=None) -> Dict[str, Any]:
+        """
+        Рассчитывает общую площадь покраски, потребность краски (кг) и её стоимость по BOM (столбцы);
+        paint_area — уже рассчитанная площадь строк (pricing_kernel.profile_paint_area).
+        Изменяет pricing_data: добавляет pricing_data['product_materials'] (с площадью покраски строк),
+        pricing_data['product_info']['total_paint_area_m2'],
         pricing_data['paint'] = {'required_kg', 'cost', 'material_id'} и увеличивает cost_indicators accordingly.
         """
         try:
-            mats = pricing_data.get('product_materials', [])
-            total_area = 0.0
-            for m in mats:
-                length_mm = float(m.get('length_mm') or 0.0)
-                qty = int(m.get('quantity') or 1)
-                area = self.calculate_paint_area_for_material(m, length_mm, qty)
-                m['paint_area'] = round(area, 6)
-                total_area += area
+            if paint_area is None:
+                paint_area = pricing_kernel.profile_paint_area(bom)
+            total_area = pricing_kernel.sequential_sum(paint_area)
+            pricing_data['product_materials'] = pricing_kernel.bom_to_dicts(bom, paint_area)
 
             pricing_data.setdefault('product_info', {})
             pricing_data['product_info']['total_paint_area_m2'] = round(total_area, 3)
 
             # Найти материал-краску среди материалов изделия
-            paint_mat = None
-            for m in mats:
-                name = (m.get('name') or '').lower()
-                cat = (m.get('category') or '').lower()
-                if 'краска' in name or 'краска' in cat or 'лак' in name or 'лак' in cat:
-                    paint_mat = m
-                    break
+            paint_index = pricing_kernel.paint_material_index(bom)
 
             paint_info = {'required_kg': 0.0, 'cost': 0.0, 'material_id': None}
-            if paint_mat:
+            if paint_index is not None:
                 required_kg = total_area * paint_consumption_kg_per_m2_per_layer * layers
                 if use_loss_coeff:
                     required_kg *= loss_coeff
-                price_kg = float(paint_mat.get('price_per_kg') or paint_mat.get('price_per_kg', 0.0) or paint_mat.get('price_per_kg', 0.0) or paint_mat.get('price_per_kg', 0.0) or paint_mat.get('price_per_kg', 0.0) or paint_mat.get('price_per_kg', 0.0) or paint_mat.get('price_per_kg', 0.0) or paint_mat.get('price_per_kg', 0.0) or paint_mat.get('price_per_kg', 0.0) or paint_mat.get('price_per_kg', 0.0))
-                # fallback на price_per_kg или price_per_kg synonyms
-                if not price_kg:
-                    price_kg = float(m.get('price_per_kg') or m.get('Наша продажа/кг') or 0.0)
+                price_kg = float(bom.price_per_kg[paint_index])
 
                 paint_cost = required_kg * price_kg
                 paint_info['required_kg'] = round(required_kg, 3)
                 paint_info['cost'] = round(paint_cost, 2)
-                paint_info['material_id'] = paint_mat.get('material_id') or paint_mat.get('id')
+                paint_info['material_id'] = bom.material_id[paint_index]
 
                 # Добавляем стоимость краски в материалы и себестоимость
                 if 'cost_indicators' in pricing_data:
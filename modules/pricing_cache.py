@@ -0,0 +1,68 @@
+# modules/pricing_cache.py
+"""
+Кэш расчета цены изделий по ревизии изделия (products.revision).
+
+Ревизию увеличивают триггеры при изменении всего, что читает расчет цены:
+строк материалов и операций изделия, его параметров цены и используемых им
+материалов справочника (триггеры создает миграция 12, modules/migrations.py).
+Ставки справочника операций в расчет не входят — до изделия они доходят через
+пересчет операций (PricingManager.reprice_products), который и увеличивает ревизию.
+Запись результатов расчета (total_paint_area, calculated_price) ревизию не меняет.
+"""
+import copy
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Сколько расчетов хранить на одну БД (вытесняются давно не запрошенные)
+PRICING_CACHE_SIZE = 256
+
+
+class PricingCache:
+    """Результаты расчета цены: ключ -> (ревизия изделия, pricing_data)"""
+
+    def __init__(self, maxsize=PRICING_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, revision):
+        """Копия сохраненного расчета, если он сделан для этой ревизии, иначе None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != revision:
+                return None
+            self._entries.move_to_end(key)
+            pricing_data = entry[1]
+        # Вызывающий код дополняет pricing_data — отдаем копию
+        return copy.deepcopy(pricing_data)
+
+    def put(self, key, revision, pricing_data):
+        """Сохранение копии расчета для ревизии revision"""
+        pricing_data = copy.deepcopy(pricing_data)
+        with self._lock:
+            self._entries[key] = (revision, pricing_data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Кэш на каждую БД: PricingManager создается на каждый расчет, а кэш живет вместе с DatabaseManager
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def cache_for(db_manager):
+    """Общий кэш расчета цены для БД db_manager"""
+    with _caches_lock:
+        cache = _caches.get(db_manager)
+        if cache is None:
+            cache = _caches[db_manager] = PricingCache()
+        return cache
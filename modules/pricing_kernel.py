@@ -0,0 +1,191 @@
+# modules/pricing_kernel.py
+"""
+Векторизованное ядро расчета цены: спецификация изделия (BOM) как столбцы NumPy.
+
+Вес, площадь покраски и суммы по категориям считаются одним проходом по массивам;
+суммы по категориям — np.bincount (накопление в порядке строк, как при построчном
+сложении), поэтому результаты совпадают с прежним построчным расчетом до бита.
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+DEFAULT_CATEGORY = 'Без категории'
+
+# Категории листовых материалов: площадь покраски по ширине из сечения, обе стороны
+SHEET_KEYWORDS = ('лист', 'дсп', 'мдф', 'панель')
+
+# Материал-краска определяется по наименованию или категории
+PAINT_KEYWORDS = ('краска', 'лак')
+
+# Числовые столбцы BOM (значения NULL из БД -> 0)
+BOM_NUMERIC_FIELDS = (
+    'length_mm', 'width_mm', 'thickness_mm', 'cost', 'weight_per_meter',
+    'diameter_mm', 'section_length_mm', 'section_width_mm', 'price_per_kg'
+)
+
+# Спецификация изделия по столбцам: category/name/material_id — списки, остальное — массивы NumPy
+BomArrays = namedtuple("BomArrays", ("category", "name", "material_id", "quantity") + BOM_NUMERIC_FIELDS)
+
+# Порядок ключей строки материала в pricing_data['product_materials']
+_DICT_KEYS = (
+    'category', 'length_mm', 'width_mm', 'thickness_mm', 'quantity', 'cost', 'name',
+    'weight_per_meter', 'material_id', 'diameter_mm', 'section_length_mm', 'section_width_mm', 'price_per_kg'
+)
+
+
+def _float_array(values):
+    if None not in values:
+        try:
+            return np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            pass
+    # NULL, пустые строки и прочие нечисловые значения в БД -> 0 (как float(value or 0))
+    return np.array([value or 0.0 for value in values], dtype=np.float64)
+
+
+def _quantity_array(values):
+    # int() отбрасывает дробную часть так же, как astype(int64)
+    return _float_array(values).astype(np.int64)
+
+
+def bom_from_rows(rows):
+    """
+    BOM из строк запроса PRODUCT_MATERIALS_FOR_PRICING; столбцы после 13-го
+    (product_id пакетного PRODUCTS_MATERIALS_FOR_PRICING) не используются
+    """
+    columns = list(zip(*rows)) if rows else [()] * 13
+    (category, length_mm, width_mm, thickness_mm, quantity, cost, name, weight_per_meter,
+     material_id, diameter_mm, section_length_mm, section_width_mm, price_per_kg) = columns[:13]
+    return BomArrays(
+        category=list(category), name=list(name), material_id=list(material_id),
+        quantity=_quantity_array(quantity),
+        length_mm=_float_array(length_mm), width_mm=_float_array(width_mm),
+        thickness_mm=_float_array(thickness_mm), cost=_float_array(cost),
+        weight_per_meter=_float_array(weight_per_meter), diameter_mm=_float_array(diameter_mm),
+        section_length_mm=_float_array(section_length_mm), section_width_mm=_float_array(section_width_mm),
+        price_per_kg=_float_array(price_per_kg)
+    )
+
+
+def bom_from_dicts(product_materials):
+    """BOM из списка словарей строк материалов (формат pricing_data['product_materials'])"""
+    return BomArrays(
+        category=[m.get('category') for m in product_materials],
+        name=[m.get('name') for m in product_materials],
+        material_id=[m.get('material_id') for m in product_materials],
+        quantity=_quantity_array([m.get('quantity') for m in product_materials]),
+        **{field: _float_array([m.get(field) for m in product_materials])
+           for field in BOM_NUMERIC_FIELDS if field != 'price_per_kg'},
+        # Нет цены за кг — цена из столбца прайса (как прежний apply_paint_costs_to_pricing)
+        price_per_kg=_float_array([m.get('price_per_kg') or m.get('Наша продажа/кг') for m in product_materials])
+    )
+
+
+def bom_slice(bom, start, stop):
+    """Строки start:stop спецификации (массивы — представления без копирования)"""
+    return BomArrays._make(column[start:stop] for column in bom)
+
+
+def bom_to_dicts(bom, paint_area=None):
+    """Строки BOM как словари (pricing_data['product_materials']), с площадью покраски строки"""
+    columns = [getattr(bom, key) for key in _DICT_KEYS]
+    columns = [column.tolist() if isinstance(column, np.ndarray) else column for column in columns]
+    # Литерал словаря заметно быстрее dict(zip(...)) на тысячах строк
+    rows = [
+        {'category': category, 'length_mm': length_mm, 'width_mm': width_mm, 'thickness_mm': thickness_mm,
+         'quantity': quantity, 'cost': cost, 'name': name, 'weight_per_meter': weight_per_meter,
+         'material_id': material_id, 'diameter_mm': diameter_mm, 'section_length_mm': section_length_mm,
+         'section_width_mm': section_width_mm, 'price_per_kg': price_per_kg}
+        for (category, length_mm, width_mm, thickness_mm, quantity, cost, name, weight_per_meter,
+             material_id, diameter_mm, section_length_mm, section_width_mm, price_per_kg) in zip(*columns)
+    ]
+    if paint_area is not None:
+        for row, area in zip(rows, paint_area.tolist()):
+            row['paint_area'] = round(area, 6)
+    return rows
+
+
+def _factorize(values):
+    """Коды значений (в порядке первого появления) и список уникальных значений"""
+    index = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    return np.array(codes, dtype=np.intp), list(index)
+
+
+@lru_cache(maxsize=4096)
+def _has_keyword(text, keywords):
+    return any(keyword in (text or '').lower() for keyword in keywords)
+
+
+def _keyword_mask(texts, keywords):
+    """Маска строк, в тексте которых (без учета регистра) есть одно из ключевых слов"""
+    # Категорий и наименований материалов немного: каждое значение проверяется один раз (кэш)
+    return np.fromiter((_has_keyword(text, keywords) for text in texts), dtype=bool, count=len(texts))
+
+
+def profile_paint_area(bom):
+    """
+    Площадь покраски строк (м²) по геометрии профиля (как PricingManager.calculate_paint_area_for_material):
+    круг — π·D·L, прямоугольный профиль — периметр·L, лист — L·W·2; умножается на количество (0 -> 1)
+    """
+    length_m = bom.length_mm / 1000.0
+    a_mm, b_mm = bom.section_length_mm, bom.section_width_mm
+
+    round_area = np.pi * (bom.diameter_mm / 1000.0) * length_m
+    rect_area = 2.0 * (a_mm / 1000.0 + b_mm / 1000.0) * length_m
+    sheet_width_mm = np.where(a_mm != 0, a_mm, b_mm)
+    sheet_area = np.where(sheet_width_mm > 0, length_m * (sheet_width_mm / 1000.0) * 2.0, 0.0)
+
+    is_round = bom.diameter_mm > 0
+    is_rect = ~is_round & (a_mm > 0) & (b_mm > 0)
+    is_sheet = ~is_round & ~is_rect & _keyword_mask(bom.category, SHEET_KEYWORDS)
+
+    area_per_piece = np.select([is_round, is_rect, is_sheet], [round_area, rect_area, sheet_area], 0.0)
+    area_per_piece = np.where(length_m > 0, area_per_piece, 0.0)
+    return area_per_piece * np.where(bom.quantity != 0, bom.quantity, 1)
+
+
+def summarize_materials(bom, paint_area=None):
+    """
+    Суммы по категориям за один проход: {category: {total_weight, total_cost, total_paint_area}}.
+    Предварительная площадь покраски: при заданной ширине — L·W·2·кол-во, иначе по профилю
+    (paint_area — уже рассчитанный profile_paint_area(bom)).
+    """
+    if not bom.category:
+        return {}
+    categories = [category or DEFAULT_CATEGORY for category in bom.category]
+    codes, uniques = _factorize(categories)
+
+    weight = bom.length_mm / 1000 * bom.weight_per_meter * bom.quantity
+    width_area = (bom.length_mm / 1000.0) * (bom.width_mm / 1000.0) * 2.0 * bom.quantity
+    if paint_area is None:
+        paint_area = profile_paint_area(bom)
+    paint_area = np.where(bom.width_mm > 0, width_area, paint_area)
+
+    size = len(uniques)
+    total_weight = np.bincount(codes, weights=weight, minlength=size)
+    total_cost = np.bincount(codes, weights=bom.cost, minlength=size)
+    total_paint_area = np.bincount(codes, weights=paint_area, minlength=size)
+
+    return {
+        category: {
+            'total_weight': round(float(total_weight[i]), 3),
+            'total_cost': round(float(total_cost[i]), 2),
+            'total_paint_area': round(float(total_paint_area[i]), 3)
+        }
+        for i, category in enumerate(uniques)
+    }
+
+
+def sequential_sum(values):
+    """Сумма в порядке строк (как построчное сложение, без попарного суммирования np.sum)"""
+    return float(np.cumsum(values)[-1]) if len(values) else 0.0
+
+
+def paint_material_index(bom):
+    """Индекс первой строки-краски (по наименованию или категории) или None"""
+    mask = _keyword_mask(bom.name, PAINT_KEYWORDS) | _keyword_mask(bom.category, PAINT_KEYWORDS)
+    indexes = np.flatnonzero(mask)
+    return int(indexes[0]) if len(indexes) else None
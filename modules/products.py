@@ -5,10 +5,19 @@ from openpyxl import Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from modules.database import DatabaseManager
+from modules.queries import INCORRECT_APPROVED_PRICES, PRODUCT_BY_ID, PRODUCT_MATERIAL_LINES, PRODUCT_OPERATIONS
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Стили карточки: общие объекты на все ячейки — openpyxl ищет стиль в реестре книги
+# по значению, и новый объект на каждую ячейку заметно замедляет запись (пакетная выгрузка)
+_HEADER_FONT = Font(bold=True)
+_HEADER_FILL = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+_ALIGN_CENTER = Alignment(horizontal="center", vertical="center")
+_ALIGN_LEFT = Alignment(horizontal="left", vertical="center")
+_ALIGN_LEFT_WRAP = Alignment(horizontal="left", vertical="center", wrap_text=True)
+
 
 class ProductManager:
     def __init__(self, db_manager: DatabaseManager):
@@ -65,9 +74,7 @@ class ProductManager:
             # --- 1. Получение данных из БД ---
             logger.debug("[ИЗДЕЛИЯ_EXCEL] 1. Получение данных из БД")
 
-            product_info = self.db_manager.fetch_one(
-                "SELECT * FROM products WHERE id = ?", (product_id,)
-            )
+            product_info = self.db_manager.fetch_one(PRODUCT_BY_ID, (product_id,))
 
             if not product_info:
                 logger.error(f"[ИЗДЕЛИЯ_EXCEL] Ошибка: Изделие с ID {product_id} не найдено в БД")
@@ -77,21 +84,7 @@ class ProductManager:
 
             # --- 2. Получение операций из БД ---
             logger.debug("[ИЗДЕЛИЯ_EXCEL] 2. Получение операций из БД")
-            operations_raw = self.db_manager.fetch_all("""
-                SELECT 
-                    COALESCE(o.operation_name, ''),
-                    COALESCE(o.quantity_measured, 0),
-                    COALESCE(o.time_measured, 0.0),
-                    COALESCE(o.time_per_unit, 0.0),
-                    COALESCE(o.rate_per_minute, 0.0),
-                    COALESCE(o.cost, 0.0),
-                    COALESCE(e.name, ''),
-                    COALESCE(o.approved_rate, '')
-                FROM operations o
-                LEFT JOIN employees e ON o.employee_id = e.id
-                WHERE o.product_id = ?
-                ORDER BY o.id
-            """, (product_id,))
+            operations_raw = self.db_manager.fetch_all(PRODUCT_OPERATIONS, (product_id,))
 
             # Преобразование кортежей в списки для возможности изменения (если нужно)
             operations = [list(op) for op in operations_raw]
@@ -99,23 +92,25 @@ class ProductManager:
 
             # --- 3. Получение материалов из БД ---
             logger.debug("[ИЗДЕЛИЯ_EXCEL] 3. Получение материалов из БД")
-            materials_raw = self.db_manager.fetch_all("""
-                SELECT 
-                    COALESCE(m.name, ''),
-                    COALESCE(pm.length, 0.0),
-                    COALESCE(pm.width, 0.0),
-                    COALESCE(pm.quantity, 0),
-                    COALESCE(pm.cost, 0.0)
-                FROM product_materials pm
-                JOIN materials m ON pm.material_id = m.id
-                WHERE pm.product_id = ?
-                ORDER BY pm.id
-            """, (product_id,))
+            materials_raw = self.db_manager.fetch_all(PRODUCT_MATERIAL_LINES, (product_id,))
 
             # Преобразование кортежей в списки
             materials = [list(mat) for mat in materials_raw]
             logger.debug(f"[ИЗДЕЛИЯ_EXCEL] Получено {len(materials) if materials else 0} материалов")
 
+            return self.write_product_card(product_info, operations, materials, file_path)
+        except Exception as e:
+            logger.error(f"[ИЗДЕЛИЯ_EXCEL] Ошибка при сохранении изделия в Excel: {e}", exc_info=True)
+            return False
+
+    def write_product_card(self, product_info, operations, materials, file_path):
+        """
+        Запись карточки изделия в Excel по уже полученным данным
+        (строки PRODUCT_BY_ID, PRODUCT_OPERATIONS, PRODUCT_MATERIAL_LINES; лишние столбцы в конце не используются).
+        Используется save_product_to_excel и пакетной выгрузкой карточек (modules/bulk_export.py).
+        """
+        product_id = product_info.id
+        try:
             # --- 4. Создание Excel файла с помощью openpyxl ---
             logger.debug("[ИЗДЕЛИЯ_EXCEL] 4. Создание Excel файла с помощью openpyxl")
 
@@ -146,9 +141,9 @@ class ProductManager:
 
             # Данные изделия
             info_data = [
-                ["ID", str(product_info[1]) if product_info[1] is not None else ""],
-                ["Артикул", str(product_info[2]) if product_info[2] is not None else ""],
-                ["Название", str(product_info[3]) if product_info[3] is not None else ""]
+                ["ID", str(product_info.product_id) if product_info.product_id is not None else ""],
+                ["Артикул", str(product_info.article) if product_info.article is not None else ""],
+                ["Название", str(product_info.name) if product_info.name is not None else ""]
             ]
 
             for row_data in info_data:
@@ -309,14 +304,14 @@ class ProductManager:
         """Форматирование листа 'Информация'"""
         # Заголовки
         for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
+            cell.font = _HEADER_FONT
+            cell.fill = _HEADER_FILL
+            cell.alignment = _ALIGN_CENTER
 
         # Данные
         for row in ws.iter_rows(min_row=2, max_col=2):
             for cell in row:
-                cell.alignment = Alignment(horizontal="left", vertical="center")
+                cell.alignment = _ALIGN_LEFT
 
         # Автоподбор ширины колонок
         dims = {}
@@ -331,14 +326,14 @@ class ProductManager:
         """Форматирование листа 'Операции'"""
         # Заголовки
         for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
+            cell.font = _HEADER_FONT
+            cell.fill = _HEADER_FILL
+            cell.alignment = _ALIGN_CENTER
 
         # Данные
         for row in ws.iter_rows(min_row=2):
             for cell in row:
-                cell.alignment = Alignment(horizontal="left", vertical="center")
+                cell.alignment = _ALIGN_LEFT
 
         # Автоподбор ширины колонок
         dims = {}
@@ -353,14 +348,14 @@ class ProductManager:
         """Форматирование листа 'Материалы'"""
         # Заголовки
         for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-            cell.alignment = Alignment(horizontal="center", vertical="center")
+            cell.font = _HEADER_FONT
+            cell.fill = _HEADER_FILL
+            cell.alignment = _ALIGN_CENTER
 
         # Данные
         for row in ws.iter_rows(min_row=2):
             for cell in row:
-                cell.alignment = Alignment(horizontal="left", vertical="center")
+                cell.alignment = _ALIGN_LEFT
 
         # Автоподбор ширины колонок
         dims = {}
@@ -375,12 +370,12 @@ class ProductManager:
         """Форматирование листа 'Инструкция'"""
         # Заголовок
         ws['A1'].font = Font(bold=True, size=14)
-        ws['A1'].alignment = Alignment(horizontal="center", vertical="center")
+        ws['A1'].alignment = _ALIGN_CENTER
 
         # Текст
         for row in ws.iter_rows(min_row=2):
             for cell in row:
-                cell.alignment = Alignment(horizontal="left", vertical="center", wrap_text=True)
+                cell.alignment = _ALIGN_LEFT_WRAP
 
         # Автоподбор ширины колонок
         ws.column_dimensions['A'].width = 80  # Фиксированная ширина для инструкции
@@ -391,6 +386,14 @@ class ProductManager:
         query = "SELECT id, product_id, article, name, created_date FROM products ORDER BY name"
         return self.db_manager.fetch_all(query)
 
+    def get_incorrect_approved_prices(self):
+        """
+        Изделия с утвержденной ценой не больше 1 и положительной ценой по сводке стоимости:
+        строки INCORRECT_APPROVED_PRICES (id, approved_price, formula_price)
+        """
+        logger.debug("[ИЗДЕЛИЯ] Поиск изделий с некорректной утвержденной ценой")
+        return self.db_manager.fetch_all(INCORRECT_APPROVED_PRICES)
+
     def load_product_from_excel(self, file_path):
         """Загрузка изделия из Excel файла"""
         logger.info(f"[ИЗДЕЛИЯ] Загрузка изделия из файла: {file_path}")
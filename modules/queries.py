@@ -0,0 +1,270 @@
+# modules/queries.py
+"""
+Реестр именованных SQL-запросов.
+
+Каждый запрос — Query(name, sql, row): текст SQL с явным списком столбцов и
+тип строки результата (namedtuple). DatabaseManager.fetch_one/fetch_all
+возвращают для Query строки этого типа, поэтому поля читаются по имени,
+а не по позиции. Текст запроса неизменен, и постоянное соединение берет
+подготовленный оператор из кэша sqlite3 без повторного разбора.
+"""
+from collections import namedtuple
+
+# Зарегистрированные запросы: имя -> Query
+REGISTRY = {}
+
+
+class Query(namedtuple("Query", "name sql row")):
+    """Именованный запрос: имя, текст SQL и тип строки результата (или None)"""
+    __slots__ = ()
+
+
+def register(name, sql, fields=None):
+    """Регистрация запроса; fields — имена столбцов результата в порядке SELECT"""
+    if name in REGISTRY:
+        raise ValueError(f"Запрос '{name}' уже зарегистрирован")
+    row = None
+    if fields:
+        type_name = "".join(part.capitalize() for part in name.split("_")) + "Row"
+        row = namedtuple(type_name, fields)
+    query = Query(name, sql, row)
+    REGISTRY[name] = query
+    return query
+
+
+def expand_in(query, count):
+    """Запрос с IN ({placeholders}), развернутым на count параметров"""
+    return query._replace(sql=query.sql.format(placeholders=", ".join("?" * count)))
+
+
+# -----------------------
+# Изделия
+# -----------------------
+_PRODUCT_COLUMNS = ("id, product_id, article, name, created_date, "
+                    "overhead_percent, profit_percent, approved_price, total_paint_area, calculated_price")
+
+PRODUCT_BY_ID = register(
+    "product_by_id",
+    f"SELECT {_PRODUCT_COLUMNS} FROM products WHERE id = ?",
+    _PRODUCT_COLUMNS
+)
+
+# Ревизия изделия (ключ кэша расчета цены, modules/pricing_cache.py)
+PRODUCT_REVISION = register(
+    "product_revision",
+    "SELECT revision FROM products WHERE id = ?",
+    "revision"
+)
+
+# Изделия по списку ID (пакетный расчет цены; см. expand_in)
+PRODUCTS_BY_IDS = register(
+    "products_by_ids",
+    f"SELECT {_PRODUCT_COLUMNS} FROM products WHERE id IN ({{placeholders}})",
+    _PRODUCT_COLUMNS
+)
+
+# Сводка каталога: изделия + поддерживаемая триггерами сводка стоимости (modules/cost_summary.py)
+_CATALOG_SUMMARY_COLUMNS = """
+    SELECT p.id, p.product_id, p.article, p.name, p.created_date,
+           p.approved_price, p.calculated_price,
+           COALESCE(s.materials_cost, 0), COALESCE(s.operations_cost, 0),
+           COALESCE(s.labor_cost, 0), COALESCE(s.prime_cost, 0),
+           COALESCE(s.prime_cost, 0) * COALESCE(p.overhead_percent, 0.55) AS overhead_cost,
+           COALESCE(s.prime_cost, 0) * (1 + COALESCE(p.overhead_percent, 0.55))
+               * COALESCE(p.profit_percent, 0.30) AS profit_cost,
+           COALESCE(s.calculated_price, 0) AS formula_price"""
+_CATALOG_SUMMARY_SELECT = _CATALOG_SUMMARY_COLUMNS + """
+    FROM products p
+    LEFT JOIN product_cost_summary s ON s.product_id = p.id
+"""
+_CATALOG_SUMMARY_FIELDS = ("id product_id article name created_date approved_price calculated_price "
+                           "materials_cost operations_cost labor_cost prime_cost overhead_cost profit_cost formula_price")
+
+# Строки каталога по списку ID (точечное обновление после пересчета; см. expand_in)
+CATALOG_SUMMARY_BY_IDS = register(
+    "catalog_summary_by_ids",
+    _CATALOG_SUMMARY_SELECT + "    WHERE p.id IN ({placeholders})\n",
+    _CATALOG_SUMMARY_FIELDS
+)
+
+# Изделия с некорректной утвержденной ценой (не больше 1) и положительной ценой по сводке
+# стоимости (MainApplication.fix_incorrect_approved_prices)
+INCORRECT_APPROVED_PRICES = register(
+    "incorrect_approved_prices",
+    """
+    SELECT p.id, p.approved_price, s.calculated_price
+    FROM products p
+    JOIN product_cost_summary s ON s.product_id = p.id
+    WHERE p.approved_price <= 1.0 AND s.calculated_price > 0
+""",
+    "id approved_price formula_price"
+)
+
+# Окно каталога (modules/catalog_window.py): {source} — изделия p и сводка s в порядке обхода,
+# {key}/{tie} — ключ сортировки и ID изделия, {where} — фильтр и условие keyset, {order} — ORDER BY.
+# Строка сводки есть у каждого изделия (триггер на INSERT), поэтому внутреннее соединение
+_CATALOG_WINDOW_FROM = """
+    FROM {source}
+    WHERE {where}
+"""
+
+CATALOG_WINDOW = register(
+    "catalog_window",
+    _CATALOG_SUMMARY_COLUMNS + ", {key}, {tie}" + _CATALOG_WINDOW_FROM + "    ORDER BY {order}\n    LIMIT ?\n",
+    _CATALOG_SUMMARY_FIELDS + " sort_key sort_id"
+)
+
+# Ключ строки окна на позиции OFFSET (начало страницы без известной границы; читается только индекс)
+CATALOG_WINDOW_KEY = register(
+    "catalog_window_key",
+    "    SELECT {key}, {tie}" + _CATALOG_WINDOW_FROM + "    ORDER BY {order}\n    LIMIT 1 OFFSET ?\n",
+    "sort_key sort_id"
+)
+
+CATALOG_WINDOW_COUNT = register(
+    "catalog_window_count",
+    "    SELECT COUNT(*)" + _CATALOG_WINDOW_FROM,
+    "count"
+)
+
+# Поиск по каталогу: ID найденных изделий в порядке релевантности (modules/catalog_search.py);
+# фильтр окна каталога — подзапрос без ранжирования (CatalogSearchManager.search_condition)
+CATALOG_SEARCH_RANKED = register(
+    "catalog_search_ranked",
+    "SELECT rowid FROM products_fts WHERE products_fts MATCH ? ORDER BY rank",
+    "id"
+)
+
+# Операции изделия (карточка, отчеты, расчет цены)
+_OPERATIONS_COLUMNS = """
+        COALESCE(o.operation_name, ''),
+        COALESCE(o.quantity_measured, 0),
+        COALESCE(o.time_measured, 0.0),
+        COALESCE(o.time_per_unit, 0.0),
+        COALESCE(o.rate_per_minute, 0.0),
+        COALESCE(o.cost, 0.0),
+        COALESCE(e.name, ''),
+        COALESCE(o.approved_rate, '')"""
+_OPERATIONS_FIELDS = ("operation_name quantity_measured time_measured time_per_unit rate_per_minute "
+                      "cost employee_name approved_rate")
+
+PRODUCT_OPERATIONS = register("product_operations", f"""
+    SELECT{_OPERATIONS_COLUMNS}
+    FROM operations o
+    LEFT JOIN employees e ON o.employee_id = e.id
+    WHERE o.product_id = ?
+    ORDER BY o.id
+""", _OPERATIONS_FIELDS)
+
+# Операции изделий по списку ID, сгруппированные по изделию (пакетный расчет цены)
+PRODUCTS_OPERATIONS = register("products_operations", f"""
+    SELECT{_OPERATIONS_COLUMNS},
+        o.product_id
+    FROM operations o
+    LEFT JOIN employees e ON o.employee_id = e.id
+    WHERE o.product_id IN ({{placeholders}})
+    ORDER BY o.product_id, o.id
+""", _OPERATIONS_FIELDS + " product_id")
+
+# Строки материалов изделия (карточка, отчеты)
+_MATERIAL_LINES_COLUMNS = """
+        COALESCE(m.name, ''),
+        COALESCE(pm.length, 0.0),
+        COALESCE(pm.width, 0.0),
+        COALESCE(pm.quantity, 0),
+        COALESCE(pm.cost, 0.0)"""
+_MATERIAL_LINES_FIELDS = "material_name length width quantity cost"
+
+PRODUCT_MATERIAL_LINES = register("product_material_lines", f"""
+    SELECT{_MATERIAL_LINES_COLUMNS}
+    FROM product_materials pm
+    JOIN materials m ON pm.material_id = m.id
+    WHERE pm.product_id = ?
+    ORDER BY pm.id
+""", _MATERIAL_LINES_FIELDS)
+
+# Строки материалов изделий по списку ID, сгруппированные по изделию (пакетная выгрузка карточек)
+PRODUCTS_MATERIAL_LINES = register("products_material_lines", f"""
+    SELECT{_MATERIAL_LINES_COLUMNS},
+        pm.product_id
+    FROM product_materials pm
+    JOIN materials m ON pm.material_id = m.id
+    WHERE pm.product_id IN ({{placeholders}})
+    ORDER BY pm.product_id, pm.id
+""", _MATERIAL_LINES_FIELDS + " product_id")
+
+# Материалы изделия с параметрами справочника (расчет цены; порядок столбцов — pricing_kernel.bom_from_rows)
+_MATERIALS_FOR_PRICING_COLUMNS = """
+        COALESCE(m.category, ''),
+        COALESCE(pm.length, 0.0),
+        COALESCE(pm.width, 0.0),
+        COALESCE(pm.thickness, 0.0),
+        COALESCE(pm.quantity, 0),
+        COALESCE(pm.cost, 0.0),
+        COALESCE(m.name, ''),
+        COALESCE(m.weight_per_meter, 0.0),
+        pm.material_id,
+        COALESCE(m.diameter, 0.0),
+        COALESCE(m.section_length, 0.0),
+        COALESCE(m.section_width, 0.0),
+        COALESCE(m.our_price_per_kg, m.final_price_kg, 0.0)"""
+_MATERIALS_FOR_PRICING_FIELDS = ("category length_mm width_mm thickness_mm quantity cost material_name "
+                                 "weight_per_meter material_id diameter_mm section_length_mm section_width_mm "
+                                 "price_per_kg")
+
+# pm.id — однозначный порядок одноименных строк: одиночный и пакетный расчет видят их одинаково
+PRODUCT_MATERIALS_FOR_PRICING = register("product_materials_for_pricing", f"""
+    SELECT{_MATERIALS_FOR_PRICING_COLUMNS}
+    FROM product_materials pm
+    JOIN materials m ON pm.material_id = m.id
+    WHERE pm.product_id = ?
+    ORDER BY m.category, m.name, pm.id
+""", _MATERIALS_FOR_PRICING_FIELDS)
+
+# Материалы изделий по списку ID, сгруппированные по изделию (пакетный расчет цены)
+PRODUCTS_MATERIALS_FOR_PRICING = register("products_materials_for_pricing", f"""
+    SELECT{_MATERIALS_FOR_PRICING_COLUMNS},
+        pm.product_id
+    FROM product_materials pm
+    JOIN materials m ON pm.material_id = m.id
+    WHERE pm.product_id IN ({{placeholders}})
+    ORDER BY pm.product_id, m.category, m.name, pm.id
+""", _MATERIALS_FOR_PRICING_FIELDS + " product_id")
+
+# -----------------------
+# Материалы (списки выбора — только действующие, is_active = 1)
+# -----------------------
+_MATERIAL_COLUMNS = ("id, category, name, diameter, section_length, section_width, thickness, "
+                     "weight_per_meter, purchase_price_t, delivery_price_t, waste_price, final_price_kg, "
+                     "unit_of_measurement, our_price_per_kg")
+
+MATERIAL_BY_ID = register(
+    "material_by_id",
+    f"SELECT {_MATERIAL_COLUMNS} FROM materials WHERE id = ?",
+    _MATERIAL_COLUMNS
+)
+
+MATERIAL_BY_NAME = register(
+    "material_by_name",
+    # Среди одноименных предпочитаем действующий и последний загруженный материал
+    f"SELECT {_MATERIAL_COLUMNS} FROM materials WHERE name = ? ORDER BY is_active DESC, id DESC LIMIT 1",
+    _MATERIAL_COLUMNS
+)
+
+MATERIALS_ALL = register(
+    "materials_all",
+    f"SELECT {_MATERIAL_COLUMNS} FROM materials WHERE is_active = 1 ORDER BY category, name",
+    _MATERIAL_COLUMNS
+)
+
+MATERIAL_CATEGORIES = register(
+    "material_categories",
+    "SELECT DISTINCT category FROM materials WHERE category != '' AND is_active = 1 ORDER BY category",
+    "category"
+)
+
+MATERIALS_BY_CATEGORY = register(
+    "materials_by_category",
+    "SELECT id, name FROM materials WHERE category = ? AND is_active = 1 ORDER BY name",
+    "id name"
+)
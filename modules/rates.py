@@ -1,99 +1,139 @@
 # modules/rates.py
+from collections import namedtuple
+
 import pandas as pd
-import re
 from modules.database import DatabaseManager
+from modules.import_utils import (
+    ImportReport, add_message, clean_text, column_or_default, excel_row_numbers, parse_numeric
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+RATES_SHEET = "ставки"
+RATES_HEADER_ROW = 2  # заголовки в третьей строке листа
+
+# Заголовки следующих таблиц на листе: на первом из них разбор ставок прекращается
+RATE_STOP_MARKERS = [
+    'диаметр', 'длина', 'вес', 'Расценки с 01.05.2025', 'Сумма',
+    'Расценки с 01.02.2025', 'Старые расценки', 'Количество', 'Время',
+    'Рабочих дней', 'Рабочих часов в день', 'Минут в часе',
+    'Рабочих секунд в месяц', 'Рабочих минут в месяц', 'Рабочих часов в месяц'
+]
+
+# Итог импорта ставок: поля ImportReport + разница с текущим справочником
+RateImportReport = namedtuple("RateImportReport", ImportReport._fields + ("added", "changed", "removed"))
+
+# Временная таблица соединения: загруженные ставки до замены справочника
+CREATE_STAGING_QUERY = """
+    CREATE TEMP TABLE IF NOT EXISTS operations_list_staging (
+        name TEXT NOT NULL,
+        rate_per_minute REAL DEFAULT 0.0
+    )
+"""
+
+ADDED_RATES_QUERY = """
+    SELECT DISTINCT s.name FROM temp.operations_list_staging s
+    WHERE s.name NOT IN (SELECT name FROM operations_list)
+    ORDER BY s.name
+"""
+
+CHANGED_RATES_QUERY = """
+    SELECT s.name, MIN(o.rate_per_minute), s.rate_per_minute
+    FROM temp.operations_list_staging s
+    JOIN operations_list o ON o.name = s.name
+    GROUP BY s.name, s.rate_per_minute
+    HAVING MIN(ABS(COALESCE(o.rate_per_minute, 0) - COALESCE(s.rate_per_minute, 0))) > 1e-9
+    ORDER BY s.name
+"""
+
+REMOVED_RATES_QUERY = """
+    SELECT DISTINCT o.name FROM operations_list o
+    WHERE o.name NOT IN (SELECT name FROM temp.operations_list_staging)
+    ORDER BY o.name
+"""
+
 
 class RateManager:
     def __init__(self, db_manager: DatabaseManager):
         self.db_manager = db_manager
 
     def load_rates_from_excel(self, file_path):
-        """Загрузка ставок из Excel файла"""
+        """
+        Загрузка ставок из Excel файла: разбор во временную таблицу и атомарная замена operations_list.
+        Возвращает RateImportReport (принято, отклонено, сообщения, добавлено, изменено, удалено) или None при ошибке.
+        """
         logger.info(f"[СТАВКИ] Начало загрузки ставок из файла: {file_path}")
         try:
             # Читаем Excel файл, указывая лист "ставки" и используя третью строку как заголовки
             # (Первые две строки: "ставки" и "СТЕМЕТ/МЕТАЛЛ")
-            df = pd.read_excel(file_path, sheet_name="ставки", header=2)
+            df = pd.read_excel(file_path, sheet_name=RATES_SHEET, header=RATES_HEADER_ROW)
 
             # Удаляем строки, которые содержат только NaN или пустые значения
             df = df.dropna(how='all')
-
-            # Очистка существующих ставок
-            self.db_manager.execute_query("DELETE FROM operations_list")
-            logger.debug("[СТАВКИ] Очищены существующие ставки из БД")
-
-            # Вставка новых ставок
-            inserted_count = 0
-            for index, row in df.iterrows():
-                # Пропускаем строку, если в ней нет названия операции или это строка с итогами
-                # Также проверяем, что это не заголовки следующей таблицы (например, "диаметр", "длина", "вес")
-                operation_name = row.get('ОПЕРАЦИИ', '')
-                if pd.isna(operation_name) or operation_name == '' or operation_name == 'Итог':
-                    continue
-
-                # Проверяем, является ли это заголовком следующей таблицы
-                if operation_name in ['диаметр', 'длина', 'вес', 'Расценки с 01.05.2025', 'Сумма',
-                                      'Расценки с 01.02.2025', 'Старые расценки', 'Количество', 'Время',
-                                      'Рабочих дней', 'Рабочих часов в день', 'Минут в часе',
-                                      'Рабочих секунд в месяц', 'Рабочих минут в месяц', 'Рабочих часов в месяц']:
-                    break  # Прекращаем обработку, так как дошли до следующей таблицы
-
-                query = """
-                    INSERT INTO operations_list 
-                    (name, rate_per_minute)
-                    VALUES (?, ?)
-                """
-
-                # Функция для безопасного преобразования значений в float
-                def safe_float(val):
-                    try:
-                        if pd.isna(val) or val == '' or val is None:
-                            return 0.0
-                        # Проверяем, является ли значение строкой
-                        if isinstance(val, str):
-                            # Ищем числовые значения в строке
-                            numbers = re.findall(r'[\d.,]+', val)
-                            if numbers:
-                                # Берем первое найденное число и заменяем запятую на точку
-                                num_str = numbers[0].replace(',', '.')
-                                try:
-                                    return float(num_str)
-                                except ValueError:
-                                    return 0.0
-                            else:
-                                return 0.0
-                        return float(val)
-                    except (ValueError, TypeError, AttributeError):
-                        return 0.0
-
-                # Функция для безопасного преобразования значений в строку
-                def safe_str(val):
-                    try:
-                        if pd.isna(val) or val is None:
-                            return ''
-                        # Преобразуем в строку и убираем лишние пробелы
-                        return str(val).strip()
-                    except:
-                        return ''
-
-                params = (
-                    safe_str(operation_name),
-                    safe_float(row.get('грн/мин', 0.0))
+            rows, report = self._prepare_rate_rows(df)
+
+            # Загрузка во временную таблицу, сравнение и замена — в одной транзакции:
+            # читатели видят либо старые, либо новые ставки
+            with self.db_manager.transaction():
+                self.db_manager.execute_query(CREATE_STAGING_QUERY)
+                self.db_manager.execute_query("DELETE FROM temp.operations_list_staging")
+                self.db_manager.execute_many(
+                    "INSERT INTO temp.operations_list_staging (name, rate_per_minute) VALUES (?, ?)", rows
                 )
-
-                self.db_manager.execute_query(query, params)
-                inserted_count += 1
-                logger.debug(f"[СТАВКИ] Добавлена операция: {params[0]} - {params[1]} грн/мин")
-
-            logger.info(f"[СТАВКИ] Загружено {inserted_count} строк из Excel файла ставок")
-            return True
+                added = [row[0] for row in self.db_manager.fetch_all(ADDED_RATES_QUERY)]
+                changed = self.db_manager.fetch_all(CHANGED_RATES_QUERY)
+                removed = [row[0] for row in self.db_manager.fetch_all(REMOVED_RATES_QUERY)]
+                self.db_manager.execute_query("DELETE FROM operations_list")
+                self.db_manager.execute_query("""
+                    INSERT INTO operations_list (name, rate_per_minute)
+                    SELECT name, rate_per_minute FROM temp.operations_list_staging ORDER BY rowid
+                """)
+                self.db_manager.execute_query("DELETE FROM temp.operations_list_staging")
+
+            logger.info(f"[СТАВКИ] Загружено {report.accepted} строк из Excel файла ставок: "
+                        f"добавлено {len(added)}, изменено {len(changed)}, удалено {len(removed)}")
+            for name, old_rate, new_rate in changed:
+                logger.debug(f"[СТАВКИ] Изменена ставка '{name}': {old_rate} -> {new_rate} грн/мин")
+            for message in report.messages:
+                logger.warning(f"[СТАВКИ] {message}")
+            return RateImportReport(*report, added=added, changed=changed, removed=removed)
         except Exception as e:
             logger.error(f"[СТАВКИ] Ошибка при загрузке ставок: {e}", exc_info=True)
-            return False
+            return None
+
+    def _prepare_rate_rows(self, df):
+        """Векторизованный разбор листа ставок до первой строки-маркера следующей таблицы"""
+        row_numbers = excel_row_numbers(df, RATES_HEADER_ROW)
+        messages = []
+
+        names_raw = column_or_default(df, 'ОПЕРАЦИИ', '')
+        # Обработка прекращается на заголовке следующей таблицы
+        stop_positions = names_raw.isin(RATE_STOP_MARKERS).to_numpy().nonzero()[0]
+        if len(stop_positions):
+            end = stop_positions[0]
+            df, names_raw, row_numbers = df.iloc[:end], names_raw.iloc[:end], row_numbers[:end]
+
+        # Пустые названия и строки итогов — разделители, не ошибки
+        skip_mask = names_raw.isna() | names_raw.isin(['', 'Итог'])
+        rates, invalid = parse_numeric(column_or_default(df, 'грн/мин', 0.0))
+        invalid &= ~skip_mask
+        for row_number in row_numbers[invalid.to_numpy()]:
+            add_message(messages, f"Строка {row_number}: 'грн/мин' не распознано как число, записан 0")
+
+        # Строки без названия операции, но со ставкой — отклоняются
+        rejected_mask = skip_mask & names_raw.ne('Итог') & rates.notna() & (rates != 0)
+        for row_number in row_numbers[rejected_mask.to_numpy()]:
+            add_message(messages, f"Строка {row_number}: ставка без названия операции, строка пропущена")
+
+        accepted = ~skip_mask
+        cleaned = pd.DataFrame({
+            'name': clean_text(names_raw[accepted]),
+            'rate_per_minute': rates[accepted].fillna(0.0)
+        })
+        rows = list(cleaned.itertuples(index=False, name=None))
+        report = ImportReport(accepted=len(rows), rejected=int(rejected_mask.sum()), messages=messages)
+        return rows, report
 
     def get_all_operations(self):
         """Получение всех операций"""
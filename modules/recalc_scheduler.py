@@ -0,0 +1,121 @@
+# modules/recalc_scheduler.py
+"""
+Отложенный фоновый пересчет цены изделия.
+
+Частые правки (смена сотрудника, сохранение операции, ввод в полях) объединяются:
+расчет запускается через RECALC_DEBOUNCE_MS после последней правки, в пуле потоков
+(у каждого потока свое соединение DatabaseManager), а результат приходит в поток
+интерфейса сигналом pricing_ready. Одновременно выполняется не больше одного расчета;
+правки, пришедшие во время расчета, дают еще один расчет после его завершения.
+"""
+import logging
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+from modules.pricing import PricingManager
+
+logger = logging.getLogger(__name__)
+
+# Пауза после последней правки перед запуском расчета, мс
+RECALC_DEBOUNCE_MS = 300
+
+
+class _JobSignals(QObject):
+    # Испускается из потока пула; слоты получателя в потоке интерфейса вызываются через очередь событий
+    finished = pyqtSignal(int, int, object, str)  # generation, product_id, pricing_data, error
+
+
+class _PricingJob(QRunnable):
+    """Расчет цены одного изделия в потоке пула"""
+
+    def __init__(self, db_manager, product_id, generation, signals):
+        super().__init__()
+        self.db_manager = db_manager
+        self.product_id = product_id
+        self.generation = generation
+        self.signals = signals
+
+    def run(self):
+        try:
+            # None — расчет не удался (причина записана в журнал PricingManager)
+            pricing_data, error = PricingManager(self.db_manager).calculate_pricing(self.product_id), ""
+        except Exception as e:
+            logger.error(f"[ПЕРЕСЧЕТ] Ошибка фонового расчета цены изд. ID {self.product_id}: {e}", exc_info=True)
+            pricing_data, error = None, str(e)
+        finally:
+            # Соединение этого задания не переживет его (см. DatabaseManager.release_thread_connection)
+            self.db_manager.release_thread_connection()
+        self.signals.finished.emit(self.generation, self.product_id, pricing_data, error)
+
+
+class RecalcScheduler(QObject):
+    """Планировщик пересчета цены: debounce правок и расчет в фоновом потоке"""
+
+    pricing_ready = pyqtSignal(int, object)  # product_id, pricing_data
+    pricing_failed = pyqtSignal(int, str)  # product_id, текст исключения (пусто, если расчет вернул None)
+
+    def __init__(self, db_manager, delay_ms=RECALC_DEBOUNCE_MS, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self._pending_product_id = None
+        self._running = False
+        # Номер последнего запроса: результаты устаревших расчетов отбрасываются
+        self._generation = 0
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self._start)
+
+        # Свой пул из одного потока: расчеты идут по очереди и не занимают глобальный пул
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+        self._signals = _JobSignals()
+        self._signals.finished.connect(self._on_finished)
+
+    def schedule(self, product_id, immediate=False):
+        """Запросить пересчет изделия; повторные запросы до запуска объединяются"""
+        if not product_id:
+            return
+        self._pending_product_id = product_id
+        self._generation += 1
+        if immediate:
+            self._timer.stop()
+            self._start()
+        else:
+            self._timer.start()
+
+    def cancel(self):
+        """Отменить ожидающий пересчет и не выдавать результат уже запущенного"""
+        self._timer.stop()
+        self._pending_product_id = None
+        self._generation += 1
+
+    def wait_for_done(self, msecs=-1):
+        """Дождаться завершения запущенного расчета (закрытие приложения)"""
+        return self._pool.waitForDone(msecs)
+
+    def _start(self):
+        if self._running or self._pending_product_id is None:
+            # Расчет уже идет: следующий запустится в _on_finished
+            return
+        product_id, self._pending_product_id = self._pending_product_id, None
+        self._running = True
+        logger.debug(f"[ПЕРЕСЧЕТ] Запуск фонового расчета цены изд. ID {product_id}")
+        self._pool.start(_PricingJob(self.db_manager, product_id, self._generation, self._signals))
+
+    def _on_finished(self, generation, product_id, pricing_data, error):
+        self._running = False
+        if self._pending_product_id is not None:
+            # За время расчета пришли новые правки — результат устарел
+            if not self._timer.isActive():
+                self._start()
+            return
+        if generation != self._generation:
+            logger.debug(f"[ПЕРЕСЧЕТ] Результат расчета изд. ID {product_id} отброшен (отменен)")
+            return
+        if pricing_data is None:
+            self.pricing_failed.emit(product_id, error)
+        else:
+            self.pricing_ready.emit(product_id, pricing_data)
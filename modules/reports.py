@@ -5,6 +5,7 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from modules.database import DatabaseManager
+from modules.queries import PRODUCT_BY_ID, PRODUCT_MATERIAL_LINES, PRODUCT_OPERATIONS
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,31 +18,18 @@ class ReportManager:
     def export_product_to_excel(self, product_id, file_path):
         """Экспорт изделия в Excel с форматированием"""
         try:
-            product_info = self.db_manager.fetch_one(
-                "SELECT * FROM products WHERE id = ?", (product_id,)
-            )
-
-            operations = self.db_manager.fetch_all("""
-                SELECT o.operation_name, o.quantity_measured, o.time_measured,
-                       o.time_per_unit, o.rate_per_minute, o.cost, e.name as employee_name, o.approved_rate
-                FROM operations o
-                LEFT JOIN employees e ON o.employee_id = e.id
-                WHERE o.product_id = ?
-            """, (product_id,))
-
-            materials = self.db_manager.fetch_all("""
-                SELECT m.name, pm.length, pm.width, pm.quantity, pm.cost
-                FROM product_materials pm
-                JOIN materials m ON pm.material_id = m.id
-                WHERE pm.product_id = ?
-            """, (product_id,))
+            product_info = self.db_manager.fetch_one(PRODUCT_BY_ID, (product_id,))
+
+            operations = self.db_manager.fetch_all(PRODUCT_OPERATIONS, (product_id,))
+
+            materials = self.db_manager.fetch_all(PRODUCT_MATERIAL_LINES, (product_id,))
 
             with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
                 # Лист с информацией об изделии
                 info_df = pd.DataFrame([{
-                    'ID': product_info[1],
-                    'Артикул': product_info[2],
-                    'Название': product_info[3]
+                    'ID': product_info.product_id,
+                    'Артикул': product_info.article,
+                    'Название': product_info.name
                 }])
                 info_df.to_excel(writer, sheet_name='Информация', index=False)
                 # Убедимся, что лист "Информация" видим (по умолчанию он первый и видимый)
@@ -93,37 +81,32 @@ class ReportManager:
     def export_product_to_pdf(self, product_id, file_path):
         """Экспорт изделия в PDF"""
         try:
-            product_info = self.db_manager.fetch_one(
-                "SELECT * FROM products WHERE id = ?", (product_id,)
-            )
-
-            operations = self.db_manager.fetch_all("""
-                SELECT o.operation_name, o.quantity_measured, o.time_measured,
-                       o.time_per_unit, o.rate_per_minute, o.cost, e.name as employee_name
-                FROM operations o
-                LEFT JOIN employees e ON o.employee_id = e.id
-                WHERE o.product_id = ?
-            """, (product_id,))
-
-            materials = self.db_manager.fetch_all("""
-                SELECT m.name, pm.length, pm.quantity, pm.cost
-                FROM product_materials pm
-                JOIN materials m ON pm.material_id = m.id
-                WHERE pm.product_id = ?
-            """, (product_id,))
+            product_info = self.db_manager.fetch_one(PRODUCT_BY_ID, (product_id,))
+
+            operations = self.db_manager.fetch_all(PRODUCT_OPERATIONS, (product_id,))
 
+            materials = self.db_manager.fetch_all(PRODUCT_MATERIAL_LINES, (product_id,))
+
+            return self.write_product_pdf(product_info, operations, materials, file_path)
+        except Exception as e:
+            logger.error(f"Ошибка при экспорте в PDF: {e}", exc_info=True)
+            return False
+
+    def write_product_pdf(self, product_info, operations, materials, file_path):
+        """Запись карточки изделия в PDF по уже полученным данным (в т.ч. пакетная выгрузка)"""
+        try:
             doc = SimpleDocTemplate(file_path, pagesize=A4)
             styles = getSampleStyleSheet()
             story = []
 
-            title = Paragraph(f"Карточка изделия: {product_info[3]}", styles['Title'])
+            title = Paragraph(f"Карточка изделия: {product_info.name}", styles['Title'])
             story.append(title)
             story.append(Spacer(1, 12))
 
             info_text = f"""
-            ID: {product_info[1]}<br/>
-            Артикул: {product_info[2]}<br/>
-            Название: {product_info[3]}<br/>
+            ID: {product_info.product_id}<br/>
+            Артикул: {product_info.article}<br/>
+            Название: {product_info.name}<br/>
             """
             info_para = Paragraph(info_text, styles['Normal'])
             story.append(info_para)
@@ -134,7 +117,8 @@ class ReportManager:
                 ops_data = [['Операция', 'Кол-во', 'Время', 'Ставка', 'Стоимость', 'Сотрудник']]
                 for op in operations:
                     ops_data.append([
-                        str(op[0]), str(op[1]), f"{op[2]:.2f}", f"{op[4]:.2f}", f"{op[5]:.2f}", str(op[6] or '')
+                        str(op.operation_name), str(op.quantity_measured), f"{op.time_measured:.2f}",
+                        f"{op.rate_per_minute:.2f}", f"{op.cost:.2f}", str(op.employee_name or '')
                     ])
                 ops_table = Table(ops_data)
                 ops_table.setStyle(TableStyle([
@@ -155,7 +139,7 @@ class ReportManager:
                 mats_data = [['Материал', 'Длина', 'Количество', 'Стоимость']]
                 for mat in materials:
                     mats_data.append([
-                        str(mat[0]), f"{mat[1]:.3f}", str(mat[2]), f"{mat[3]:.2f}"
+                        str(mat.material_name), f"{mat.length:.3f}", str(mat.quantity), f"{mat.cost:.2f}"
                     ])
                 mats_table = Table(mats_data)
                 mats_table.setStyle(TableStyle([
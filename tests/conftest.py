@@ -0,0 +1,123 @@
+# tests/conftest.py
+"""
+Общие фикстуры тестов: временная БД (DatabaseManager в каталоге теста) и воспроизводимый
+случайный каталог — справочники, изделия, строки материалов и операций.
+
+Запуск из корня проекта: python -m pytest -q
+"""
+import os
+import random
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from modules.database import DatabaseManager  # noqa: E402
+
+SHIPPED_DB = os.path.join(BASE_DIR, "data", "database.db")
+
+STEEL_DENSITY = 7850
+DEFAULT_RATE_PER_MINUTE = 2.0
+
+MATERIAL_CATEGORIES = ("Труба", "Лист", "Метизы", "Профиль", "Проволока", "Краска")
+OPERATION_NAMES = ("Резка", "Сварка", "Гибка", "Покраска", "Сборка")
+
+
+def add_material_cost(category, weight_per_meter, our_price_per_kg, length, width, thickness, quantity):
+    """Стоимость строки материала по формулам MainInterface.add_material (эталон для пересчета)"""
+    if category == "Лист":
+        return length * width * thickness * quantity * STEEL_DENSITY * our_price_per_kg
+    if category == "Метизы":
+        return our_price_per_kg * quantity
+    return length * weight_per_meter * quantity * our_price_per_kg
+
+
+def add_operation_cost(time_per_unit, rate_per_minute):
+    """Стоимость операции по формуле MainInterface.add_operation (ставка 0 — ставка по умолчанию)"""
+    return time_per_unit * (rate_per_minute or DEFAULT_RATE_PER_MINUTE)
+
+
+def populate_catalog(db_manager, products=80, seed=7):
+    """
+    Случайный каталог: материалы всех категорий, справочник операций (одна ставка 0),
+    изделия с повторяющимися артикулами, названиями, датами и ценами (проверка порядка
+    при равных ключах), строки материалов со стоимостью по add_material и операции,
+    часть — с утвержденной расценкой. Возвращает список ID изделий.
+    """
+    rnd = random.Random(seed)
+    with db_manager.transaction():
+        materials = []
+        for index in range(24):
+            category = MATERIAL_CATEGORIES[index % len(MATERIAL_CATEGORIES)]
+            materials.append((
+                category, f"{category} {index}", round(rnd.uniform(0.2, 12.0), 3), round(rnd.uniform(20, 90), 2)
+            ))
+        db_manager.execute_many(
+            "INSERT INTO materials (category, name, weight_per_meter, our_price_per_kg) VALUES (?, ?, ?, ?)",
+            materials
+        )
+        material_rows = db_manager.fetch_all("SELECT id, category, weight_per_meter, our_price_per_kg FROM materials")
+
+        db_manager.execute_query("DELETE FROM operations_list")
+        db_manager.execute_many(
+            "INSERT INTO operations_list (name, rate_per_minute) VALUES (?, ?)",
+            [(name, 0.0 if name == "Сборка" else round(rnd.uniform(1.0, 4.0), 2)) for name in OPERATION_NAMES]
+        )
+        rates = dict(db_manager.fetch_all("SELECT name, rate_per_minute FROM operations_list"))
+
+        articles = [f"A-{number}" for number in range(products // 3)] + [None, ""]
+        names = [f"Изделие {number}" for number in range(products // 2)] + ["Ёлка", "рама", "Рама"]
+        dates = [f"2025-0{month}-1{day} 10:00:00" for month in range(1, 4) for day in range(3)] + [None]
+        db_manager.execute_many(
+            "INSERT INTO products (product_id, article, name, created_date, overhead_percent, profit_percent, "
+            "approved_price) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"P{number:04d}", rnd.choice(articles), rnd.choice(names), rnd.choice(dates),
+              rnd.choice((None, 0.55, 0.4)), rnd.choice((None, 0.30, 0.2)),
+              rnd.choice((None, 0.0, 100.0, round(rnd.uniform(50, 5000), 2))))
+             for number in range(products)]
+        )
+        product_ids = [row[0] for row in db_manager.fetch_all("SELECT id FROM products ORDER BY id")]
+
+        lines, operations = [], []
+        # Несколько изделий без состава — нулевая сводка
+        for product_id in product_ids[3:]:
+            for _ in range(rnd.randint(1, 6)):
+                material_id, category, weight_per_meter, our_price_per_kg = rnd.choice(material_rows)
+                length, width = round(rnd.uniform(0.1, 3.0), 3), round(rnd.uniform(0.1, 1.5), 3)
+                thickness, quantity = rnd.choice((0.002, 0.003, 0.005)), rnd.randint(1, 8)
+                cost = add_material_cost(category, weight_per_meter, our_price_per_kg,
+                                         length, width, thickness, quantity)
+                lines.append((product_id, material_id, length, width, thickness, quantity, cost))
+            for _ in range(rnd.randint(0, 3)):
+                name = rnd.choice(OPERATION_NAMES)
+                time_per_unit = round(rnd.uniform(0.5, 30.0), 4)
+                rate = rates[name] or DEFAULT_RATE_PER_MINUTE
+                approved_rate = rnd.choice((None, None, None, round(rnd.uniform(5, 50), 2)))
+                operations.append((product_id, name, 1, time_per_unit, time_per_unit, rate,
+                                   add_operation_cost(time_per_unit, rate), approved_rate))
+        db_manager.execute_many(
+            "INSERT INTO product_materials (product_id, material_id, length, width, thickness, quantity, cost) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", lines
+        )
+        db_manager.execute_many(
+            "INSERT INTO operations (product_id, operation_name, quantity_measured, time_measured, time_per_unit, "
+            "rate_per_minute, cost, approved_rate) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", operations
+        )
+    return product_ids
+
+
+@pytest.fixture
+def db_manager(tmp_path, monkeypatch):
+    """Пустая БД актуальной схемы во временном каталоге (data/ создается там же)"""
+    monkeypatch.chdir(tmp_path)
+    with DatabaseManager(str(tmp_path / "database.db")) as manager:
+        yield manager
+
+
+@pytest.fixture
+def catalog_db(db_manager):
+    """БД со случайным каталогом populate_catalog"""
+    populate_catalog(db_manager)
+    return db_manager
@@ -0,0 +1,35 @@
+# tests/test_catalog_search.py
+"""Поиск по каталогу (modules/catalog_search.py): подстрока без FTS5 не зависит от регистра"""
+import pytest
+
+from modules.catalog_search import CatalogSearchManager
+from modules.catalog_window import CatalogWindow
+
+
+def _found_ids(db, condition):
+    sql, params = condition
+    return [row.id for row in CatalogWindow(db, "id", False, condition=sql, params=params).iter_rows()]
+
+
+@pytest.fixture
+def without_fts(catalog_db):
+    """Поиск как на сборке SQLite без FTS5"""
+    manager = CatalogSearchManager(catalog_db)
+    manager._available = False
+    return manager
+
+
+@pytest.mark.parametrize("text", ["рама", "РАМА", " Рама ", "ёЛКА"])
+def test_like_fallback_ignores_cyrillic_case(catalog_db, without_fts, text):
+    expected = sorted(row[0] for row in catalog_db.fetch_all("SELECT id, name FROM products")
+                      if text.strip().lower() in row[1].lower())
+    assert expected
+    assert _found_ids(catalog_db, without_fts.search_condition(text)) == expected
+
+
+def test_like_fallback_escapes_wildcards(catalog_db, without_fts):
+    product_id = catalog_db.fetch_one("SELECT MIN(id) FROM products")[0]
+    catalog_db.execute_query("UPDATE products SET article = 'Б_100%' WHERE id = ?", (product_id,))
+
+    assert _found_ids(catalog_db, without_fts.search_condition("б_100%")) == [product_id]
+    assert _found_ids(catalog_db, without_fts.search_condition("Б%00")) == []
@@ -0,0 +1,105 @@
+# tests/test_catalog_window.py
+"""Окно каталога (modules/catalog_window.py): страницы и позиции против сортировки в Python"""
+import random
+
+import pytest
+
+from modules import catalog_window
+from modules.catalog_search import CatalogSearchManager
+from modules.catalog_window import SORT_KEYS, CatalogWindow
+
+PAGE_SIZE = 7
+
+REFERENCE_QUERY = """
+    SELECT p.id, p.article, p.name, p.created_date, p.approved_price, s.calculated_price, s.prime_cost
+    FROM products p JOIN product_cost_summary s ON s.product_id = p.id
+"""
+
+# Ключ сортировки -> значение строки REFERENCE_QUERY (как выражения SORT_KEYS)
+REFERENCE_KEYS = {
+    "id": lambda row: row[0],
+    "article": lambda row: row[1] or "",
+    "name": lambda row: row[2],
+    "created_date": lambda row: row[3] or "",
+    "approved_price": lambda row: row[4] or 0,
+    "calculated_price": lambda row: row[5],
+    "prime_cost": lambda row: row[6],
+}
+
+
+@pytest.fixture(autouse=True)
+def small_pages(monkeypatch):
+    """Маленькие страницы и кэш: каталог из десятков изделий занимает много страниц"""
+    monkeypatch.setattr(catalog_window, "CATALOG_PAGE_SIZE", PAGE_SIZE)
+    monkeypatch.setattr(catalog_window, "CATALOG_PAGE_CACHE", 3)
+
+
+def _reference_ids(db, sort_key, descending, keep=lambda row: True):
+    key = REFERENCE_KEYS[sort_key]
+    rows = [row for row in db.fetch_all(REFERENCE_QUERY) if keep(row)]
+    return [row[0] for row in sorted(rows, key=lambda row: (key(row), row[0]), reverse=descending)]
+
+
+def _rows_in_order(window, positions):
+    return {position: window.row(position).id for position in positions}
+
+
+def _assert_window_matches(db, window, expected):
+    assert window.count() == len(expected)
+    # Страницы подряд (границы keyset) и вразброс, начиная с конца (ключ начала страницы по OFFSET)
+    assert [window.row(position).id for position in range(len(expected))] == expected
+    scrambled = list(range(len(expected)))
+    random.Random(len(expected)).shuffle(scrambled)
+    fresh = window.copy()
+    assert _rows_in_order(fresh, scrambled[::-1]) == dict(enumerate(expected))
+    assert window.row(len(expected)) is None
+    assert [row.id for row in window.copy().iter_rows(batch=9)] == expected
+    # Позиция каждой строки по ее ключу сортировки
+    positions = {row.id: window.position_of(row) for row in window.fresh_rows(expected)}
+    assert positions == {product_id: position for position, product_id in enumerate(expected)}
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("sort_key", sorted(SORT_KEYS))
+def test_window_matches_python_sort(catalog_db, sort_key, descending):
+    window = CatalogWindow(catalog_db, sort_key, descending)
+    _assert_window_matches(catalog_db, window, _reference_ids(catalog_db, sort_key, descending))
+
+
+@pytest.mark.parametrize("sort_key", ["name", "calculated_price", "approved_price"])
+def test_filtered_window_matches_python_sort(catalog_db, sort_key):
+    window = CatalogWindow(catalog_db, sort_key, True, condition="p.approved_price > ?", params=(100,))
+    expected = _reference_ids(catalog_db, sort_key, True, keep=lambda row: (row[4] or 0) > 100)
+    assert 0 < len(expected) < catalog_db.fetch_one("SELECT COUNT(*) FROM products")[0]
+    _assert_window_matches(catalog_db, window, expected)
+
+
+def test_search_window_matches_python_sort(catalog_db):
+    condition, params = CatalogSearchManager(catalog_db).search_condition("рама")
+    window = CatalogWindow(catalog_db, "article", False, condition=condition, params=params)
+    expected = _reference_ids(catalog_db, "article", False, keep=lambda row: row[2].lower() == "рама")
+    assert expected
+    _assert_window_matches(catalog_db, window, expected)
+
+
+@pytest.mark.parametrize("sort_key", ["calculated_price", "approved_price", "name"])
+def test_moved_row_after_edit(catalog_db, sort_key):
+    """Изделие сменило ключ сортировки: позиции до и после правки, перечитанные страницы"""
+    db = catalog_db
+    window = CatalogWindow(db, sort_key, True)
+    before = _reference_ids(db, sort_key, True)
+    product_id = before[len(before) // 2]
+    window.row(len(before) // 2)
+    old_position = window.known_positions({product_id})[product_id]
+
+    with db.transaction():
+        db.execute_query("UPDATE products SET approved_price = 99999, name = 'ЯЯЯ' WHERE id = ?", (product_id,))
+        db.execute_query("UPDATE product_materials SET cost = cost + 50000 WHERE product_id = ?", (product_id,))
+    after = _reference_ids(db, sort_key, True)
+    [row] = window.fresh_rows([product_id])
+    new_position = window.position_of(row)
+
+    assert (old_position, new_position) == (before.index(product_id), after.index(product_id))
+    window.remove_row(old_position)
+    window.insert_row(new_position)
+    assert [window.row(position).id for position in range(len(after))] == after
@@ -0,0 +1,54 @@
+# tests/test_cost_summary.py
+"""Сводка стоимости (modules/cost_summary.py): триггеры после правок совпадают с полным пересчетом"""
+from modules.cost_summary import CostSummaryManager
+
+
+def test_summary_matches_after_catalog_load(catalog_db):
+    assert CostSummaryManager(catalog_db).verify() == []
+
+
+def test_summary_matches_after_edits(catalog_db):
+    db = catalog_db
+    first, second, third = [row[0] for row in db.fetch_all("SELECT id FROM products ORDER BY id DESC LIMIT 3")]
+    material_id = db.fetch_one("SELECT id FROM materials WHERE category = 'Труба' LIMIT 1")[0]
+    with db.transaction():
+        # Строки материалов: добавление, изменение размеров и стоимости, перенос, удаление
+        db.execute_query(
+            "INSERT INTO product_materials (product_id, material_id, length, quantity, cost) "
+            "VALUES (?, ?, 1500, 3, 42.5)", (first, material_id))
+        db.execute_query("UPDATE product_materials SET length = length * 2, cost = cost + 1 WHERE product_id = ?",
+                         (second,))
+        db.execute_query("UPDATE product_materials SET cost = cost * 1.1 WHERE id % 5 = 0")
+        db.execute_query(
+            "UPDATE product_materials SET product_id = ? WHERE id = (SELECT MIN(id) FROM product_materials "
+            "WHERE product_id = ?)", (second, first))
+        db.execute_query("DELETE FROM product_materials WHERE id % 7 = 0")
+        # Операции: утвержденная расценка, стоимость, перенос, удаление
+        db.execute_query("UPDATE operations SET approved_rate = 12.5 WHERE id % 3 = 0")
+        db.execute_query("UPDATE operations SET approved_rate = NULL, cost = cost + 2 WHERE id % 4 = 0")
+        db.execute_query(
+            "UPDATE operations SET product_id = ? WHERE id = (SELECT MIN(id) FROM operations "
+            "WHERE product_id NOT IN (?, ?) AND id % 6 != 0)", (first, first, third))
+        db.execute_query("DELETE FROM operations WHERE id % 6 = 0")
+        # Параметры цены изделий и справочник материалов
+        db.execute_query("UPDATE products SET overhead_percent = 0.6, profit_percent = 0.25 WHERE id % 2 = 0")
+        db.execute_query("UPDATE products SET total_paint_area = 1.75 WHERE id = ?", (second,))
+        db.execute_query("UPDATE materials SET weight_per_meter = weight_per_meter + 0.5 WHERE id = ?", (material_id,))
+        # Удаление изделия вместе с его составом
+        db.execute_query("DELETE FROM product_materials WHERE product_id = ?", (third,))
+        db.execute_query("DELETE FROM operations WHERE product_id = ?", (third,))
+        db.execute_query("DELETE FROM products WHERE id = ?", (third,))
+
+    assert CostSummaryManager(db).verify() == []
+    assert db.fetch_one("SELECT COUNT(*) FROM product_cost_summary WHERE product_id = ?", (third,))[0] == 0
+
+
+def test_rebuild_repairs_summary(catalog_db):
+    manager = CostSummaryManager(catalog_db)
+    catalog_db.execute_query(
+        "UPDATE product_cost_summary SET materials_cost = materials_cost + 10 WHERE product_id % 4 = 0")
+    mismatched = manager.verify()
+    assert mismatched and all(product_id % 4 == 0 for product_id in mismatched)
+
+    assert manager.rebuild() == catalog_db.fetch_one("SELECT COUNT(*) FROM products")[0]
+    assert manager.verify() == []
@@ -0,0 +1,138 @@
+# tests/test_materials_import.py
+"""Импорт справочника материалов (modules/materials.py): разбор листа прайса и сверка со справочником"""
+import math
+
+import pandas as pd
+
+from modules.materials import MATERIAL_DB_COLUMNS, MATERIAL_EXCEL_COLUMNS, MaterialManager
+
+EXCEL_BY_DB = {db_column: excel_column for excel_column, db_column, _kind in MATERIAL_EXCEL_COLUMNS}
+
+
+def price_list(*rows, columns=None):
+    """Лист прайса как после read_excel: строки {столбец БД: значение}, пустые ячейки — NaN"""
+    columns = columns or list(EXCEL_BY_DB.values())
+    return pd.DataFrame([{EXCEL_BY_DB[column]: value for column, value in row.items()} for row in rows],
+                        columns=columns)
+
+
+def test_prepare_cleans_text_and_numbers(db_manager):
+    df = price_list(
+        {"category": " Труба ", "name": "Труба 20х20 ", "diameter": "ф 20", "thickness": "1,5 мм",
+         "weight_per_meter": 2.5, "our_price_per_kg": 48},
+        {"category": "Лист", "name": "Лист 2", "thickness": "", "final_price_kg": math.nan,
+         "unit_of_measurement": " кг"},
+    )
+
+    rows, report = MaterialManager(db_manager)._prepare_material_rows(df)
+
+    assert (report.accepted, report.rejected, report.messages) == (2, 0, [])
+    first, second = (dict(zip(MATERIAL_DB_COLUMNS, row)) for row in rows)
+    assert (first["category"], first["name"], first["unit_of_measurement"]) == ("Труба", "Труба 20х20", "")
+    assert (first["diameter"], first["thickness"], first["weight_per_meter"], first["our_price_per_kg"]) == (
+        20.0, 1.5, 2.5, 48.0)
+    assert (second["thickness"], second["final_price_kg"], second["unit_of_measurement"]) == (0.0, 0.0, "кг")
+
+
+def test_prepare_reports_rejected_rows_and_bad_numbers(db_manager):
+    # Строки DataFrame 0..2 — строки Excel 3..5 (заголовок во второй строке листа)
+    df = price_list(
+        {"category": "Труба", "name": "Труба 1", "our_price_per_kg": "договорная"},
+        {"category": "Труба", "name": " ", "thickness": "x"},
+        {"category": "Труба", "name": "Труба 2", "diameter": 32},
+    )
+
+    rows, report = MaterialManager(db_manager)._prepare_material_rows(df)
+
+    assert [row[1] for row in rows] == ["Труба 1", "Труба 2"]
+    assert (report.accepted, report.rejected) == (2, 1)
+    # Нераспознанное число в пропущенной строке не сообщается
+    assert report.messages == [
+        "Строка 4: нет наименования материала, строка пропущена",
+        "Строка 3: 'Наша продажа/кг' не распознано как число, записан 0",
+    ]
+    assert rows[0][MATERIAL_DB_COLUMNS.index("our_price_per_kg")] == 0.0
+
+
+def test_prepare_missing_columns_get_defaults(db_manager):
+    df = price_list({"category": "Метизы", "name": "Болт М8"}, columns=[EXCEL_BY_DB["category"], EXCEL_BY_DB["name"]])
+
+    rows, report = MaterialManager(db_manager)._prepare_material_rows(df)
+
+    assert report.accepted == 1
+    assert rows == [("Метизы", "Болт М8") + tuple(
+        "" if column == "unit_of_measurement" else 0.0 for column in MATERIAL_DB_COLUMNS[2:])]
+
+
+# -----------------------
+# Сверка со справочником (MaterialManager._sync_materials)
+# -----------------------
+def pipe(name, price, category="Труба", diameter=20):
+    return {"category": category, "name": name, "diameter": diameter, "weight_per_meter": 1.2,
+            "our_price_per_kg": price}
+
+
+def sync(db_manager, *rows):
+    """Импорт строк прайса как load_materials_from_excel: (добавлено, ID обновленных, без изменений, снято)"""
+    manager = MaterialManager(db_manager)
+    prepared, _report = manager._prepare_material_rows(price_list(*rows))
+    with db_manager.transaction():
+        return manager._sync_materials(prepared)
+
+
+def materials(db_manager):
+    """{ID: (наименование, цена, действует)}"""
+    return {row[0]: row[1:] for row in db_manager.fetch_all(
+        "SELECT id, name, our_price_per_kg, is_active FROM materials ORDER BY id")}
+
+
+def test_sync_inserts_then_updates_changed_rows(db_manager):
+    assert sync(db_manager, pipe("Труба 20", 40), pipe("Труба 25", 42), pipe("Лист 2", 50, "Лист", 0)) == (
+        3, [], 0, 0)
+    first = materials(db_manager)
+
+    # Тот же прайс — ничего не меняется; изменилась цена — обновление той же строки
+    assert sync(db_manager, pipe("Труба 20", 40), pipe("Труба 25", 42), pipe("Лист 2", 50, "Лист", 0)) == (
+        0, [], 3, 0)
+    pipe_25 = next(material_id for material_id, (name, _price, _active) in first.items() if name == "Труба 25")
+    assert sync(db_manager, pipe("Труба 20", 40), pipe("Труба 25", 44), pipe("Лист 2", 50, "Лист", 0)) == (
+        0, [pipe_25], 2, 0)
+    assert materials(db_manager) == {**first, pipe_25: ("Труба 25", 44.0, 1)}
+
+
+def test_sync_matches_repeated_keys_in_order(db_manager):
+    sync(db_manager, pipe("Труба 20", 40), pipe("Труба 20", 41), pipe("Труба 20", 42))
+    first, second, third = materials(db_manager)
+
+    # n-я строка с ключом — n-й по ID материал с ним же; лишние строки прайса добавляются
+    inserted, updated_ids, unchanged, retired = sync(
+        db_manager, pipe("Труба 20", 40), pipe("Труба 20", 45), pipe("Труба 20", 42), pipe("Труба 20", 43))
+    assert (inserted, updated_ids, unchanged, retired) == (1, [second], 2, 0)
+
+    # Строк с ключом стало меньше — снимаются последние по ID
+    assert sync(db_manager, pipe("Труба 20", 40), pipe("Труба 20", 45)) == (0, [], 2, 2)
+    current = materials(db_manager)
+    assert [current[material_id] for material_id in (first, second, third)] == [
+        ("Труба 20", 40.0, 1), ("Труба 20", 45.0, 1), ("Труба 20", 42.0, 0)]
+    assert sum(active for _name, _price, active in current.values()) == 2
+
+
+def test_sync_retires_and_brings_back_materials(db_manager):
+    sync(db_manager, pipe("Труба 20", 40), pipe("Труба 25", 42))
+    pipe_20, pipe_25 = materials(db_manager)
+    db_manager.execute_query("INSERT INTO products (name) VALUES ('Рама')")
+    product_id = db_manager.fetch_one("SELECT MAX(id) FROM products")[0]
+    db_manager.execute_query("INSERT INTO product_materials (product_id, material_id, length, quantity, cost) "
+                             "VALUES (?, ?, 1, 1, 48)", (product_id, pipe_25))
+
+    # Материала нет в прайсе — снимается, а не удаляется: спецификация изделия сохраняется
+    assert sync(db_manager, pipe("Труба 20", 40)) == (0, [], 1, 1)
+    assert materials(db_manager)[pipe_25] == ("Труба 25", 42.0, 0)
+    assert db_manager.fetch_one("SELECT material_id FROM product_materials")[0] == pipe_25
+
+    # Снятый материал не снимается повторно
+    assert sync(db_manager, pipe("Труба 20", 40)) == (0, [], 1, 0)
+
+    # Вернулся в прайс (даже с прежней ценой) — та же строка снова действует
+    assert sync(db_manager, pipe("Труба 20", 40), pipe("Труба 25", 42)) == (0, [pipe_25], 1, 0)
+    assert materials(db_manager) == {pipe_20: ("Труба 20", 40.0, 1), pipe_25: ("Труба 25", 42.0, 1)}
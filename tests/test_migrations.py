@@ -0,0 +1,105 @@
+# tests/test_migrations.py
+"""Миграции схемы (modules/migrations.py): новая БД и поставляемая data/database.db"""
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import SHIPPED_DB
+from modules import cost_summary
+from modules.catalog_search import FTS_TABLE, is_installed
+from modules import migrations
+from modules.migrations import INDEXES, MIGRATIONS, SCHEMA_VERSION, apply_migrations, get_schema_version
+
+ALL_VERSIONS = [version for version, _description, _migrate in MIGRATIONS]
+
+
+def _connect(path):
+    return sqlite3.connect(str(path), isolation_level=None)
+
+
+def _names(conn, kind):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,))}
+
+
+def _assert_latest_schema(conn):
+    assert get_schema_version(conn) == SCHEMA_VERSION
+    assert {"products", "product_materials", "operations", "materials", "product_cost_summary"} <= _names(conn, "table")
+    assert set(INDEXES) <= _names(conn, "index")
+    triggers = _names(conn, "trigger")
+    assert {"trg_summary_material_line_update", "trg_summary_material_line_move",
+            "trg_revision_material_line_update"} <= triggers
+    # Поиск по каталогу есть, если SQLite собран с FTS5
+    assert is_installed(conn) == any(name.startswith("trg_fts_") for name in triggers)
+
+
+def test_versions_are_sequential():
+    assert ALL_VERSIONS == list(range(1, len(MIGRATIONS) + 1))
+    assert SCHEMA_VERSION == ALL_VERSIONS[-1]
+
+
+def test_fresh_database_migrates_to_latest(tmp_path):
+    conn = _connect(tmp_path / "fresh.db")
+    assert apply_migrations(conn) == ALL_VERSIONS
+    _assert_latest_schema(conn)
+    # Повторный запуск ничего не применяет
+    assert apply_migrations(conn) == []
+    conn.close()
+
+
+def test_fresh_database_triggers_maintain_summary(tmp_path):
+    conn = _connect(tmp_path / "fresh.db")
+    apply_migrations(conn)
+    conn.execute("INSERT INTO materials (category, name, weight_per_meter, our_price_per_kg) "
+                 "VALUES ('Труба', 'T', 2, 50)")
+    conn.execute("INSERT INTO products (article, name) VALUES ('A-1', 'Рама')")
+    conn.execute("INSERT INTO product_materials (product_id, material_id, length, quantity, cost) "
+                 "VALUES (1, 1, 1000, 2, 10)")
+    conn.execute("UPDATE product_materials SET cost = 25")
+    conn.execute("INSERT INTO operations (product_id, operation_name, cost) VALUES (1, 'Сварка', 5)")
+    summary = conn.execute("SELECT materials_cost, labor_cost, total_weight FROM product_cost_summary").fetchone()
+    assert summary == (25, 5, 4)
+    assert conn.execute("SELECT revision FROM products").fetchone()[0] == 3
+    assert cost_summary.verify(conn) == []
+    conn.close()
+
+
+def test_migrations_create_only_their_own_indexes(tmp_path):
+    """Миграция создает свой зафиксированный набор индексов; индексы idx_ вне наборов не удаляются"""
+    own = {6: migrations._INDEXES_V6, 7: migrations._INDEXES_V7, 8: migrations._INDEXES_V8,
+           9: migrations._INDEXES_V9, 10: migrations._INDEXES_V10, 11: migrations._INDEXES_V11,
+           14: migrations._INDEXES_V14}
+    dropped = {7: set(migrations._DROPPED_INDEXES_V7)}
+    conn = _connect(tmp_path / "fresh.db")
+    for version, _description, migrate in MIGRATIONS:
+        before = _names(conn, "index")
+        migrate(conn)
+        after = _names(conn, "index")
+        assert {name for name in after - before if name.startswith("idx_")} == set(own.get(version, ()))
+        assert before - after == dropped.get(version, set())
+        if version == 5:
+            conn.execute("CREATE INDEX idx_local_products_name ON products (name)")
+    assert {name for name in _names(conn, "index") if name.startswith("idx_")} == set(INDEXES) | {
+        "idx_local_products_name"}
+    conn.close()
+
+
+@pytest.mark.skipif(not os.path.exists(SHIPPED_DB), reason="нет data/database.db")
+def test_shipped_database_migrates_to_latest(tmp_path):
+    path = tmp_path / "database.db"
+    shutil.copy(SHIPPED_DB, path)
+    conn = _connect(path)
+    start = get_schema_version(conn)
+    products = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    assert apply_migrations(conn) == [version for version in ALL_VERSIONS if version > start]
+    _assert_latest_schema(conn)
+    # Данные сохранены, сводка и поисковый индекс заполнены по существующим изделиям
+    assert conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] == products
+    assert conn.execute("SELECT COUNT(*) FROM product_cost_summary").fetchone()[0] == products
+    assert cost_summary.verify(conn) == []
+    if is_installed(conn):
+        assert conn.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}").fetchone()[0] == products
+    assert apply_migrations(conn) == []
+    conn.close()
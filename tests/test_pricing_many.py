@@ -0,0 +1,45 @@
+# tests/test_pricing_many.py
+"""Пакетный расчет цены (PricingManager.calculate_pricing_many) совпадает с расчетом по одному изделию"""
+import pytest
+
+from modules.pricing import PricingManager
+
+
+@pytest.fixture
+def painted_catalog(catalog_db):
+    """Каталог, где у труб и профилей есть сечение — площадь покраски и стоимость краски не нулевые"""
+    with catalog_db.transaction():
+        catalog_db.execute_query("UPDATE materials SET diameter = 25 + id WHERE category = 'Труба'")
+        catalog_db.execute_query(
+            "UPDATE materials SET section_length = 40, section_width = 20 + id WHERE category = 'Профиль'")
+    return catalog_db
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"paint_consumption_kg_per_m2_per_layer": 0.2, "layers": 3, "use_loss_coeff": False},
+])
+def test_many_equals_single(painted_catalog, monkeypatch, options):
+    # Группы меньше каталога: изделия попадают в разные группы и на их границы
+    monkeypatch.setattr("modules.pricing.PRICING_CHUNK_SIZE", 7)
+    manager = PricingManager(painted_catalog)
+    product_ids = [row[0] for row in painted_catalog.fetch_all("SELECT id FROM products ORDER BY id DESC")]
+
+    many = manager.calculate_pricing_many(product_ids, **options)
+
+    assert list(many) == product_ids
+    for product_id in product_ids:
+        assert many[product_id] == manager.calculate_pricing(product_id, **options)
+    assert any(result.get("paint", {}).get("cost") for result in many.values())
+    assert any(result["product_info"]["total_paint_area_m2"] for result in many.values())
+
+
+def test_many_skips_missing_and_repeated_ids(catalog_db):
+    manager = PricingManager(catalog_db)
+    first, second = [row[0] for row in catalog_db.fetch_all("SELECT id FROM products ORDER BY id LIMIT 2")]
+
+    many = manager.calculate_pricing_many([second, 999999, first, second])
+
+    assert list(many) == [second, first]
+    assert many[first] == manager.calculate_pricing(first)
+    assert manager.calculate_pricing_many([]) == {}
@@ -0,0 +1,77 @@
+# tests/test_rates_import.py
+"""Импорт ставок операций (modules/rates.py): разбор листа и замена справочника через временную таблицу"""
+import math
+
+import pandas as pd
+from openpyxl import Workbook
+
+from modules.rates import RATES_SHEET, RateManager
+
+
+def rates_sheet(*rows):
+    """Лист ставок как после read_excel: (операция, грн/мин), пустые ячейки — NaN"""
+    return pd.DataFrame(list(rows), columns=["ОПЕРАЦИИ", "грн/мин"])
+
+
+def write_rates_workbook(path, rows):
+    """Файл ставок: две строки шапки, заголовки в третьей строке листа"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = RATES_SHEET
+    sheet.append(["ставки"])
+    sheet.append(["СТЕМЕТ/МЕТАЛЛ"])
+    sheet.append(["ОПЕРАЦИИ", "грн/мин"])
+    for row in rows:
+        sheet.append(list(row))
+    workbook.save(path)
+    return str(path)
+
+
+def test_prepare_stops_at_next_table(db_manager):
+    # Строки DataFrame 0.. — строки Excel 4.. (заголовок в третьей строке листа)
+    df = rates_sheet(
+        ("Резка ", 2.5),
+        (math.nan, 3),
+        ("Итог", 10),
+        ("Сварка", "1,75 грн"),
+        ("Гибка", "по договору"),
+        (math.nan, math.nan),
+        ("Сумма", 5),
+        ("Покраска", 9),
+    )
+
+    rows, report = RateManager(db_manager)._prepare_rate_rows(df)
+
+    assert rows == [("Резка", 2.5), ("Сварка", 1.75), ("Гибка", 0.0)]
+    assert (report.accepted, report.rejected) == (3, 1)
+    assert report.messages == [
+        "Строка 8: 'грн/мин' не распознано как число, записан 0",
+        "Строка 5: ставка без названия операции, строка пропущена",
+    ]
+
+
+def test_load_replaces_rates_and_reports_difference(catalog_db, tmp_path):
+    rates = dict(catalog_db.fetch_all("SELECT name, rate_per_minute FROM operations_list"))
+    path = write_rates_workbook(tmp_path / "rates.xlsx", [
+        ("Лазер", 6.0), ("Резка", rates["Резка"]), ("Сварка", 3.25), ("Итог", None),
+        ("Время", None), ("Гибка", 1.0),
+    ])
+
+    report = RateManager(catalog_db).load_rates_from_excel(path)
+
+    assert (report.accepted, report.rejected, report.messages) == (3, 0, [])
+    assert report.added == ["Лазер"]
+    assert [(name, new) for name, _old, new in report.changed] == [("Сварка", 3.25)]
+    assert report.removed == ["Гибка", "Покраска", "Сборка"]
+    assert catalog_db.fetch_all("SELECT name, rate_per_minute FROM operations_list ORDER BY id") == [
+        ("Лазер", 6.0), ("Резка", rates["Резка"]), ("Сварка", 3.25)]
+
+
+def test_failed_load_keeps_rates(catalog_db, tmp_path):
+    before = catalog_db.fetch_all("SELECT id, name, rate_per_minute FROM operations_list ORDER BY id")
+    workbook = Workbook()
+    workbook.active.title = "другой лист"
+    workbook.save(tmp_path / "wrong.xlsx")
+
+    assert RateManager(catalog_db).load_rates_from_excel(str(tmp_path / "wrong.xlsx")) is None
+    assert catalog_db.fetch_all("SELECT id, name, rate_per_minute FROM operations_list ORDER BY id") == before
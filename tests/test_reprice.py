@@ -0,0 +1,128 @@
+# tests/test_reprice.py
+"""Пакетный пересчет стоимости (PricingManager.reprice_products): совпадение с формулами ввода"""
+import pytest
+
+from conftest import DEFAULT_RATE_PER_MINUTE, add_material_cost, add_operation_cost
+from modules.cost_summary import CostSummaryManager
+from modules.pricing import PricingManager
+
+MATERIAL_LINES_QUERY = """
+    SELECT pm.id, m.category, m.weight_per_meter, m.our_price_per_kg,
+           pm.length, pm.width, pm.thickness, pm.quantity, pm.cost
+    FROM product_materials pm JOIN materials m ON m.id = pm.material_id
+"""
+
+
+def _change_reference_prices(db):
+    """Новые цены и веса материалов, ставки операций (одна — 0, т.е. ставка по умолчанию)"""
+    with db.transaction():
+        db.execute_query("UPDATE materials SET our_price_per_kg = our_price_per_kg * 1.25 + 1")
+        db.execute_query("UPDATE materials SET weight_per_meter = weight_per_meter + 0.3 WHERE id % 2 = 0")
+        db.execute_query("UPDATE operations_list SET rate_per_minute = rate_per_minute + 0.75")
+        db.execute_query("UPDATE operations_list SET rate_per_minute = 0 WHERE name = 'Резка'")
+
+
+def _snapshot(db):
+    return (db.fetch_all("SELECT id, cost FROM product_materials ORDER BY id"),
+            db.fetch_all("SELECT id, rate_per_minute, cost FROM operations ORDER BY id"),
+            db.fetch_all("SELECT id, calculated_price FROM products ORDER BY id"))
+
+
+def test_reprice_matches_add_material_and_add_operation(catalog_db):
+    db = catalog_db
+    approved_before = dict(db.fetch_all("SELECT id, cost FROM operations WHERE approved_rate IS NOT NULL"))
+    db.execute_query("INSERT INTO operations (product_id, operation_name, time_per_unit, rate_per_minute, cost) "
+                     "VALUES ((SELECT MAX(id) FROM products), 'Нет в справочнике', 5, 3, 15)")
+    _change_reference_prices(db)
+
+    report = PricingManager(db).reprice_products()
+
+    assert report.products == db.fetch_one("SELECT COUNT(*) FROM products")[0]
+    assert report.material_lines > 0 and report.operation_lines > 0 and report.prices > 0
+    for _id, category, weight_per_meter, price, length, width, thickness, quantity, cost in db.fetch_all(
+            MATERIAL_LINES_QUERY):
+        expected = add_material_cost(category, weight_per_meter, price, length, width, thickness, quantity)
+        assert cost == pytest.approx(expected, rel=1e-9)
+
+    rates = dict(db.fetch_all("SELECT name, rate_per_minute FROM operations_list"))
+    for operation_id, name, time_per_unit, rate, cost, approved_rate in db.fetch_all(
+            "SELECT id, operation_name, time_per_unit, rate_per_minute, cost, approved_rate FROM operations"):
+        if name not in rates:
+            # Операции, которых нет в справочнике, не пересчитываются
+            assert (rate, cost) == (3, 15)
+            continue
+        assert rate == pytest.approx(rates[name] or DEFAULT_RATE_PER_MINUTE)
+        if approved_rate is not None:
+            assert cost == approved_before[operation_id]
+        else:
+            assert cost == pytest.approx(add_operation_cost(time_per_unit, rates[name]), rel=1e-9)
+
+    # Расчетная цена изделий — по обновленной сводке, в той же транзакции
+    assert CostSummaryManager(db).verify() == []
+    stale = db.fetch_all("""
+        SELECT p.id FROM products p JOIN product_cost_summary s ON s.product_id = p.id
+        WHERE p.calculated_price IS NULL OR ABS(p.calculated_price - ROUND(s.calculated_price, 2)) > 1e-9
+    """)
+    assert stale == []
+
+
+def test_reprice_again_changes_nothing(catalog_db):
+    _change_reference_prices(catalog_db)
+    manager = PricingManager(catalog_db)
+    manager.reprice_products()
+    before = _snapshot(catalog_db)
+
+    report = manager.reprice_products()
+
+    assert (report.material_lines, report.operation_lines, report.prices) == (0, 0, 0)
+    assert _snapshot(catalog_db) == before
+
+
+def test_reprice_only_given_products(catalog_db):
+    db = catalog_db
+    product_ids = [row[0] for row in db.fetch_all("SELECT id FROM products ORDER BY id")]
+    selected, others = product_ids[::2], product_ids[1::2]
+    others_query = f"SELECT id, cost FROM product_materials WHERE product_id IN ({', '.join(map(str, others))})"
+    others_before = db.fetch_all(others_query)
+    _change_reference_prices(db)
+
+    report = PricingManager(db).reprice_products(selected)
+
+    assert report.products == len(selected)
+    assert db.fetch_all(others_query) == others_before
+    assert CostSummaryManager(db).verify() == []
+
+
+def test_cancelled_reprice_rolls_back(catalog_db, monkeypatch):
+    monkeypatch.setattr("modules.pricing.REPRICE_CHUNK_SIZE", 10)
+    _change_reference_prices(catalog_db)
+    before = _snapshot(catalog_db)
+    progress = []
+
+    def cancel_after_first_chunk(done, total):
+        progress.append((done, total))
+        return len(progress) < 2
+
+    assert PricingManager(catalog_db).reprice_products(progress_callback=cancel_after_first_chunk) is None
+    assert progress == [(10, len(before[2])), (20, len(before[2]))]
+    assert _snapshot(catalog_db) == before
+    assert CostSummaryManager(catalog_db).verify() == []
+
+
+def test_reprice_keeps_comma_decimal_approved_rate(catalog_db):
+    """Расценка "12,5" из таблицы операций хранится строкой — стоимость операции остается утвержденной"""
+    db = catalog_db
+    operation_id = db.fetch_one("SELECT MIN(id) FROM operations WHERE approved_rate IS NULL")[0]
+    # Как update_selected_operation: cost — разобранная расценка, approved_rate — введенная строка
+    db.execute_query("UPDATE operations SET approved_rate = '12,5', cost = 12.5 WHERE id = ?", (operation_id,))
+    db.execute_query("UPDATE operations SET approved_rate = '  ' WHERE id = (SELECT MAX(id) FROM operations)")
+    assert db.fetch_one("SELECT typeof(approved_rate) FROM operations WHERE id = ?", (operation_id,))[0] == "text"
+    _change_reference_prices(db)
+
+    PricingManager(db).reprice_products()
+
+    assert db.fetch_one("SELECT cost FROM operations WHERE id = ?", (operation_id,))[0] == 12.5
+    time_per_unit, rate, cost = db.fetch_one(
+        "SELECT time_per_unit, rate_per_minute, cost FROM operations WHERE id = (SELECT MAX(id) FROM operations)")
+    assert cost == pytest.approx(time_per_unit * rate, rel=1e-9)
+    assert CostSummaryManager(db).verify() == []